@@ -0,0 +1,231 @@
+'''
+Indexes pyimannotate .json and .csv outputs into a local SQLite database with
+an R*Tree on object bounding boxes, so label/type/area/location questions
+over a whole dataset don't require re-parsing every label file.
+
+The index is updated incrementally: only files whose modification time or size
+changed since the last run are re-read, and deleted files are dropped. Files
+that cannot be parsed are recorded without objects, so they are retried only
+once they change.
+
+Usage:
+python annotation_index.py index LABELDIR --db labels.sqlite
+python annotation_index.py query --db labels.sqlite --label buildings --min-area 500 --bbox 0.5 0 1 0.5 --relative --count
+'''
+
+import argparse
+import os
+import sqlite3
+
+import numpy as np
+
+from annotationcore import read_csv
+from dataset_exporter import ordered_map, read_label_file
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY, path TEXT UNIQUE, mtime REAL, size INTEGER,
+    width INTEGER, height INTEGER, image TEXT);
+CREATE TABLE IF NOT EXISTS objects (
+    id INTEGER PRIMARY KEY, file_id INTEGER, idx INTEGER, label TEXT,
+    type TEXT, area REAL, nvertices INTEGER);
+CREATE INDEX IF NOT EXISTS objects_label ON objects(label, area);
+CREATE INDEX IF NOT EXISTS objects_type ON objects(type, area);
+CREATE INDEX IF NOT EXISTS objects_file ON objects(file_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS objects_rtree USING rtree(id, xmin, xmax, ymin, ymax);
+CREATE VIRTUAL TABLE IF NOT EXISTS objects_nrtree USING rtree(id, xmin, xmax, ymin, ymax);
+'''
+
+
+def read_csv_file(filename):
+    '''Parse a pyimannotate .csv workbook into the same record layout as
+    dataset_exporter.read_label_file
+    '''
+    annotation = read_csv(filename)
+    bbox, area = annotation.geometry()
+    width, height = annotation.imsize or (0, 0)
+    return {'filename': filename, 'file_name': os.path.basename(filename), 'width': width, 'height': height,
+            'objects': annotation.objects, 'types': annotation.types, 'labels': annotation.labels,
+            'bbox': bbox, 'area': area}
+
+
+def find_annotation_files(path):
+    '''All .json label files plus the .csv files that have no .json sibling
+    (pyimannotate writes both for every save)
+    '''
+    found = []
+    for root, dirs, files in os.walk(path):
+        names = set(files)
+        for f in files:
+            stem, ext = os.path.splitext(f)
+            ext = ext.lower()
+            if ext == '.json' or (ext == '.csv' and stem+'.json' not in names):
+                found.append(os.path.join(root, f))
+    return sorted(found)
+
+
+def _read_record(filename):
+    try:
+        if filename.lower().endswith('.csv'):
+            record = read_csv_file(filename)
+        else:
+            record = read_label_file(filename)
+    except (OSError, ValueError, KeyError, TypeError):
+        return filename, None
+    record['nvertices'] = [len(obj) for obj in record.pop('objects')]
+    return filename, record
+
+
+def _inside(path, root):
+    '''True if path is root or lies under it (not merely shares its prefix)'''
+    try:
+        return os.path.commonpath([path, root]) == root
+    except ValueError: #different drives
+        return False
+
+
+def connect(db):
+    '''Open (and create if needed) an annotation database
+    '''
+    conn = sqlite3.connect(db)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _drop_file(conn, file_id):
+    for table in ('objects_rtree', 'objects_nrtree'):
+        conn.execute('DELETE FROM {} WHERE id IN (SELECT id FROM objects WHERE file_id=?)'.format(table), (file_id,))
+    conn.execute('DELETE FROM objects WHERE file_id=?', (file_id,))
+    conn.execute('DELETE FROM files WHERE id=?', (file_id,))
+
+
+def update_index(db, labeldir, workers=None):
+    '''Bring the database in line with the label files under labeldir.
+    Returns the number of (re)indexed and removed files
+    '''
+    conn = connect(db)
+    known = {path: (file_id, mtime, size) for file_id, path, mtime, size
+             in conn.execute('SELECT id, path, mtime, size FROM files')}
+    stale = []
+    seen = set()
+    for path in find_annotation_files(labeldir):
+        path = os.path.abspath(path)
+        seen.add(path)
+        st = os.stat(path)
+        if path not in known or known[path][1:] != (st.st_mtime, st.st_size):
+            stale.append((path, st.st_mtime, st.st_size))
+    root = os.path.abspath(labeldir)
+    removed = [path for path in known if path not in seen and _inside(path, root)]
+
+    stats = {path: (mtime, size) for path, mtime, size in stale}
+    with conn:
+        for path in removed:
+            _drop_file(conn, known[path][0])
+        for path, record in ordered_map(_read_record, list(stats), workers):
+            if path in known:
+                _drop_file(conn, known[path][0])
+            mtime, size = stats[path]
+            if record is None:
+                #unreadable: remembered without objects so it is not parsed again until it changes
+                conn.execute('INSERT INTO files (path, mtime, size) VALUES (?,?,?)', (path, mtime, size))
+                continue
+            file_id = conn.execute('INSERT INTO files (path, mtime, size, width, height, image) VALUES (?,?,?,?,?,?)',
+                                   (path, mtime, size, record['width'], record['height'], record['file_name'])).lastrowid
+            n = len(record['labels'])
+            if n == 0:
+                continue
+            first = conn.execute('INSERT INTO objects (file_id, idx, label, type, area, nvertices) VALUES (?,?,?,?,?,?)',
+                                 (file_id, 0, record['labels'][0], record['types'][0],
+                                  float(record['area'][0]), record['nvertices'][0])).lastrowid
+            conn.executemany('INSERT INTO objects (id, file_id, idx, label, type, area, nvertices) VALUES (?,?,?,?,?,?,?)',
+                             [(first+i, file_id, i, record['labels'][i], record['types'][i],
+                               float(record['area'][i]), record['nvertices'][i]) for i in range(1, n)])
+            ids = np.arange(first, first+n)
+            bbox = record['bbox']
+            conn.executemany('INSERT INTO objects_rtree VALUES (?,?,?,?,?)',
+                             zip(ids.tolist(), bbox[:, 0].tolist(), bbox[:, 2].tolist(),
+                                 bbox[:, 1].tolist(), bbox[:, 3].tolist()))
+            if record['width'] and record['height']:
+                nbox = bbox/np.array([record['width'], record['height']]*2, dtype=np.float64)
+                conn.executemany('INSERT INTO objects_nrtree VALUES (?,?,?,?,?)',
+                                 zip(ids.tolist(), nbox[:, 0].tolist(), nbox[:, 2].tolist(),
+                                     nbox[:, 1].tolist(), nbox[:, 3].tolist()))
+    conn.close()
+    return len(stale), len(removed)
+
+
+def query(db, label=None, objtype=None, min_area=None, max_area=None, bbox=None,
+          relative=False, within=False, count=False, limit=None):
+    '''Select objects by label, type, area range and bounding box (xmin, ymin, xmax, ymax).
+    With relative=True the box is given in fractions of the image size, e.g.
+    (0.5, 0, 1, 0.5) is the north-east quadrant. within=True requires objects to
+    lie entirely inside the box instead of merely intersecting it.
+    Returns the number of matches if count=True, else a list of
+    (path, object index, label, type, area, (xmin, ymin, xmax, ymax)) tuples,
+    the box being relative too if relative=True
+    '''
+    tree = 'objects_nrtree' if relative else 'objects_rtree'
+    where, params = [], []
+    if bbox is not None:
+        x0, y0, x1, y1 = bbox
+        if within:
+            where.append('r.xmin>=? AND r.xmax<=? AND r.ymin>=? AND r.ymax<=?')
+        else:
+            where.append('r.xmax>=? AND r.xmin<=? AND r.ymax>=? AND r.ymin<=?')
+        params += [x0, x1, y0, y1]
+    for clause, value in (('o.label=?', label), ('o.type=?', objtype), ('o.area>=?', min_area), ('o.area<=?', max_area)):
+        if value is not None:
+            where.append(clause)
+            params.append(value)
+    sql = ' FROM {} r JOIN objects o ON o.id=r.id'.format(tree)
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+
+    conn = connect(db)
+    try:
+        if count:
+            return conn.execute('SELECT COUNT(*)' + sql, params).fetchone()[0]
+        sql = ('SELECT f.path, o.idx, o.label, o.type, o.area, r.xmin, r.ymin, r.xmax, r.ymax'
+               + sql.replace(' JOIN objects o ON o.id=r.id', ' JOIN objects o ON o.id=r.id JOIN files f ON f.id=o.file_id'))
+        if limit is not None:
+            sql += ' LIMIT {:d}'.format(limit)
+        return [(path, idx, lab, typ, area, box) for path, idx, lab, typ, area, *box
+                in conn.execute(sql, params)]
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Index and query pyimannotate label files')
+    sub = parser.add_subparsers(dest='command')
+    indexer = sub.add_parser('index', help='(re)index a directory of label files')
+    indexer.add_argument('labeldir')
+    indexer.add_argument('--db', default='annotations.sqlite')
+    indexer.add_argument('-w', '--workers', type=int, default=None, help='worker processes (1 disables the pool)')
+    searcher = sub.add_parser('query', help='search the index')
+    searcher.add_argument('--db', default='annotations.sqlite')
+    searcher.add_argument('--label')
+    searcher.add_argument('--type', dest='objtype', choices=['Polygon', 'Line', 'Point'])
+    searcher.add_argument('--min-area', type=float)
+    searcher.add_argument('--max-area', type=float)
+    searcher.add_argument('--bbox', type=float, nargs=4, metavar=('XMIN', 'YMIN', 'XMAX', 'YMAX'))
+    searcher.add_argument('--relative', action='store_true', help='bbox in fractions of the image size')
+    searcher.add_argument('--within', action='store_true', help='objects must lie inside the bbox')
+    searcher.add_argument('--count', action='store_true', help='only print the number of matches')
+    searcher.add_argument('--limit', type=int)
+    args = parser.parse_args()
+
+    if args.command == 'index':
+        nindexed, nremoved = update_index(args.db, args.labeldir, args.workers)
+        print('Indexed {} files, removed {}'.format(nindexed, nremoved))
+    elif args.command == 'query':
+        result = query(args.db, args.label, args.objtype, args.min_area, args.max_area, args.bbox,
+                       args.relative, args.within, args.count, args.limit)
+        if args.count:
+            print(result)
+        else:
+            for path, idx, label, objtype, area, box in result:
+                print('{}\t{}\t{}\t{}\t{:.1f}\t{}'.format(path, idx, label, objtype, area, ' '.join('{:.1f}'.format(c) for c in box)))
+    else:
+        parser.print_help()
@@ -0,0 +1,675 @@
+'''
+Qt-free annotation model shared by pyimannotate2 and the batch utilities.
+
+An Annotation holds the objects of one image as (N, 2) float arrays together
+with their types, labels and colors, and is read from/written to the .json
+label files and .csv workbooks produced by pyimannotate. Only NumPy is needed,
+so the utilities import in milliseconds and run in worker processes on machines
+without a display.
+'''
+
+import csv
+import json
+import math
+from base64 import b64encode, b64decode
+
+import numpy as np
+
+
+DEFAULT_LABEL = 'default'
+DEFAULT_COLOR = '#0006ff'
+CSV_COLUMNS = ['', 'Label', 'Object', 'Type', 'X', 'Y', 'height', 'width']
+
+
+def as_points(points):
+    '''(N, 2) float64 array from any sequence of (x, y) pairs
+    '''
+    return np.asarray(points, dtype=np.float64).reshape(-1, 2)
+
+
+class Annotation(object):
+    '''Objects of one image: vertex arrays plus per-object type, label and color
+    '''
+    def __init__(self, objects=None, types=None, labels=None, colors=None,
+                 imsize=None, imagePath=None, imageData=None):
+        self.objects = [as_points(obj) for obj in objects or []]
+        n = len(self.objects)
+        self.types = list(types) if types is not None else n*['Polygon']
+        self.labels = list(labels) if labels is not None else n*[DEFAULT_LABEL]
+        if colors is None or isinstance(colors, str):
+            colors = n*[colors or DEFAULT_COLOR]
+        self.colors = list(colors)
+        self.imsize = tuple(imsize) if imsize else None
+        self.imagePath = imagePath
+        self.imageData = imageData
+
+    def __len__(self):
+        return len(self.objects)
+
+    def geometry(self):
+        return geometry(self.objects, self.types)
+
+
+def pack(objects):
+    '''Concatenate objects into one (M, 2) array. Returns coords, starts, counts
+    '''
+    counts = np.array([len(obj) for obj in objects], dtype=np.intp)
+    if len(objects) == 0:
+        return np.zeros((0, 2)), counts, counts
+    coords = np.concatenate([as_points(obj) for obj in objects])
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.intp)
+    return coords, starts, counts
+
+
+def geometry(objects, types):
+    '''Vectorized bounding boxes and areas for a list of non-empty objects.
+    Returns (bbox, area) where bbox is an (n, 4) array of xmin, ymin, xmax, ymax
+    and area is the polygon area (0 for lines and points)
+    '''
+    if len(objects) == 0:
+        return np.zeros((0, 4)), np.zeros(0)
+    coords, starts, counts = pack(objects)
+    x, y = coords[:, 0], coords[:, 1]
+
+    bbox = np.stack([np.minimum.reduceat(x, starts), np.minimum.reduceat(y, starts),
+                     np.maximum.reduceat(x, starts), np.maximum.reduceat(y, starts)], axis=1)
+
+    #shoelace formula, each vertex paired with the next one of the same object
+    nxt = np.arange(1, len(coords)+1)
+    nxt[starts+counts-1] = starts
+    cross = x*y[nxt] - x[nxt]*y
+    area = np.abs(np.add.reduceat(cross, starts))/2
+    area[np.asarray(types) != 'Polygon'] = 0
+    return bbox, area
+
+
+def bounds(objects):
+    '''(n, 4) array of xmin, ymin, xmax, ymax per object; empty objects get
+    an inverted infinite box that intersects nothing
+    '''
+    bbox = np.empty((len(objects), 4))
+    bbox[:] = (np.inf, np.inf, -np.inf, -np.inf)
+    nonempty = [i for i, obj in enumerate(objects) if len(obj)]
+    if nonempty:
+        bbox[nonempty] = geometry([objects[i] for i in nonempty], len(nonempty)*['Line'])[0]
+    return bbox
+
+
+#unit step of each boundary direction: +x, +y, -x, -y (clockwise on screen, y down)
+STEPS = np.array([(1, 0), (0, 1), (-1, 0), (0, -1)], dtype=np.int64)
+
+
+def _cycles(nxt):
+    '''Split the permutation nxt into its cycles by pointer jumping. Returns
+    the element order (cycle by cycle, each starting at its smallest element
+    and following nxt) and the start offset and length of every cycle
+    '''
+    n = len(nxt)
+    index = np.arange(n)
+    #smallest element of each cycle: double the window of a running minimum
+    leader, jump = index.copy(), nxt.copy()
+    while True:
+        smaller = np.minimum(leader, leader[jump])
+        jump = jump[jump]
+        if np.array_equal(smaller, leader):
+            break
+        leader = smaller
+    #break every cycle in front of its leader and rank elements by their distance to the end
+    pred = np.empty(n, dtype=np.intp)
+    pred[nxt] = index
+    heads = np.nonzero(leader == index)[0]
+    jump = nxt.copy()
+    jump[pred[heads]] = pred[heads]
+    rank = (jump != index).astype(np.intp)
+    while not np.array_equal(jump, jump[jump]):
+        rank = rank + rank[jump]
+        jump = jump[jump]
+    order = np.lexsort((-rank, leader))
+    counts = rank[heads] + 1
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.intp)
+    return order, starts, counts
+
+
+def trace_contours(mask, min_area=0):
+    '''Outer boundaries of the 4-connected regions of a 2-D boolean mask as
+    (N, 2) arrays of pixel corners (x = column, y = row), clockwise on screen and
+    without collinear vertices. Holes are dropped, as are regions of min_area
+    pixels or less. Boundary pixel sides are linked into cycles with array
+    operations only (sorted-key successor lookup, then pointer jumping), so the
+    cost is O(E log E) in the number E of boundary sides
+    '''
+    mask = np.asarray(mask, dtype=bool)
+    h, w = mask.shape
+    padded = np.zeros((h+2, w+2), dtype=bool)
+    padded[1:-1, 1:-1] = mask
+    #one directed side per foreground pixel edge facing the background, the
+    #region on its right: top, right, bottom and left sides
+    xs, ys, dirs = [], [], []
+    for d, (dr, dc), (ox, oy) in zip(range(4), ((-1, 0), (0, 1), (1, 0), (0, -1)),
+                                     ((0, 0), (1, 0), (1, 1), (0, 1))):
+        r, c = np.nonzero(mask & ~padded[1+dr:h+1+dr, 1+dc:w+1+dc])
+        xs.append(c + ox)
+        ys.append(r + oy)
+        dirs.append(np.full(len(r), d, dtype=np.int64))
+    x, y, d = np.concatenate(xs).astype(np.int64), np.concatenate(ys).astype(np.int64), np.concatenate(dirs)
+    n = len(x)
+    if n == 0:
+        return []
+
+    #successor of each side: the side leaving its end corner, turning right
+    #first so that diagonally touching pixels stay separate regions
+    stride = w + 2
+    start = y*stride + x
+    end = start + STEPS[d, 1]*stride + STEPS[d, 0]
+    keys = start*4 + d
+    order = np.argsort(keys)
+    keys = keys[order]
+    nxt = np.full(n, -1, dtype=np.intp)
+    for turn in (1, 0, 3):
+        wanted = end*4 + (d + turn) % 4
+        pos = np.minimum(np.searchsorted(keys, wanted), n-1)
+        found = (keys[pos] == wanted) & (nxt < 0)
+        nxt[found] = order[pos[found]]
+
+    order, starts, counts = _cycles(nxt)
+    x, y, d = x[order], y[order], d[order]
+    #signed area, positive for outer boundaries and negative for holes
+    following = np.arange(1, n+1)
+    following[starts+counts-1] = starts
+    area = np.add.reduceat(x*y[following] - x[following]*y, starts)/2
+    #keep only the corners where the direction changes
+    previous = np.arange(-1, n-1)
+    previous[starts] = starts + counts - 1
+    corner = d != d[previous]
+    cycle = np.repeat(np.arange(len(starts)), counts)
+    keep = corner & (area > max(min_area, 0))[cycle]
+    ends = np.cumsum(np.bincount(cycle[keep], minlength=len(starts)))
+    coords = np.stack((x[keep], y[keep]), axis=1).astype(np.float64)
+    contours = np.split(coords, ends[:-1])
+    return [contour for contour, a in zip(contours, area) if a > max(min_area, 0)]
+
+
+def connected_component(mask, seed):
+    '''Boolean mask of the 4-connected region of a 2-D boolean mask that
+    contains the pixel seed (x = column, y = row). The rows are split into runs,
+    runs of adjacent rows that overlap are linked, and the runs are grouped by
+    min-label hooking with pointer jumping, so the number of passes grows with
+    the logarithm of the region size rather than its diameter
+    '''
+    mask = np.asarray(mask, dtype=bool)
+    h, w = mask.shape
+    x, y = seed
+    if not mask[y, x]:
+        return np.zeros((h, w), dtype=bool)
+    padded = np.zeros((h, w+2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    change = np.diff(padded, axis=1)
+    #runs start at +1 and end (exclusively) at -1 changes, in row-major order
+    rows, cols = np.nonzero(change)
+    rising = change[rows, cols] > 0
+    rows, first, last = rows[rising], cols[rising], cols[~rising]
+    #runs of the next row overlapping each run form a contiguous range
+    stride = w + 1
+    startkeys, endkeys = rows*stride + first, rows*stride + last
+    lo = np.searchsorted(endkeys, (rows+1)*stride + first, 'right')
+    hi = np.searchsorted(startkeys, (rows+1)*stride + last, 'left')
+    counts = np.maximum(hi - lo, 0)
+    u = np.repeat(np.arange(len(rows)), counts)
+    v = lo[u] + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    labels = np.arange(len(rows))
+    while len(u):
+        hooked = labels.copy()
+        lowest = np.minimum(labels[u], labels[v])
+        np.minimum.at(hooked, labels[u], lowest)
+        np.minimum.at(hooked, labels[v], lowest)
+        while True:
+            jumped = hooked[hooked]
+            if np.array_equal(jumped, hooked):
+                break
+            hooked = jumped
+        if np.array_equal(hooked, labels):
+            break
+        labels = hooked
+    seedrun = np.searchsorted(startkeys, y*stride + x, 'right') - 1
+    inside = labels == labels[seedrun]
+    #paint the runs of the region: +1 at their first column, -1 past their
+    #last (runs never share either), the running sum is then 0 or 1
+    change[:] = 0
+    change[rows[inside], first[inside]] = 1
+    change[rows[inside], last[inside]] = -1
+    return np.cumsum(change[:, :w], axis=1, dtype=np.int8).view(bool)
+
+
+def flood_fill(image, seed, tolerance, window=256, limit=1024):
+    '''Region of the pixels connected to seed (x, y) whose every channel is
+    within tolerance of the seed pixel's, in a 2-D (gray) or 3-D (channels last)
+    image array, which may be a view of a larger buffer. Only a window around the
+    seed is compared; it doubles while the region touches its border, up to limit
+    pixels. Returns the region mask of the window and the window origin (x, y)
+    '''
+    if image.ndim == 2:
+        image = image[:, :, np.newaxis]
+    h, w, channels = image.shape
+    x, y = seed
+    value = image[y, x].tolist()
+    size = window
+    while True:
+        x0, y0 = max(x - size//2, 0), max(y - size//2, 0)
+        x1, y1 = min(x0 + size, w), min(y0 + size, h)
+        #one channel plane at a time, comparing against the value range directly
+        similar = np.ones((y1-y0, x1-x0), dtype=bool)
+        for c in range(channels):
+            plane = image[y0:y1, x0:x1, c]
+            similar &= (plane >= value[c] - tolerance) & (plane <= value[c] + tolerance)
+        region = connected_component(similar, (x - x0, y - y0))
+        clipped = ((x0 > 0 and region[:, 0].any()) or (y0 > 0 and region[0].any()) or
+                   (x1 < w and region[:, -1].any()) or (y1 < h and region[-1].any()))
+        if not clipped or size >= limit:
+            return region, (x0, y0)
+        size *= 2
+
+
+def simplify(objects, tolerance, closed=True):
+    '''Douglas-Peucker simplification of many objects at once: vertices within
+    tolerance of the simplified outline are dropped. closed (one flag or one per
+    object) marks polygons, whose outline returns to the first vertex. All
+    objects are packed into one array and every pass splits all the segments
+    still farther than tolerance from their chord, so the number of passes is
+    the depth of the recursion, not the number of objects. Objects nothing can
+    be removed from, and objects that would keep fewer than 3 (polygons) or 2
+    vertices, are returned as they are
+    '''
+    objects = [as_points(obj) for obj in objects]
+    if not objects:
+        return []
+    closed = np.broadcast_to(np.asarray(closed, dtype=bool), (len(objects),))
+    coords, starts, counts = pack(objects)
+    #closed outlines get their first vertex appended, so they become chains from it back to it
+    closing = closed & (counts > 1)
+    coords = np.insert(coords, (starts+counts)[closing], coords[starts[closing]], axis=0)
+    counts = counts + closing
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.intp)
+    nonempty = counts > 0
+    keep = np.zeros(len(coords), dtype=bool)
+    keep[starts[nonempty]] = True
+    keep[(starts+counts-1)[nonempty]] = True
+    active = ~keep
+    x, y = coords[:, 0], coords[:, 1]
+    tolerance2 = float(tolerance)**2
+    while active.any():
+        #the kept vertices before and after every vertex delimit its segment
+        points = np.nonzero(active)[0]
+        kept = np.nonzero(keep)[0]
+        after = np.searchsorted(kept, points)
+        segment, nxt = kept[after-1], kept[after]
+        abx, aby = x[nxt] - x[segment], y[nxt] - y[segment]
+        apx, apy = x[points] - x[segment], y[points] - y[segment]
+        length2 = abx*abx + aby*aby
+        t = np.clip((apx*abx + apy*aby)/np.where(length2 > 0, length2, 1), 0, 1)
+        dist2 = (apx - t*abx)**2 + (apy - t*aby)**2
+        #farthest vertex of every segment (segments are contiguous runs of points)
+        first = np.concatenate(([0], np.nonzero(np.diff(segment))[0] + 1))
+        farthest = np.maximum.reduceat(dist2, first)
+        group = np.repeat(np.arange(len(first)), np.diff(np.append(first, len(points))))
+        hit = np.nonzero(dist2 == farthest[group])[0]
+        hit = hit[np.diff(group[hit], prepend=-1) != 0]
+        split = farthest > tolerance2
+        keep[points[hit[split]]] = True
+        active[points] = split[group]
+        active &= ~keep
+    #drop the appended vertices and count what each object keeps
+    appended = (starts+counts-1)[closing]
+    coords, keep = np.delete(coords, appended, axis=0), np.delete(keep, appended)
+    counts = counts - closing
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.intp)
+    kept = np.bincount(np.repeat(np.arange(len(objects)), counts)[keep], minlength=len(objects))
+    result = []
+    for obj, start, count, nkept, isclosed in zip(objects, starts, counts, kept, closed):
+        if nkept == count or nkept < min(count, 3 if isclosed else 2):
+            result.append(obj)
+        else:
+            result.append(coords[start:start+count][keep[start:start+count]])
+    return result
+
+
+def points_in_polygon(points, polygon, chunk=2**20):
+    '''Boolean mask of the points lying inside polygon (even-odd rule), tested
+    against all edges at once; points are processed in blocks of about chunk
+    point-edge pairs to bound memory
+    '''
+    points, polygon = as_points(points), as_points(polygon)
+    inside = np.zeros(len(points), dtype=bool)
+    if len(polygon) < 3:
+        return inside
+    x0, y0 = polygon[:, 0], polygon[:, 1]
+    x1, y1 = np.roll(x0, -1), np.roll(y0, -1)
+    dy = np.where(y1 == y0, 1.0, y1 - y0)
+    slope = (x1 - x0)/dy
+    step = max(1, chunk//len(polygon))
+    for i in range(0, len(points), step):
+        x, y = points[i:i+step, 0:1], points[i:i+step, 1:2]
+        #edges straddling the horizontal ray from the point, crossed to its right
+        crosses = ((y0 > y) != (y1 > y)) & (x < x0 + (y - y0)*slope)
+        inside[i:i+step] = crosses.sum(axis=1) % 2 == 1
+    return inside
+
+
+class StrokeSimplifier(object):
+    '''Streaming simplification of a freehand stroke (sleeve fitting): every
+    point is handled in constant time as it arrives. Directions from the last
+    fixed vertex (the anchor) that keep all points since within tolerance of
+    the chord are narrowed to an angular window; when a point falls outside
+    it, or the stroke turns back, the previous point becomes a vertex and the
+    new anchor. Sideways and backward deviations are each held to
+    tolerance/sqrt(2), so together they stay within tolerance. Points closer
+    than spacing to the previous one are dropped
+    '''
+    def __init__(self, x, y, tolerance, spacing=0.0):
+        self.tolerance = float(tolerance)/math.sqrt(2)
+        self.spacing2 = float(spacing)**2
+        self.vertices = [(x, y)]
+        self.last = (x, y)
+        self.reset()
+
+    def reset(self):
+        self.reference = None #direction of the window center, the window is relative to it
+        self.lo = self.hi = 0.0
+        self.reach = 0.0
+
+    def push(self, x, y):
+        '''Add a point. Returns the vertex it fixed, or None'''
+        dx, dy = x - self.last[0], y - self.last[1]
+        if dx*dx + dy*dy < self.spacing2:
+            return None
+        fixed = None
+        if not self.fits(x, y):
+            fixed = self.last
+            self.vertices.append(fixed)
+            self.reset()
+            self.fits(x, y)
+        self.last = (x, y)
+        return fixed
+
+    def fits(self, x, y):
+        '''Narrow the window to the point, False if the chord can no longer
+        follow it'''
+        ax, ay = self.vertices[-1]
+        dx, dy = x - ax, y - ay
+        d = math.hypot(dx, dy)
+        if d < self.reach - self.tolerance:
+            return False
+        self.reach = max(self.reach, d)
+        if d == 0:
+            return True
+        angle = math.atan2(dy, dx)
+        if self.reference is not None:
+            #the chord to this point must still pass within tolerance of the earlier ones
+            offset = (angle - self.reference + math.pi) % (2*math.pi) - math.pi
+            if not self.lo <= offset <= self.hi:
+                return False
+        if d > self.tolerance:
+            spread = math.asin(self.tolerance/d)
+            if self.reference is None:
+                self.reference, self.lo, self.hi = angle, -spread, spread
+            else:
+                self.lo, self.hi = max(self.lo, offset-spread), min(self.hi, offset+spread)
+        return True
+
+    def finish(self):
+        '''(N, 2) array of the vertices, ending with the last point'''
+        if self.last != self.vertices[-1]:
+            self.vertices.append(self.last)
+        return as_points(self.vertices)
+
+
+class GridIndex(object):
+    '''Uniform grid over axis-aligned boxes answering "which boxes intersect
+    this rectangle" without testing every box. Built in one vectorized pass;
+    query returns candidate ids that still need an exact bbox test
+    '''
+    def __init__(self, bbox, cellsize=None):
+        bbox = np.asarray(bbox, dtype=np.float64).reshape(-1, 4)
+        valid = np.nonzero(np.isfinite(bbox).all(axis=1))[0]
+        box = bbox[valid]
+        if cellsize is None:
+            if len(box):
+                sizes = np.maximum(box[:, 2]-box[:, 0], box[:, 3]-box[:, 1])
+                extent = (box[:, 2:].max(axis=0) - box[:, :2].min(axis=0)).max()
+                cellsize = max(2*np.median(sizes), extent/np.sqrt(len(box)))
+            cellsize = cellsize or 1.0
+        self.cellsize = float(cellsize)
+        self.origin = box[:, :2].min(axis=0) if len(box) else np.zeros(2)
+
+        c0 = self.cell(box[:, :2])
+        c1 = self.cell(box[:, 2:])
+        spans = c1 - c0 + 1
+        counts = spans[:, 0]*spans[:, 1]
+        self.ncols = int(c1[:, 0].max()) + 1 if len(box) else 1
+        self.nrows = int(c1[:, 1].max()) + 1 if len(box) else 1
+
+        #one (cell, id) entry per cell covered by each box
+        owner = np.repeat(np.arange(len(box)), counts)
+        k = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        cx = c0[owner, 0] + k % spans[owner, 0]
+        cy = c0[owner, 1] + k // spans[owner, 0]
+        keys = cy*self.ncols + cx
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.ids = valid[owner[order]]
+
+    def cell(self, xy):
+        return np.floor((np.asarray(xy) - self.origin)/self.cellsize).astype(np.intp)
+
+    def query(self, rect):
+        '''Candidate ids for the rectangle (xmin, ymin, xmax, ymax)'''
+        (x0, y0), (x1, y1) = self.cell([rect[:2], rect[2:]])
+        x0, x1 = max(x0, 0), min(x1, self.ncols-1)
+        y0, y1 = max(y0, 0), min(y1, self.nrows-1)
+        if x0 > x1 or y0 > y1:
+            return np.zeros(0, dtype=np.intp)
+        rows = np.arange(y0, y1+1)*self.ncols
+        lo = np.searchsorted(self.keys, rows + x0, 'left')
+        hi = np.searchsorted(self.keys, rows + x1, 'right')
+        if len(rows) == 1:
+            return np.unique(self.ids[lo[0]:hi[0]])
+        return np.unique(np.concatenate([self.ids[a:b] for a, b in zip(lo, hi)]))
+
+
+class SegmentIndex(object):
+    '''Vertices and edges of many objects, with a GridIndex over the edge
+    boxes so that nearest() only tests the edges around the query point.
+    Every vertex starts exactly one edge: the closing edge of closed objects,
+    a degenerate one for the last vertex of open objects. indexed=False skips
+    the grid (for a handful of objects that change often)
+    '''
+    def __init__(self, objects, closed=True, indexed=True):
+        objects = [as_points(obj) for obj in objects]
+        closed = np.broadcast_to(np.asarray(closed, dtype=bool), (len(objects),))
+        coords, starts, counts = pack(objects)
+        self.owner = np.repeat(np.arange(len(objects)), counts)
+        self.a = np.arange(len(coords))
+        self.b = self.a + 1
+        nonempty = counts > 0
+        last = (starts+counts-1)[nonempty]
+        self.b[last] = np.where(closed[nonempty], starts[nonempty], last)
+        self.coords = coords
+        self.index = None
+        if indexed and len(coords):
+            p, q = coords[self.a], coords[self.b]
+            self.index = GridIndex(np.concatenate((np.minimum(p, q), np.maximum(p, q)), axis=1))
+
+    def nearest(self, xy, radius, edges=True, skip=None):
+        '''Nearest vertex to xy within radius or, with edges, the nearest
+        point on an edge if no vertex is that close. skip is a boolean mask of
+        owners to ignore. Returns (kind, squared distance, (x, y), owner) with
+        kind 0 for a vertex and 1 for an edge point, or None
+        '''
+        x, y = xy
+        if self.index is not None:
+            ids = self.index.query((x-radius, y-radius, x+radius, y+radius))
+        else:
+            ids = self.a
+        if skip is not None and len(ids):
+            ids = ids[~skip[self.owner[ids]]]
+        if not len(ids):
+            return None
+        radius2 = radius*radius
+        px, py = self.coords[self.a[ids], 0] - x, self.coords[self.a[ids], 1] - y
+        dist2 = px*px + py*py
+        k = int(dist2.argmin())
+        if dist2[k] <= radius2:
+            i = ids[k]
+            return 0, float(dist2[k]), tuple(self.coords[i].tolist()), int(self.owner[i])
+        if not edges:
+            return None
+        qx, qy = self.coords[self.b[ids], 0] - x, self.coords[self.b[ids], 1] - y
+        abx, aby = qx - px, qy - py
+        length2 = abx*abx + aby*aby
+        t = np.clip(-(px*abx + py*aby)/np.where(length2 > 0, length2, 1), 0, 1)
+        dx, dy = px + t*abx, py + t*aby
+        dist2 = dx*dx + dy*dy
+        k = int(dist2.argmin())
+        if dist2[k] <= radius2:
+            return 1, float(dist2[k]), (x + float(dx[k]), y + float(dy[k])), int(self.owner[ids[k]])
+        return None
+
+
+class ShapeStore(object):
+    '''Array-backed storage of many objects: one compact (N, 2) array per
+    object plus an (n, 4) bbox array, types, labels (any objects, e.g. label
+    classes) and a GridIndex over the boxes. Objects changed after the index
+    was built are kept in a small dirty set that queries check as well; the
+    index is rebuilt once that set grows past rebuild_after
+    '''
+    rebuild_after = 1024
+
+    def __init__(self, objects=(), types=None, labels=None):
+        self.objects = [as_points(obj) for obj in objects]
+        n = len(self.objects)
+        self.types = list(types) if types is not None else n*['Polygon']
+        self.labels = list(labels) if labels is not None else n*[None]
+        self._bbox = bounds(self.objects)
+        self._alive = np.ones(n, dtype=bool)
+        self._n = n
+        self.index = None
+        self.dirty = set()
+
+    def __len__(self):
+        return int(self._alive[:self._n].sum())
+
+    @property
+    def bbox(self):
+        return self._bbox[:self._n]
+
+    def live(self):
+        '''Ids of the objects not removed, in insertion order'''
+        return np.nonzero(self._alive[:self._n])[0]
+
+    def append(self, coords, objtype='Polygon', label=None):
+        if self._n == len(self._bbox):
+            grow = max(64, self._n)
+            self._bbox = np.concatenate((self._bbox, np.zeros((grow, 4))))
+            self._alive = np.concatenate((self._alive, np.zeros(grow, dtype=bool)))
+        i = self._n
+        self._n += 1
+        self.objects.append(None)
+        self.types.append(objtype)
+        self.labels.append(label)
+        self._alive[i] = True
+        self.update(i, coords)
+        self.dirty.add(i)
+        return i
+
+    def update(self, i, coords=None, objtype=None, label=None):
+        '''Replace an object's vertices, type or label'''
+        if objtype is not None:
+            self.types[i] = objtype
+        if label is not None:
+            self.labels[i] = label
+        if coords is not None:
+            self.objects[i] = as_points(coords)
+            box = bounds(self.objects[i:i+1])[0]
+            if not np.array_equal(box, self._bbox[i]):
+                self._bbox[i] = box
+                self.dirty.add(i)
+
+    def remove(self, i):
+        self._alive[i] = False
+        self.objects[i] = None
+        self.labels[i] = None
+
+    def query(self, rect):
+        '''Ids of live objects whose box intersects (xmin, ymin, xmax, ymax)'''
+        if self.index is None or len(self.dirty) > self.rebuild_after:
+            self.index = GridIndex(self.bbox)
+            self.dirty = set()
+        ids = self.index.query(rect)
+        if self.dirty:
+            ids = np.union1d(ids, np.fromiter(self.dirty, dtype=np.intp, count=len(self.dirty)))
+        box = self._bbox[ids]
+        hit = ((box[:, 0] <= rect[2]) & (box[:, 2] >= rect[0]) &
+               (box[:, 1] <= rect[3]) & (box[:, 3] >= rect[1]) & self._alive[ids])
+        return ids[hit]
+
+
+def read_json(filename, imageData=True):
+    '''Read a pyimannotate .json label file. Files written by the first version
+    of pyimannotate (no labels, single colors) get the default label and color.
+    Embedded image bytes are decoded only if imageData
+    '''
+    with open(filename, 'rb') as f:
+        data = json.load(f)
+    imageData = data.pop('imageData', None) if imageData else None
+    return Annotation(objects=data['objects'], types=data.get('type'), labels=data.get('label'),
+                      colors=data.get('lineColor'), imsize=data.get('width/height'),
+                      imagePath=data.get('imagePath'),
+                      imageData=b64decode(imageData) if imageData else None)
+
+
+def write_json(annotation, filename, savebytes=False, extra=None):
+    '''Write a .json label file, embedding the image bytes if savebytes. extra
+    holds further keys to write (e.g. the fillColor of the first pyimannotate)
+    '''
+    data = {'objects': [obj.tolist() for obj in annotation.objects],
+            'type': annotation.types,
+            'label': annotation.labels,
+            'width/height': annotation.imsize,
+            'lineColor': annotation.colors,
+            'imagePath': annotation.imagePath}
+    data.update(extra or {})
+    if savebytes and annotation.imageData is not None:
+        data['imageData'] = b64encode(annotation.imageData).decode('utf-8')
+    with open(filename, 'w') as f:
+        json.dump(data, f, ensure_ascii=True, indent=2)
+
+
+def read_csv(filename):
+    '''Read a pyimannotate .csv workbook (one row per vertex)
+    '''
+    points, types, labels = {}, {}, {}
+    imsize = None
+    with open(filename, newline='') as f:
+        for row in csv.DictReader(f):
+            obj = row['Object']
+            points.setdefault(obj, []).append((float(row['X']), float(row['Y'])))
+            types[obj] = row.get('Type') or 'Polygon'
+            labels[obj] = row.get('Label') or DEFAULT_LABEL
+            imsize = (int(float(row['width'])), int(float(row['height'])))
+    return Annotation(objects=list(points.values()), types=[types[obj] for obj in points],
+                      labels=[labels[obj] for obj in points], imsize=imsize)
+
+
+def write_csv(annotation, filename):
+    '''Write a .csv workbook with one row per vertex, in the column layout
+    pyimannotate has always used
+    '''
+    width, height = annotation.imsize or (None, None)
+    with open(filename, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_COLUMNS)
+        row = 0
+        for i, obj in enumerate(annotation.objects):
+            label, objtype = annotation.labels[i], annotation.types[i]
+            writer.writerows([row+j, label, i+1, objtype, x, y, height, width]
+                             for j, (x, y) in enumerate(obj.tolist()))
+            row += len(obj)
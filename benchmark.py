@@ -0,0 +1,480 @@
+'''
+Synthetic-scene benchmarks for the pyimannotate2 hot paths: hover handling in
+SubQGraphicsScene.mouseMoveEvent, full scene repaint (Shape.paint), repainted
+area per hover/drag/draw event with and without precise invalidation,
+Annotationscene.save, MainWindow.loadjson/loadShapes (and loadShapes alone),
+Douglas-Peucker simplification (vertex reduction, save and render times) and
+binarymask.produce_mask.
+
+Runs under the Qt offscreen platform and prints (or writes with -o) a json
+report, so results of different versions can be compared with a plain diff
+or a small script.
+
+Usage:
+python benchmark.py --shapes 100 1000 --vertices 8 64 -o results.json
+python benchmark.py --only hover repaint
+'''
+
+import os
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import argparse
+import json
+import math
+import platform
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from PyQt5.QtCore import QEvent, QObject, QPointF, QRectF, QT_VERSION_STR, Qt
+from PyQt5.QtGui import QColor, QImage, QPainter, QPixmap
+from PyQt5.QtWidgets import QApplication, QGraphicsView
+
+import pyimannotate2
+
+
+IMSIZE = (4000, 3000)
+BENCHMARKS = []
+
+
+def benchmark(fn):
+    '''Register a benchmark. fn(ctx) returns a dict of results
+    '''
+    BENCHMARKS.append(fn)
+    return fn
+
+
+def synthetic_objects(nshapes, nvertices, imsize=IMSIZE, seed=0):
+    '''Star-shaped polygons with nvertices scattered over the image
+    '''
+    rnd = random.Random(seed)
+    objects = []
+    for i in range(nshapes):
+        cx, cy = rnd.uniform(0, imsize[0]), rnd.uniform(0, imsize[1])
+        radius = rnd.uniform(5, 60)
+        objects.append([(cx + radius*(0.6+0.4*rnd.random())*math.cos(2*math.pi*k/nvertices),
+                         cy + radius*(0.6+0.4*rnd.random())*math.sin(2*math.pi*k/nvertices))
+                        for k in range(nvertices)])
+    return objects
+
+
+def write_labelfile(filename, objects, labels=('buildings', 'roads', 'cars')):
+    types = ['Polygon']*len(objects)
+    names = [labels[i % len(labels)] for i in range(len(objects))]
+    colors = [QColor.fromHsv(60*labels.index(name), 255, 255).name() for name in names]
+    with open(filename, 'w') as f:
+        json.dump({'objects': objects, 'type': types, 'label': names, 'width/height': IMSIZE,
+                   'lineColor': colors, 'imagePath': ''}, f)
+
+
+def timed(fn, repeat):
+    '''Run fn repeat times, return the timings in milliseconds
+    '''
+    timings = []
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        timings.append(1000*(time.perf_counter() - t0))
+    return timings
+
+
+def summary(timings, **extra):
+    timings = sorted(timings)
+    n = len(timings)
+    result = {'n': n, 'median_ms': timings[n//2], 'p95_ms': timings[min(n-1, int(0.95*n))],
+              'min_ms': timings[0], 'max_ms': timings[-1]}
+    result.update(extra)
+    return result
+
+
+class Context(object):
+    '''A MainWindow with a synthetic image and label file loaded
+    '''
+    def __init__(self, nshapes, nvertices, repeat, tmpdir):
+        self.nshapes, self.nvertices, self.repeat, self.tmpdir = nshapes, nvertices, repeat, tmpdir
+        self.objects = synthetic_objects(nshapes, nvertices)
+        self.labelfile = os.path.join(tmpdir, 'synthetic_{}_{}.json'.format(nshapes, nvertices))
+        write_labelfile(self.labelfile, self.objects)
+        self.window = self.load()
+
+    def load(self, labelfile=None):
+        window = pyimannotate2.MainWindow()
+        window.resize(1200, 900)
+        pixmap = QPixmap(*IMSIZE)
+        pixmap.fill(QColor(90, 120, 90))
+        window.imname = 'synthetic'
+        window.currentPath = self.tmpdir + os.sep
+        window.imageData = b'synthetic'
+        window.imsizes = IMSIZE
+        window.viewer.setPhoto(pixmap)
+        window.loadjson(labelfile or self.labelfile)
+        window.loadShapes(window.shapestoload, window.object_types)
+        QApplication.processEvents() #let the scene build its BSP index, as the event loop would
+        return window
+
+    @property
+    def scene(self):
+        return self.window.viewer.scene
+
+
+class MouseEvent(object):
+    '''Stand-in for QGraphicsSceneMouseEvent, which PyQt5 does not let us construct
+    '''
+    def __init__(self, kind, pos, buttons=Qt.NoButton):
+        self.kind, self.pos, self._buttons = kind, pos, buttons
+
+    def type(self):
+        return self.kind
+
+    def scenePos(self):
+        return self.pos
+
+    def screenPos(self):
+        return self.pos.toPoint()
+
+    def button(self):
+        return Qt.LeftButton if self._buttons != Qt.NoButton else Qt.NoButton
+
+    def buttons(self):
+        return self._buttons
+
+    def accept(self):
+        pass
+
+
+STARTUP = '''
+import sys
+import pyimannotate2
+from PyQt5.QtWidgets import QApplication, QGraphicsView
+app = QApplication([])
+window = pyimannotate2.MainWindow()
+window.show()
+app.processEvents()
+sys.stdout.write('ready\\n')
+sys.stdout.flush()
+'''
+
+
+@benchmark
+def startup(ctx):
+    '''Process start to the MainWindow shown: launch a fresh interpreter, import
+    pyimannotate2, build and show the window (independent of scene size)'''
+    here = os.path.dirname(os.path.abspath(__file__))
+    timings = []
+    for i in range(ctx.repeat):
+        t0 = time.perf_counter()
+        child = subprocess.Popen([sys.executable, '-c', STARTUP], cwd=here,
+                                 stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        child.stdout.readline()
+        timings.append(1000*(time.perf_counter() - t0))
+        child.wait()
+    return summary(timings)
+startup.once = True
+
+
+@benchmark
+def hover(ctx):
+    '''Latency of one hover mouseMoveEvent (vertex search, itemAt, highlight), with
+    the coalesced hover processed right away'''
+    scene = ctx.scene
+    scene.mode = scene.NAVIGATION
+    rnd = random.Random(1)
+    positions = [QPointF(*rnd.choice(rnd.choice(ctx.objects))) if i % 2 else
+                 QPointF(rnd.uniform(0, IMSIZE[0]), rnd.uniform(0, IMSIZE[1])) for i in range(20*ctx.repeat)]
+    events = [MouseEvent(QEvent.GraphicsSceneMouseMove, pos) for pos in positions]
+    it = iter(events)
+
+    def hover():
+        scene.mouseMoveEvent(next(it))
+        scene.flushHover()
+    timings = timed(hover, len(events))
+    return summary(timings, events_per_s=1000.0*len(timings)/sum(timings))
+
+
+@benchmark
+def drag(ctx):
+    '''Latency of one mouseMoveEvent while dragging a shape in moving mode'''
+    scene = ctx.scene
+    scene.mode = scene.MOVING
+    start = QPointF(*ctx.objects[0][0])
+    scene.mousePressEvent(MouseEvent(QEvent.GraphicsSceneMousePress, start, Qt.LeftButton))
+    scene.selectedShape = scene.selectedShape or next(iter(scene.polys), None)
+    scene.prevPoint = start
+    steps = [MouseEvent(QEvent.GraphicsSceneMouseMove, start + QPointF(i % 7, i % 5), Qt.LeftButton)
+             for i in range(20*ctx.repeat)]
+    it = iter(steps)
+    timings = timed(lambda: scene.mouseMoveEvent(next(it)), len(steps))
+    scene.mouseReleaseEvent(MouseEvent(QEvent.GraphicsSceneMouseRelease, start))
+    scene.mode = scene.NAVIGATION
+    return summary(timings)
+
+
+@benchmark
+def repaint(ctx):
+    '''Full repaint of the scene (photo and every Shape.paint) into a 1200x900 image'''
+    scene = ctx.scene
+    target = QImage(1200, 900, QImage.Format_ARGB32_Premultiplied)
+
+    def render():
+        painter = QPainter(target)
+        scene.render(painter, QRectF(target.rect()), scene.sceneRect())
+        painter.end()
+    return summary(timed(render, ctx.repeat))
+
+
+class RepaintMeter(QObject):
+    '''Sums the viewport area repainted (in pixels) and counts Shape.paint calls
+    '''
+    def __init__(self, viewport):
+        super(RepaintMeter, self).__init__()
+        self.area = self.paints = self.frames = 0
+        self.viewport = viewport
+        viewport.installEventFilter(self)
+        self.original = pyimannotate2.Shape.paint
+        meter = self
+
+        def paint(shape, painter, option, widget):
+            meter.paints += 1
+            return meter.original(shape, painter, option, widget)
+        pyimannotate2.Shape.paint = paint
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint:
+            self.frames += 1
+            self.area += sum(r.width()*r.height() for r in event.region().rects())
+        return False
+
+    def close(self):
+        pyimannotate2.Shape.paint = self.original
+        self.viewport.removeEventFilter(self)
+
+
+@benchmark
+def invalidation(ctx):
+    '''Repainted viewport area and Shape.paint calls per event for hover, shape
+    drag and drawing, with scene-wide update() versus precise per-shape invalidation'''
+    window, scene = ctx.window, ctx.scene
+    app = QApplication.instance()
+    window.show()
+    window.viewer.fitInView(QRectF(0, 0, IMSIZE[0]/4, IMSIZE[1]/4), Qt.KeepAspectRatio)
+    app.processEvents()
+    rnd = random.Random(2)
+    inview = [obj for obj in ctx.objects if obj[0][0] < IMSIZE[0]/4 and obj[0][1] < IMSIZE[1]/4] or ctx.objects
+    nevents = 10*ctx.repeat
+    result = {}
+    for precise in (False, True):
+        scene.preciseUpdates = precise
+        window.viewer.setViewportUpdateMode(QGraphicsView.MinimalViewportUpdate if precise
+                                            else QGraphicsView.BoundingRectViewportUpdate)
+        for interaction in ('hover', 'drag', 'draw'):
+            app.processEvents()
+            meter = RepaintMeter(window.viewer.viewport())
+            t0 = time.perf_counter()
+            if interaction == 'hover':
+                scene.mode = scene.NAVIGATION
+                for i in range(nevents):
+                    scene.mouseMoveEvent(MouseEvent(QEvent.GraphicsSceneMouseMove, QPointF(*rnd.choice(rnd.choice(inview)))))
+                    scene.flushHover()
+                    app.processEvents()
+            elif interaction == 'drag':
+                scene.mode = scene.MOVING
+                start = QPointF(*inview[0][0])
+                scene.mousePressEvent(MouseEvent(QEvent.GraphicsSceneMousePress, start, Qt.LeftButton))
+                scene.prevPoint = start
+                for i in range(nevents):
+                    scene.mouseMoveEvent(MouseEvent(QEvent.GraphicsSceneMouseMove, start + QPointF(i % 7, i % 5), Qt.LeftButton))
+                    app.processEvents()
+                scene.mouseReleaseEvent(MouseEvent(QEvent.GraphicsSceneMouseRelease, start))
+            else:
+                scene.mode = scene.DRAWING
+                for i in range(nevents):
+                    pos = QPointF(100 + 5*i, 100 + 3*(i % 4))
+                    if i % 5 == 0:
+                        scene.mousePressEvent(MouseEvent(QEvent.GraphicsSceneMousePress, pos, Qt.LeftButton))
+                    scene.mouseMoveEvent(MouseEvent(QEvent.GraphicsSceneMouseMove, pos + QPointF(2, 2)))
+                    app.processEvents()
+                scene.finalisepoly(premature=True)
+            app.processEvents()
+            elapsed = 1000*(time.perf_counter() - t0)
+            meter.close()
+            scene.mode = scene.NAVIGATION
+            key = '{}_{}'.format(interaction, 'precise' if precise else 'scene')
+            result[key] = {'px_per_event': meter.area/nevents, 'paints_per_event': meter.paints/nevents,
+                           'frames': meter.frames, 'ms_per_event': elapsed/nevents}
+    for interaction in ('hover', 'drag', 'draw'):
+        before, after = result[interaction+'_scene'], result[interaction+'_precise']
+        result[interaction+'_area_reduction'] = 1 - after['px_per_event']/max(before['px_per_event'], 1)
+    window.hide()
+    return summary([r['ms_per_event'] for key, r in result.items() if key.endswith('_precise')], **result)
+
+
+@benchmark
+def save(ctx):
+    '''Annotationscene.save of the loaded scene (.json and .csv)'''
+    window, scene = ctx.window, ctx.scene
+    filename = os.path.join(ctx.tmpdir, 'saved.json')
+    timings = timed(lambda: window.saveFile(filename, scene.polys, scene.objtypes, window.labelAssigner(),
+                                            [shape.line_color.name() for shape in scene.polys]), ctx.repeat)
+    return summary(timings, objects_per_s=1000.0*ctx.nshapes/min(timings))
+
+
+@benchmark
+def load(ctx):
+    '''MainWindow.loadjson + loadShapes of the synthetic label file'''
+    window = ctx.window
+    timings = []
+    for i in range(ctx.repeat):
+        window.imageData = b'synthetic'
+        window.resetState()
+        t0 = time.perf_counter()
+        window.loadjson(ctx.labelfile)
+        window.loadShapes(window.shapestoload, window.object_types)
+        timings.append(1000*(time.perf_counter() - t0))
+    window.imageData = b'synthetic'
+    QApplication.processEvents()
+    return summary(timings, objects_per_s=1000.0*ctx.nshapes/min(timings))
+
+
+@benchmark
+def insert(ctx):
+    '''MainWindow.loadShapes alone: Shape creation, labelling and scene insertion'''
+    window = ctx.window
+    timings = []
+    for i in range(ctx.repeat):
+        window.imageData = b'synthetic'
+        window.resetState()
+        window.loadjson(ctx.labelfile)
+        t0 = time.perf_counter()
+        window.loadShapes(window.shapestoload, window.object_types)
+        timings.append(1000*(time.perf_counter() - t0))
+    window.imageData = b'synthetic'
+    QApplication.processEvents()
+    return summary(timings, objects_per_s=1000.0*ctx.nshapes/min(timings))
+
+
+def densify(objects, per_edge=16, noise=0.25, seed=0):
+    '''Subdivide every edge into per_edge vertices jittered by up to noise
+    pixels, like outlines traced by hand or imported from masks'''
+    rnd = random.Random(seed)
+    dense = []
+    for obj in objects:
+        points = []
+        for (x0, y0), (x1, y1) in zip(obj, obj[1:] + obj[:1]):
+            points += [(x0 + (x1-x0)*k/per_edge + rnd.uniform(-noise, noise),
+                        y0 + (y1-y0)*k/per_edge + rnd.uniform(-noise, noise)) for k in range(per_edge)]
+        dense.append(points)
+    return dense
+
+
+@benchmark
+def simplify(ctx):
+    '''Douglas-Peucker at 1 px on densified outlines (16 vertices per edge):
+    vertex reduction, engine time, Annotationscene.save with and without
+    simplification, and a zoomed-out full repaint with and without render-time
+    simplification'''
+    labelfile = os.path.join(ctx.tmpdir, 'dense.json')
+    write_labelfile(labelfile, densify(ctx.objects))
+    window = ctx.load(labelfile)
+    scene = window.viewer.scene
+    coords = [shape.coords for shape in scene.polys]
+    nbefore = sum(len(c) for c in coords)
+    engine = timed(lambda: pyimannotate2.simplify(coords, 1.0), ctx.repeat)
+    nafter = sum(len(c) for c in pyimannotate2.simplify(coords, 1.0))
+
+    filename = os.path.join(ctx.tmpdir, 'dense_saved.json')
+    save = {}
+    for key, enabled in (('full', False), ('simplified', True)):
+        window.simplifyonsave = enabled
+        save[key] = min(timed(lambda: window.saveFile(filename, *scene.contents()), ctx.repeat))
+    window.simplifyonsave = False
+
+    target = QImage(1200, 900, QImage.Format_ARGB32_Premultiplied)
+
+    def render():
+        painter = QPainter(target)
+        scene.render(painter, QRectF(target.rect()), scene.sceneRect())
+        painter.end()
+    tolerance = pyimannotate2.Shape.renderTolerance
+    paint = {}
+    try:
+        for key, value in (('full', None), ('simplified', tolerance)):
+            pyimannotate2.Shape.renderTolerance = value
+            render() #build the cached paths
+            paint[key] = timed(render, ctx.repeat)
+    finally:
+        pyimannotate2.Shape.renderTolerance = tolerance
+    window.close()
+    return summary(paint['simplified'], vertices_before=nbefore, vertices_after=nafter,
+                   reduction=1.0 - float(nafter)/nbefore, engine_ms=min(engine),
+                   save_full_ms=save['full'], save_simplified_ms=save['simplified'],
+                   save_speedup=save['full']/save['simplified'],
+                   repaint_full_ms=min(paint['full']), repaint_simplified_ms=min(paint['simplified']),
+                   repaint_speedup=min(paint['full'])/min(paint['simplified']))
+
+
+@benchmark
+def mask(ctx):
+    '''binarymask.produce_mask from the .csv written by the save benchmark'''
+    import binarymask
+    csvfile = os.path.join(ctx.tmpdir, 'saved.csv')
+    if not os.path.exists(csvfile):
+        raise RuntimeError('no .csv output to rasterize (save benchmark failed or skipped)')
+    return summary(timed(lambda: binarymask.produce_mask(csvfile), ctx.repeat))
+
+
+def run(shapes, vertices, repeat, only=None):
+    app = QApplication.instance() or QApplication(sys.argv)
+    results = []
+    for nshapes in shapes:
+        for nvertices in vertices:
+            tmpdir = tempfile.mkdtemp(prefix='pyimannotate_bench_')
+            try:
+                ctx = Context(nshapes, nvertices, repeat, tmpdir)
+                for fn in BENCHMARKS:
+                    if only and fn.__name__ not in only:
+                        continue
+                    if getattr(fn, 'once', False) and any(r['benchmark'] == fn.__name__ for r in results):
+                        continue
+                    try:
+                        result = fn(ctx)
+                    except Exception as e:
+                        result = {'error': '{}: {}'.format(type(e).__name__, e)}
+                    result.update({'benchmark': fn.__name__, 'shapes': nshapes, 'vertices': nvertices})
+                    results.append(result)
+                    print('{:>10} shapes={:<7} vertices={:<6} {}'.format(
+                        fn.__name__, nshapes, nvertices,
+                        result.get('error') or '{:.3f} ms median'.format(result['median_ms'])), file=sys.stderr)
+                ctx.window.close()
+                app.processEvents()
+            finally:
+                shutil.rmtree(tmpdir, ignore_errors=True)
+    return results
+
+
+def version():
+    match = re.search(r'version:\s*(\S+)', pyimannotate2.__doc__ or '')
+    return match.group(1) if match else None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark pyimannotate2 on synthetic scenes')
+    parser.add_argument('--shapes', type=int, nargs='+', default=[100, 1000])
+    parser.add_argument('--vertices', type=int, nargs='+', default=[8, 64])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--only', nargs='+', choices=[fn.__name__ for fn in BENCHMARKS])
+    parser.add_argument('-o', '--output', help='write the json report here instead of stdout')
+    args = parser.parse_args()
+
+    report = {'version': version(), 'python': platform.python_version(), 'qt': QT_VERSION_STR,
+              'platform': platform.platform(), 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'results': run(args.shapes, args.vertices, args.repeat, args.only)}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
@@ -1,37 +1,42 @@
-import pandas as pd
+import sys
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 from skimage.draw import polygon, line
-import json
-from PyQt5.QtWidgets import QFileDialog, QApplication
+from annotationcore import read_csv
 
 def produce_mask(path):
-	df=pd.read_csv(path)
-	img=np.zeros((df['width'][0], df['height'][0]))
-	U=df['Object'].unique()
-	for i in U:
-		dfsubstr=df[df['Object']==i]
-		if dfsubstr['Type'].values[0]=='Polygon':
-			cc,rr=polygon(dfsubstr['X'].values, dfsubstr['Y'].values)
+	annotation=read_csv(path)
+	img=np.zeros((annotation.imsize[0], annotation.imsize[1]))
+	for obj, objtype in zip(annotation.objects, annotation.types):
+		if objtype=='Polygon':
+			cc,rr=polygon(obj[:,0], obj[:,1])
 			img[rr,cc]=1
-		elif dfsubstr['Type'].values[0]=='Line':
-			for j in range(dfsubstr.shape[0]-1):
-				r0, c0 = int(dfsubstr['X'].values[j]), int(dfsubstr['Y'].values[j])
-				r1, c1 = int(dfsubstr['X'].values[j+1]), int(dfsubstr['Y'].values[j+1])
+		elif objtype=='Line':
+			for j in range(len(obj)-1):
+				r0, c0 = int(obj[j,0]), int(obj[j,1])
+				r1, c1 = int(obj[j+1,0]), int(obj[j+1,1])
 				cc,rr=line(r0, c0, r1, c1)
 				img[rr,cc]=1
 		else: #A point
-			img[int(dfsubstr['X']),int(dfsubstr['Y'])]=1
+			img[int(obj[0,0]),int(obj[0,1])]=1
 	np.savez_compressed(path[:-4], img)
 	return
 
 if __name__ == '__main__':
-	import sys
-	app = QApplication(sys.argv)
-	dialogue=QFileDialog()
-	dialogue.setNameFilter("*.csv");
-	dialogue.setDefaultSuffix('csv')
-	dialogue.setFileMode(QFileDialog.ExistingFiles)
-	dialogue.exec()
-	path=dialogue.selectedFiles()
+	#python binarymask.py a.csv b.csv ... (opens a file dialog if no files are given)
+	path=sys.argv[1:]
+	if not path:
+		from PyQt5.QtWidgets import QFileDialog, QApplication
+		app = QApplication(sys.argv)
+		dialogue=QFileDialog()
+		dialogue.setNameFilter("*.csv");
+		dialogue.setDefaultSuffix('csv')
+		dialogue.setFileMode(QFileDialog.ExistingFiles)
+		dialogue.exec()
+		path=dialogue.selectedFiles()
 
-	[produce_mask(p) for p in path]
+	if len(path) > 1:
+		with ProcessPoolExecutor() as executor:
+			list(executor.map(produce_mask, path))
+	else:
+		[produce_mask(p) for p in path]
@@ -0,0 +1,206 @@
+'''
+Exports a directory of pyimannotate label files (.json) to a single COCO
+json file or to per-image Pascal VOC .xml files.
+
+Files are parsed in worker processes and the results are streamed to disk in
+a fixed (sorted) file order, so only a bounded window of images is held in
+memory at any time and category ids come out the same on every run. VOC files
+mirror the layout of LABELDIR under the output directory. .json files that are
+not label files (e.g. an earlier COCO export) are skipped and reported.
+
+Usage:
+python dataset_exporter.py LABELDIR -o dataset.json
+python dataset_exporter.py LABELDIR -f voc -o vocdir
+'''
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from xml.etree import ElementTree as ET
+
+from annotationcore import geometry, read_json
+
+
+def find_label_files(path, recursive=False, exclude=()):
+    '''Return a sorted list of pyimannotate .json label files under path,
+    leaving out the files in exclude
+    '''
+    found = []
+    if recursive:
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            found += [os.path.join(root, f) for f in files if f.lower().endswith('.json')]
+    else:
+        found = [os.path.join(path, f) for f in os.listdir(path)
+                 if f.lower().endswith('.json') and os.path.isfile(os.path.join(path, f))]
+    exclude = set(os.path.abspath(f) for f in exclude)
+    return sorted(f for f in found if os.path.abspath(f) not in exclude)
+
+
+def read_label_file(filename):
+    '''Parse one label file into an image record plus per-object arrays.
+    Objects without vertices are dropped
+    '''
+    annotation = read_json(filename, imageData=False)
+    keep = [i for i, obj in enumerate(annotation.objects) if len(obj) > 0]
+    objects = [annotation.objects[i] for i in keep]
+    types = [annotation.types[i] for i in keep]
+    labels = [str(annotation.labels[i]) for i in keep]
+
+    width, height = annotation.imsize or (0, 0)
+    imagePath = annotation.imagePath or os.path.splitext(filename)[0]
+    bbox, area = geometry(objects, types)
+    return {'filename': filename, 'file_name': os.path.basename(imagePath.replace('\\', '/')),
+            'width': int(width), 'height': int(height), 'objects': objects,
+            'types': types, 'labels': labels, 'bbox': bbox, 'area': area}
+
+
+def _coco_record(filename):
+    try:
+        record = read_label_file(filename)
+    except (OSError, ValueError, KeyError, TypeError):
+        return filename, None
+    record['segmentation'] = [obj.ravel().tolist() if objtype == 'Polygon' else []
+                              for obj, objtype in zip(record.pop('objects'), record['types'])]
+    return filename, record
+
+
+def _voc_record(args):
+    filename, outfile = args
+    try:
+        record = read_label_file(filename)
+    except (OSError, ValueError, KeyError, TypeError):
+        return filename, None
+    os.makedirs(os.path.dirname(outfile), exist_ok=True)
+    write_voc(record, outfile)
+    return filename, len(record['labels'])
+
+
+def ordered_map(fn, items, workers, window=None):
+    '''Like executor.map, but never runs more than `window` items ahead of the
+    consumer, so results don't pile up in memory when writing is slower than parsing
+    '''
+    if workers is not None and workers <= 1:
+        for item in items:
+            yield fn(item)
+        return
+    window = window or 4*(workers or os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(fn, item))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def export_coco(labeldir, outfile, recursive=False, workers=None, categories=None):
+    '''Stream every label file under labeldir into one COCO json file.
+    Category ids are assigned in order of first appearance over the sorted file
+    list, after any names passed in `categories`. Returns the number of images and
+    annotations and the files skipped as not being label files
+    '''
+    files = find_label_files(labeldir, recursive, exclude=[outfile])
+    catids = {}
+    for name in categories or []:
+        catids.setdefault(name, len(catids)+1)
+    nimages = nannotations = 0
+    skipped = []
+
+    with open(outfile, 'w') as out, tempfile.TemporaryFile('w+') as annfile:
+        out.write('{"info": {"description": "pyimannotate export"}, "licenses": [],\n"images": [')
+        for filename, record in ordered_map(_coco_record, files, workers):
+            if record is None:
+                skipped.append(filename)
+                continue
+            nimages += 1
+            image = {'id': nimages, 'file_name': record['file_name'],
+                     'width': record['width'], 'height': record['height']}
+            out.write((',\n' if nimages > 1 else '\n') + json.dumps(image))
+
+            bbox, area = record['bbox'], record['area']
+            for i, label in enumerate(record['labels']):
+                nannotations += 1
+                xmin, ymin, xmax, ymax = bbox[i].tolist()
+                annotation = {'id': nannotations, 'image_id': nimages,
+                              'category_id': catids.setdefault(label, len(catids)+1),
+                              'bbox': [xmin, ymin, xmax-xmin, ymax-ymin], 'area': float(area[i]),
+                              'segmentation': [record['segmentation'][i]] if record['segmentation'][i] else [],
+                              'iscrowd': 0, 'type': record['types'][i]}
+                annfile.write((',\n' if nannotations > 1 else '\n') + json.dumps(annotation))
+
+        out.write('\n],\n"annotations": [')
+        annfile.seek(0)
+        shutil.copyfileobj(annfile, out)
+        out.write('\n],\n"categories": ')
+        json.dump([{'id': i, 'name': name, 'supercategory': ''} for name, i in catids.items()], out)
+        out.write('}\n')
+    return nimages, nannotations, skipped
+
+
+def write_voc(record, filename):
+    '''Write a single Pascal VOC annotation (bounding boxes only)
+    '''
+    root = ET.Element('annotation')
+    ET.SubElement(root, 'filename').text = record['file_name']
+    size = ET.SubElement(root, 'size')
+    ET.SubElement(size, 'width').text = str(record['width'])
+    ET.SubElement(size, 'height').text = str(record['height'])
+    ET.SubElement(size, 'depth').text = '3'
+    for i, label in enumerate(record['labels']):
+        obj = ET.SubElement(root, 'object')
+        ET.SubElement(obj, 'name').text = label
+        ET.SubElement(obj, 'pose').text = 'Unspecified'
+        ET.SubElement(obj, 'truncated').text = '0'
+        ET.SubElement(obj, 'difficult').text = '0'
+        box = ET.SubElement(obj, 'bndbox')
+        for tag, value in zip(('xmin', 'ymin', 'xmax', 'ymax'), record['bbox'][i]):
+            ET.SubElement(box, tag).text = str(int(round(value)))
+    ET.ElementTree(root).write(filename)
+
+
+def export_voc(labeldir, outdir, recursive=False, workers=None):
+    '''Write one VOC .xml per label file into outdir, at the file's path relative
+    to labeldir. Returns the number of images and annotations and the files
+    skipped as not being label files
+    '''
+    os.makedirs(outdir, exist_ok=True)
+    files = find_label_files(labeldir, recursive)
+    jobs = [(f, os.path.join(outdir, os.path.splitext(os.path.relpath(f, labeldir))[0]+'.xml')) for f in files]
+    nimages = nannotations = 0
+    skipped = []
+    for filename, n in ordered_map(_voc_record, jobs, workers):
+        if n is None:
+            skipped.append(filename)
+        else:
+            nimages += 1
+            nannotations += n
+    return nimages, nannotations, skipped
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export pyimannotate label files to COCO or Pascal VOC')
+    parser.add_argument('labeldir', help='directory with pyimannotate .json label files')
+    parser.add_argument('-o', '--output', required=True, help='COCO .json file or VOC output directory')
+    parser.add_argument('-f', '--format', choices=['coco', 'voc'], default='coco')
+    parser.add_argument('-r', '--recursive', action='store_true', help='also search subdirectories')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='worker processes (1 disables the pool)')
+    parser.add_argument('-c', '--categories', default=None,
+                        help='comma separated category names to pin to the first ids (COCO only)')
+    args = parser.parse_args()
+
+    if args.format == 'coco':
+        categories = args.categories.split(',') if args.categories else None
+        nimages, nannotations, skipped = export_coco(args.labeldir, args.output, args.recursive, args.workers, categories)
+    else:
+        nimages, nannotations, skipped = export_voc(args.labeldir, args.output, args.recursive, args.workers)
+    print('Exported {} images, {} annotations'.format(nimages, nannotations))
+    if skipped:
+        print('Skipped {} files that are not pyimannotate label files:'.format(len(skipped)))
+        for filename in skipped:
+            print('  ' + filename)
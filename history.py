@@ -0,0 +1,134 @@
+'''
+Memory-bounded undo/redo history for pyimannotate2.
+
+Edits are recorded as small Command objects holding only what changed (a
+vertex delta, the shapes added or removed, the previous label...). The history
+keeps the undo and redo stacks under a byte budget by dropping the oldest
+commands first, and lets consecutive commands of one drag merge into a single
+one, so hours of editing cost little memory.
+'''
+
+from collections import deque
+import itertools
+
+
+class Command(object):
+    '''One undoable edit. Subclasses implement undo/redo and report the memory
+    they hold through nbytes
+    '''
+    overhead = 256 #rough size of a small command object and its attributes
+
+    def undo(self):
+        raise NotImplementedError
+
+    def redo(self):
+        raise NotImplementedError
+
+    def nbytes(self):
+        return self.overhead
+
+    def mergeWith(self, other):
+        '''Absorb a command that directly follows this one. Returns True if merged
+        '''
+        return False
+
+    def refs(self):
+        '''Objects (shapes) the command operates on'''
+        return ()
+
+    def rebind(self, mapping):
+        '''Operate on mapping[obj] instead of every obj of refs() in mapping'''
+
+
+class History(object):
+    '''Undo and redo stacks sharing a memory budget of limit bytes
+    '''
+    def __init__(self, limit=64*2**20):
+        self.limit = limit
+        self.undoStack = deque()
+        self.redoStack = []
+        self.nbytes = 0
+
+    def __len__(self):
+        return len(self.undoStack)
+
+    def canUndo(self):
+        return bool(self.undoStack)
+
+    def canRedo(self):
+        return bool(self.redoStack)
+
+    def push(self, command):
+        '''Record a command that has already been applied
+        '''
+        for done in self.redoStack:
+            self.nbytes -= done.nbytes()
+        self.redoStack = []
+        if self.undoStack:
+            last = self.undoStack[-1]
+            before = last.nbytes()
+            if last.mergeWith(command):
+                self.nbytes += last.nbytes() - before
+                return
+        self.undoStack.append(command)
+        self.nbytes += command.nbytes()
+        self.evict()
+
+    def evict(self):
+        '''Drop the oldest commands until the history fits its budget'''
+        while self.nbytes > self.limit and len(self.undoStack) > 1:
+            self.nbytes -= self.undoStack.popleft().nbytes()
+
+    def trim(self, nbytes):
+        '''Drop the oldest commands until nbytes are freed (the last command
+        is kept). Returns the bytes freed'''
+        before = self.nbytes
+        while before - self.nbytes < nbytes and len(self.undoStack) > 1:
+            self.nbytes -= self.undoStack.popleft().nbytes()
+        return before - self.nbytes
+
+    def undo(self):
+        if not self.undoStack:
+            return None
+        command = self.undoStack.pop()
+        command.undo()
+        self.redoStack.append(command)
+        return command
+
+    def redo(self):
+        if not self.redoStack:
+            return None
+        command = self.redoStack.pop()
+        command.redo()
+        self.undoStack.append(command)
+        return command
+
+    def clear(self):
+        self.undoStack.clear()
+        self.redoStack = []
+        self.nbytes = 0
+
+    def rebind(self, mapping):
+        '''Let every command refer to mapping[obj] instead of obj, e.g. when
+        the object is replaced by another standing for the same thing'''
+        if mapping:
+            for command in itertools.chain(self.undoStack, self.redoStack):
+                command.rebind(mapping)
+
+    def forget(self, objs):
+        '''Drop every command that refers to one of objs, together with all undo
+        commands older than it (they could no longer be undone in order)
+        '''
+        objs = set(objs)
+        if not objs:
+            return
+        last = None
+        for i, command in enumerate(self.undoStack):
+            if not objs.isdisjoint(command.refs()):
+                last = i
+        for i in range(0 if last is None else last+1):
+            self.nbytes -= self.undoStack.popleft().nbytes()
+        if any(not objs.isdisjoint(command.refs()) for command in self.redoStack):
+            for command in self.redoStack:
+                self.nbytes -= command.nbytes()
+            self.redoStack = []
@@ -0,0 +1,97 @@
+'''
+Zero-copy bridge between QImage and NumPy, shared by pyimannotate2 and the
+utilities.
+
+image_array views the pixels of a decoded QImage as an (H, W, C) array and
+array_image wraps an array as a QImage, both without copying: rows keep
+their padding in the strides, and each side holds a reference to the other
+owner so the memory stays valid. Cropping, masks, previews and contrast
+adjustment can then work on one decoded buffer instead of repeated
+QImage.copy calls and separate canvases.
+'''
+
+import numpy as np
+from PyQt5.QtGui import QImage
+try:
+    from PyQt5 import sip
+except ImportError: #PyQt5 < 5.11
+    import sip
+
+
+#QImage formats with a NumPy equivalent: pixel dtype and channels. 32-bit
+#formats are stored blue, green, red, alpha on little-endian machines
+FORMATS = {QImage.Format_RGB32: (np.uint8, 4), QImage.Format_ARGB32: (np.uint8, 4),
+           QImage.Format_ARGB32_Premultiplied: (np.uint8, 4), QImage.Format_RGB888: (np.uint8, 3),
+           QImage.Format_Grayscale8: (np.uint8, 1), QImage.Format_Indexed8: (np.uint8, 1),
+           QImage.Format_Alpha8: (np.uint8, 1)}
+if hasattr(QImage, 'Format_Grayscale16'): #Qt 5.13+
+    FORMATS[QImage.Format_Grayscale16] = (np.uint16, 1)
+if hasattr(QImage, 'Format_RGBA64'): #Qt 5.12+, red, green, blue, alpha
+    FORMATS[QImage.Format_RGBA64] = (np.uint16, 4)
+
+#formats whose channels are colors or gray levels (not palette indices)
+COLOR_FORMATS = (QImage.Format_RGB32, QImage.Format_ARGB32, QImage.Format_ARGB32_Premultiplied,
+                 QImage.Format_RGB888, QImage.Format_Grayscale8)
+
+
+class _ImageBuffer(object):
+    '''Array interface over the pixels of a QImage, keeping the image alive as
+    long as any array made from it
+    '''
+    def __init__(self, image, writable):
+        dtype, channels = FORMATS[image.format()]
+        itemsize = np.dtype(dtype).itemsize
+        self.image = image
+        ptr = image.bits() if writable else image.constBits()
+        self.__array_interface__ = {
+            'version': 3,
+            'data': (int(ptr), not writable),
+            'typestr': np.dtype(dtype).str,
+            'shape': (image.height(), image.width(), channels),
+            'strides': (image.bytesPerLine(), channels*itemsize, itemsize),
+        }
+
+
+def image_array(image, writable=False):
+    '''(H, W, C) view of the pixels of a QImage in one of the FORMATS, sharing
+    its memory. Read-only unless writable (which detaches an implicitly shared
+    image first, as QImage.bits does). Other formats raise ValueError; convert
+    them with QImage.convertToFormat
+    '''
+    if image.format() not in FORMATS:
+        raise ValueError('No array view of QImage format {}'.format(int(image.format())))
+    return np.asarray(_ImageBuffer(image, writable))
+
+
+def image_format(array):
+    '''QImage format matching the dtype and channels of an array'''
+    channels = array.shape[2] if array.ndim == 3 else 1
+    if array.dtype == np.uint8:
+        formats = {1: QImage.Format_Grayscale8, 3: QImage.Format_RGB888, 4: QImage.Format_ARGB32}
+    elif array.dtype == np.uint16 and hasattr(QImage, 'Format_Grayscale16'):
+        formats = {1: QImage.Format_Grayscale16}
+    else:
+        formats = {}
+    if array.ndim not in (2, 3) or channels not in formats:
+        raise ValueError('No QImage format for a {} array of shape {}'.format(array.dtype, array.shape))
+    return formats[channels]
+
+
+def array_image(array, format=None):
+    '''QImage over the memory of a 2-D (gray) or (H, W, C) array, e.g. a
+    slice of image_array, without copying when its pixels are contiguous within
+    rows (otherwise they are copied once). The format follows the dtype and
+    channels unless given; 4 channels are blue, green, red, alpha. The image
+    holds a reference to the array, but Qt copies of it do not: call copy()
+    on the image to keep pixels beyond its lifetime
+    '''
+    if format is None:
+        format = image_format(array)
+    height, width = array.shape[:2]
+    pixelsize = array.itemsize*(array.shape[2] if array.ndim == 3 else 1)
+    if (array.strides[0] < width*pixelsize or array.strides[1] != pixelsize
+            or (array.ndim == 3 and array.strides[2] != array.itemsize)):
+        array = np.ascontiguousarray(array)
+    image = QImage(sip.voidptr(array.ctypes.data), width, height, array.strides[0], format)
+    image._array = array
+    return image
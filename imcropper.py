@@ -4,6 +4,7 @@ import os
 from PyQt5.QtGui import *
 from PyQt5.QtCore import *
 from PyQt5.QtWidgets import *
+from imagebridge import COLOR_FORMATS, array_image, image_array
 
 
 IMSIZE=(400,400)
@@ -81,7 +82,7 @@ class SubQGraphicsScene(QGraphicsScene):
         if self.selecting() & (event.button() == Qt.LeftButton):
             self.overrideCursor(CURSOR_DRAW)
             rect_to_crop=QRect(pos.x()-self.sizetocrop[0]/2, pos.y()-self.sizetocrop[1]/2, self.sizetocrop[0], self.sizetocrop[1])
-            cropped = self.image.copy(rect_to_crop)
+            cropped = self.crop(rect_to_crop)
             self.imcropped.append('CROPPED')
             cropped.save(self.path+'_'+str(len(self.imcropped))+'.tif')
  
@@ -95,6 +96,15 @@ class SubQGraphicsScene(QGraphicsScene):
             self.update()
  
 
+    def crop(self, rect):
+        '''Area of the image in rect: a view of the decoded pixels if it lies
+        inside the image (nothing is copied before saving), else a copy padded
+        like QImage.copy'''
+        if self.image.format() in COLOR_FORMATS and self.image.rect().contains(rect):
+            pixels=image_array(self.image)
+            return array_image(pixels[rect.top():rect.bottom()+1, rect.left():rect.right()+1], self.image.format())
+        return self.image.copy(rect)
+
     def overrideCursor(self, cursor):
         self._cursor = cursor
         QApplication.setOverrideCursor(cursor) 
@@ -0,0 +1,125 @@
+'''
+Optional timing instrumentation for pyimannotate2.
+
+Methods are timed by replacing them on their class with a thin wrapper, and only
+when instrumentation is enabled, so a disabled profiler costs nothing at all.
+Each timed method keeps a rolling window of durations for percentiles, and a
+bounded trace of calls is dumped in the Chrome trace event format (open it in
+chrome://tracing or https://ui.perfetto.dev).
+'''
+
+import functools
+import json
+import time
+from collections import deque
+
+
+class Instrumentation(object):
+    '''Rolling per-method timings, event-rate counters and a bounded call trace
+    '''
+    def __init__(self, window=1000, tracelimit=200000):
+        self.enabled = False
+        self.window = window
+        self.samples = {}
+        self.counters = {}
+        self.trace = deque(maxlen=tracelimit)
+        self.tracefile = None
+        self._originals = {}
+        self._t0 = time.perf_counter()
+
+    def instrument(self, cls, method, name=None):
+        '''Replace cls.method with a timed wrapper recorded under name
+        '''
+        if (cls, method) in self._originals:
+            return
+        name = name or '{}.{}'.format(cls.__name__, method)
+        fn = cls.__dict__[method]
+        samples = self.samples.setdefault(name, deque(maxlen=self.window))
+        trace = self.trace
+        clock = time.perf_counter
+
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            t0 = clock()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                dt = clock() - t0
+                samples.append(dt)
+                trace.append((name, t0, dt))
+
+        self._originals[(cls, method)] = fn
+        setattr(cls, method, timed)
+
+    def enable(self, targets, tracefile=None):
+        '''Instrument every (class, method, name) in targets. Has to run before
+        the instrumented objects connect their methods to signals
+        '''
+        for cls, method, name in targets:
+            self.instrument(cls, method, name)
+        self.tracefile = tracefile
+        self.enabled = True
+
+    def disable(self):
+        for (cls, method), fn in self._originals.items():
+            setattr(cls, method, fn)
+        self._originals = {}
+        self.enabled = False
+
+    def count(self, name):
+        '''Record one occurrence of an event, for rates (events per second)
+        '''
+        self.counters.setdefault(name, deque(maxlen=self.window)).append(time.perf_counter())
+
+    def rate(self, name, period=1.0):
+        stamps = self.counters.get(name)
+        if not stamps:
+            return 0.0
+        now = time.perf_counter()
+        return sum(1 for t in stamps if now - t <= period)/period
+
+    def percentiles(self, name, ps=(50, 95, 99)):
+        '''Percentiles (in ms) of the rolling window of a timed method
+        '''
+        values = sorted(self.samples.get(name, ()))
+        if not values:
+            return None
+        n = len(values)
+        return [1000*values[min(n-1, int(p*n/100.0))] for p in ps]
+
+    def summary(self):
+        result = {}
+        for name, samples in self.samples.items():
+            ps = self.percentiles(name)
+            if ps is not None:
+                result[name] = {'calls': len(samples), 'p50_ms': ps[0], 'p95_ms': ps[1], 'p99_ms': ps[2]}
+        for name in self.counters:
+            result.setdefault(name, {})['per_s'] = self.rate(name)
+        return result
+
+    def statusText(self):
+        '''Short p50/p95 line for the status bar
+        '''
+        parts = []
+        for name in self.samples:
+            ps = self.percentiles(name)
+            if ps is not None:
+                parts.append('{} {:.1f}/{:.1f}'.format(name, ps[0], ps[1]))
+        for name in self.counters:
+            parts.append('{} {:.0f}/s'.format(name, self.rate(name)))
+        return 'p50/p95 ms: ' + '  '.join(parts) if parts else ''
+
+    def dump(self, filename=None):
+        '''Write the trace and the percentile summary as a Chrome trace json
+        '''
+        filename = filename or self.tracefile
+        if not filename:
+            return
+        events = [{'name': name, 'ph': 'X', 'pid': 0, 'tid': 0,
+                   'ts': 1e6*(t0 - self._t0), 'dur': 1e6*dt} for name, t0, dt in self.trace]
+        with open(filename, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms',
+                       'otherData': {'summary': self.summary()}}, f)
+
+
+profiler = Instrumentation()
@@ -0,0 +1,164 @@
+'''
+Intelligent scissors (livewire) for pyimannotate2: the segment proposed from
+the last clicked vertex to the cursor follows the strongest image edges.
+
+A CostMap turns the image into per-pixel costs (low on strong gradients),
+computed tile by tile on first use and cached for the image. A LiveWire runs
+a shortest-path search from one seed pixel over the costs of a window around
+it. The search is vectorized (all pending pixels of the current distance
+bucket are relaxed at once, in the manner of delta-stepping), runs for a
+time budget per call and keeps its state, so mouse moves and idle time keep
+extending one search instead of restarting it.
+'''
+
+import math
+import time
+
+import numpy as np
+
+
+#neighbor steps (dx, dy) of the 8-connected search and their lengths
+NEIGHBORS = [(-1, -1), (0, -1), (1, -1), (-1, 0), (1, 0), (-1, 1), (0, 1), (1, 1)]
+LENGTHS = np.array([math.hypot(dx, dy) for dx, dy in NEIGHBORS])
+
+
+class CostMap(object):
+    '''Cost of passing through each pixel of an (H, W) or (H, W, C) image
+    array: 1 on the strongest edges, rising to 1+spread on flat areas as
+    1 + spread/(1 + gradient/scale). Tiles of tile x tile pixels are computed
+    when first needed and cached
+    '''
+    tile = 256
+
+    def __init__(self, pixels, scale=4.0, spread=50.0):
+        self.pixels = pixels if pixels.ndim == 3 else pixels[:, :, np.newaxis]
+        self.height, self.width = self.pixels.shape[:2]
+        self.scale = scale
+        self.spread = spread
+        self.tiles = {}
+
+    def tileCost(self, tx, ty):
+        key = (tx, ty)
+        if key not in self.tiles:
+            size = self.tile
+            x0, y0 = tx*size, ty*size
+            x1, y1 = min(x0+size, self.width), min(y0+size, self.height)
+            #one pixel of apron (clamped at the image border) for the central differences
+            ax0, ay0, ax1, ay1 = max(x0-1, 0), max(y0-1, 0), min(x1+1, self.width), min(y1+1, self.height)
+            gray = self.pixels[ay0:ay1, ax0:ax1].mean(axis=2, dtype=np.float32)
+            gray = np.pad(gray, ((1-(y0-ay0), 1-(ay1-y1)), (1-(x0-ax0), 1-(ax1-x1))), mode='edge')
+            gx = gray[1:-1, 2:] - gray[1:-1, :-2]
+            gy = gray[2:, 1:-1] - gray[:-2, 1:-1]
+            gradient = np.sqrt(gx*gx + gy*gy)
+            self.tiles[key] = 1 + self.spread/(1 + gradient/self.scale)
+        return self.tiles[key]
+
+    def window(self, x0, y0, x1, y1):
+        '''Costs of the pixels x0 <= x < x1, y0 <= y < y1 (inside the image)'''
+        size = self.tile
+        cost = np.empty((y1-y0, x1-x0), dtype=np.float32)
+        for ty in range(y0//size, (y1-1)//size + 1):
+            for tx in range(x0//size, (x1-1)//size + 1):
+                tile = self.tileCost(tx, ty)
+                cx0, cy0 = max(x0, tx*size), max(y0, ty*size)
+                cx1, cy1 = min(x1, (tx+1)*size), min(y1, (ty+1)*size)
+                cost[cy0-y0:cy1-y0, cx0-x0:cx1-x0] = tile[cy0-ty*size:cy1-ty*size, cx0-tx*size:cx1-tx*size]
+        return cost
+
+    def nbytes(self):
+        return sum(tile.nbytes for tile in self.tiles.values())
+
+
+class LiveWire(object):
+    '''Shortest paths over a CostMap from the seed pixel (x, y) to the pixels
+    within radius of it. expand() advances the search for a time budget;
+    path() returns the best path known so far, which is optimal once the
+    target is settled (its distance is below the settled bound). delta, the
+    width of the distance buckets, is about the cost of a flat pixel: wider
+    buckets relax more pixels per step but revisit more of them
+    '''
+    def __init__(self, costmap, seed, radius=160, delta=64.0):
+        sx, sy = seed
+        x0, y0 = max(sx-radius, 0), max(sy-radius, 0)
+        x1, y1 = min(sx+radius+1, costmap.width), min(sy+radius+1, costmap.height)
+        self.origin = (x0, y0)
+        self.shape = (y1-y0, x1-x0)
+        #the window with a border of impassable pixels, so neighbors never leave the array
+        h, w = y1-y0+2, x1-x0+2
+        cost = np.full((h, w), np.inf)
+        cost[1:-1, 1:-1] = costmap.window(x0, y0, x1, y1)
+        self.stride = w
+        self.cost = cost.ravel()
+        self.offsets = np.array([dy*w + dx for dx, dy in NEIGHBORS])
+        self.dist = np.full(h*w, np.inf)
+        self.parent = np.full(h*w, -1, dtype=np.int8)
+        self.seed = self.index(sx, sy)
+        self.dist[self.seed] = 0.0
+        self.pending = np.array([self.seed])
+        self.bound = 0.0 #distances below bound are final
+        self.delta = delta
+
+    def index(self, x, y):
+        '''Position of pixel (x, y) in the padded window, None outside it'''
+        x, y = x - self.origin[0], y - self.origin[1]
+        if 0 <= x < self.shape[1] and 0 <= y < self.shape[0]:
+            return (y+1)*self.stride + x+1
+        return None
+
+    def done(self):
+        return not len(self.pending)
+
+    def settled(self, x, y):
+        i = self.index(x, y)
+        return i is not None and self.dist[i] < self.bound
+
+    def expand(self, budget=0.01, target=None):
+        '''Run the search for up to budget seconds, or until pixel target
+        (x, y) is settled. Returns True when the whole window is done
+        '''
+        deadline = time.perf_counter() + budget
+        goal = None if target is None else self.index(*target)
+        while len(self.pending):
+            if goal is not None and self.dist[goal] < self.bound:
+                break
+            self.step()
+            if time.perf_counter() > deadline:
+                break
+        return self.done()
+
+    def step(self):
+        '''Relax the pending pixels of the current distance bucket'''
+        dist, cost = self.dist, self.cost
+        pending = self.pending
+        current = dist[pending] < self.bound + self.delta
+        if not current.any():
+            #the bucket is empty: every distance below the next pending one is final
+            self.bound = max(self.bound + self.delta, float(dist[pending].min()))
+            return
+        nodes, rest = pending[current], pending[~current]
+        improved = [rest]
+        for k, offset in enumerate(self.offsets):
+            neighbors = nodes + offset
+            candidate = dist[nodes] + LENGTHS[k]*cost[neighbors]
+            better = candidate < dist[neighbors]
+            neighbors = neighbors[better]
+            dist[neighbors] = candidate[better]
+            self.parent[neighbors] = k
+            improved.append(neighbors)
+        self.pending = np.unique(np.concatenate(improved))
+
+    def path(self, x, y):
+        '''(N, 2) pixel centers from the seed to pixel (x, y), None if it is
+        outside the window or not reached yet
+        '''
+        i = self.index(x, y)
+        if i is None or not np.isfinite(self.dist[i]):
+            return None
+        parent, offsets = self.parent, self.offsets
+        nodes = [i]
+        while i != self.seed:
+            i -= offsets[parent[i]]
+            nodes.append(i)
+        nodes = np.array(nodes[::-1])
+        row, col = np.divmod(nodes, self.stride)
+        return np.stack((col - 1 + self.origin[0] + 0.5, row - 1 + self.origin[1] + 0.5), axis=1)
@@ -0,0 +1,177 @@
+'''
+Imports segmentation masks (e.g. model predictions) as pyimannotate label files,
+the inverse of binarymask.py.
+
+A mask is a 2-D array of class values (0 is background) stored as .npy, .npz
+(the first array, as written by binarymask.produce_mask) or an image such as
+.png. The outline of every connected region of every class is traced with
+annotationcore.trace_contours, simplified with annotationcore.simplify
+(Douglas-Peucker, 1 pixel by default) and written as a polygon to a .json label file
+that pyimannotate2 opens directly (File > Open, or as the label file of the
+image). Directories are converted in worker processes.
+
+Usage:
+python mask_importer.py MASKDIR -o LABELDIR --labels buildings roads --images IMAGEDIR
+python mask_importer.py mask.png -o labels.json --labels 255=buildings
+'''
+
+import argparse
+import os
+
+import numpy as np
+
+from annotationcore import DEFAULT_COLOR, DEFAULT_LABEL, Annotation, simplify, trace_contours, write_json
+from dataset_exporter import ordered_map
+
+
+MASK_EXTENSIONS = ('.npy', '.npz', '.png', '.bmp', '.tif', '.tiff')
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+#line colors of the imported classes, indexed by class value (binary masks get DEFAULT_COLOR)
+PALETTE = [DEFAULT_COLOR, '#ff0000', '#00ff00', '#ffff00', '#ff00ff', '#00ffff', '#ff8000', '#8000ff']
+
+
+def read_mask(filename, threshold=0.5):
+    '''2-D integer array of class values from a mask file. Floating point
+    masks (probabilities) are thresholded into a binary mask
+    '''
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == '.npy':
+        mask = np.load(filename)
+    elif ext == '.npz':
+        with np.load(filename) as data:
+            mask = data[data.files[0]]
+    else:
+        from PyQt5.QtGui import QImage
+        from imagebridge import image_array
+        image = QImage(filename)
+        if image.isNull():
+            raise ValueError('Cannot read mask {}'.format(filename))
+        #palette images keep their class indices, anything else becomes gray levels
+        if image.format() != QImage.Format_Indexed8:
+            image = image.convertToFormat(QImage.Format_Grayscale8)
+        mask = image_array(image)[:, :, 0]
+    mask = np.squeeze(mask)
+    if mask.ndim != 2:
+        raise ValueError('Mask {} is not 2-D'.format(filename))
+    if np.issubdtype(mask.dtype, np.floating):
+        mask = (mask >= threshold).astype(np.uint8)
+    return mask
+
+
+def parse_labels(entries):
+    '''Class value -> label name from a list of names (for values 1, 2, ...)
+    or of VALUE=NAME entries
+    '''
+    names = {}
+    for i, entry in enumerate(entries or []):
+        value, sep, name = entry.partition('=')
+        if sep:
+            names[int(value)] = name
+        else:
+            names[i+1] = entry
+    return names
+
+
+def class_name(value, names=None, binary=False):
+    '''Label of a class value: its entry in names if any, the default label
+    for binary masks, else "class<value>"
+    '''
+    if names and value in names:
+        return names[value]
+    if binary:
+        return DEFAULT_LABEL
+    return 'class{}'.format(value)
+
+
+def is_binary(values):
+    '''True for the class values of a binary mask: 0 and 1, or 0 and 255
+    '''
+    values = set(values) - {0}
+    return values <= {1} or values <= {255}
+
+
+def mask_to_annotation(mask, names=None, min_area=0, imagePath=None, tolerance=1.0):
+    '''Annotation with one polygon per connected region of each class of mask,
+    simplified to tolerance pixels (0 keeps every pixel corner). Masks holding
+    only 0 and 1 (or 0 and 255) are binary: their class gets the default label
+    unless names has an entry for it
+    '''
+    classes = np.unique(mask)
+    classes = classes[classes != 0].tolist()
+    binary = is_binary(classes)
+    objects, labels, colors = [], [], []
+    for value in classes:
+        contours = trace_contours(mask == value, min_area)
+        if tolerance:
+            contours = simplify(contours, tolerance)
+        objects += contours
+        labels += len(contours)*[class_name(value, names, binary)]
+        colors += len(contours)*[DEFAULT_COLOR if binary else PALETTE[value % len(PALETTE)]]
+    height, width = mask.shape
+    return Annotation(objects, len(objects)*['Polygon'], labels, colors,
+                      imsize=(width, height), imagePath=imagePath)
+
+
+def find_image(maskfile, imagedir):
+    '''Image in imagedir with the same name as the mask, if any
+    '''
+    if not imagedir:
+        return None
+    stem = os.path.splitext(os.path.basename(maskfile))[0]
+    for ext in IMAGE_EXTENSIONS:
+        path = os.path.join(imagedir, stem+ext)
+        if os.path.isfile(path) and not os.path.samefile(path, maskfile):
+            return os.path.abspath(path)
+    return None
+
+
+def import_mask(args):
+    '''Convert one mask file into a .json label file. Returns the number of objects
+    '''
+    maskfile, outfile, names, min_area, imagedir, threshold, tolerance = args
+    annotation = mask_to_annotation(read_mask(maskfile, threshold), names, min_area,
+                                    find_image(maskfile, imagedir), tolerance)
+    write_json(annotation, outfile)
+    return len(annotation)
+
+
+def find_mask_files(path):
+    '''Sorted list of the mask files in a directory (or path itself if a file)
+    '''
+    if os.path.isfile(path):
+        return [path]
+    return sorted(os.path.join(path, f) for f in os.listdir(path)
+                  if f.lower().endswith(MASK_EXTENSIONS) and os.path.isfile(os.path.join(path, f)))
+
+
+def import_masks(path, output, names=None, min_area=0, imagedir=None, threshold=0.5, tolerance=1.0, workers=None):
+    '''Convert the masks under path into label files in the directory output
+    (or into output itself if it names a .json file and path is a single mask). Returns the
+    number of files and objects written
+    '''
+    files = find_mask_files(path)
+    if len(files) == 1 and output.lower().endswith('.json'):
+        outfiles = [output]
+    else:
+        os.makedirs(output, exist_ok=True)
+        outfiles = [os.path.join(output, os.path.splitext(os.path.basename(f))[0]+'.json') for f in files]
+    jobs = [(f, out, names, min_area, imagedir, threshold, tolerance) for f, out in zip(files, outfiles)]
+    return len(files), sum(ordered_map(import_mask, jobs, workers))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert segmentation masks to pyimannotate label files')
+    parser.add_argument('masks', help='mask file or directory of masks (.npy, .npz, .png, ...)')
+    parser.add_argument('-o', '--output', required=True, help='output directory (or .json file for a single mask)')
+    parser.add_argument('-l', '--labels', nargs='+', default=None, help='label names of class values 1, 2, ... (or VALUE=NAME pairs)')
+    parser.add_argument('-i', '--images', default=None, help='directory of the images the masks belong to')
+    parser.add_argument('-a', '--min-area', type=float, default=0, help='drop regions of this many pixels or less')
+    parser.add_argument('-t', '--threshold', type=float, default=0.5, help='threshold of floating point masks')
+    parser.add_argument('-s', '--tolerance', type=float, default=1.0,
+                        help='simplification tolerance in pixels (0 keeps every pixel corner)')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='worker processes (1 disables the pool)')
+    args = parser.parse_args()
+
+    nfiles, nobjects = import_masks(args.masks, args.output, parse_labels(args.labels), args.min_area,
+                                   args.images, args.threshold, args.tolerance, args.workers)
+    print('Imported {} masks, {} objects'.format(nfiles, nobjects))
@@ -0,0 +1,76 @@
+'''
+Memory accountant for pyimannotate2.
+
+Opening a large image used to keep the file bytes, the decoded QImage, the
+QPixmap on screen and the tool caches alive all at once. Every holder of a
+large buffer is registered here with a function reporting its size and,
+when the buffer can be rebuilt or is a redundant copy, a function releasing
+it. enforce() drops the redundant copies (e.g. the file bytes of a decoded
+image, which can be read again when saving needs them) and keeps the total
+under a ceiling by releasing buffers in registration order, cheapest to
+rebuild first. statusText() summarizes the usage for the status bar.
+'''
+
+
+def formatBytes(n):
+    '''Human-readable size, e.g. 1.5 GB'''
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(n) < 1024 or unit == 'GB':
+            return '{:.0f} {}'.format(n, unit) if unit == 'B' else '{:.1f} {}'.format(n, unit)
+        n /= 1024.0
+
+
+class MemoryAccountant(object):
+    '''Tracked buffers under a ceiling of limit bytes (0 for no ceiling).
+    track(name, size, release) registers a buffer: size() returns its bytes
+    and release(excess), if given, drops the buffer (or, for caches, about
+    excess bytes of it) and returns the bytes freed. Redundant buffers are
+    released whenever enforce runs, the others only over the limit
+    '''
+    def __init__(self, limit=0):
+        self.limit = limit
+        self.buffers = []
+        self.released = 0 #bytes released by enforce since the start
+
+    def track(self, name, size, release=None, redundant=False):
+        self.buffers.append((name, size, release, redundant))
+
+    def usage(self):
+        '''(name, bytes) of every tracked buffer'''
+        return [(name, int(size())) for name, size, release, redundant in self.buffers]
+
+    def total(self):
+        return sum(nbytes for name, nbytes in self.usage())
+
+    def enforce(self):
+        '''Release the redundant buffers, then others in registration order
+        until the total is under the limit. Returns the bytes freed
+        '''
+        freed = 0
+        for name, size, release, redundant in self.buffers:
+            if redundant and size():
+                freed += release(size())
+        if self.limit:
+            excess = self.total() - self.limit
+            for name, size, release, redundant in self.buffers:
+                if excess <= 0:
+                    break
+                if release is not None and size():
+                    n = release(excess)
+                    freed += n
+                    excess -= n
+        self.released += freed
+        return freed
+
+    def statusText(self):
+        total = self.total()
+        if self.limit:
+            return 'Memory: {} of {}'.format(formatBytes(total), formatBytes(self.limit))
+        return 'Memory: {}'.format(formatBytes(total))
+
+    def details(self):
+        '''One line per buffer that holds memory, for a tooltip'''
+        lines = ['{}: {}'.format(name, formatBytes(nbytes)) for name, nbytes in self.usage() if nbytes]
+        if self.released:
+            lines.append('released: {}'.format(formatBytes(self.released)))
+        return '\n'.join(lines) or 'No image loaded'
@@ -1,12 +1,12 @@
 from functools import partial
-from base64 import b64encode, b64decode
-import json
 import re
-import pandas as pd
 import os
 from PyQt5.QtGui import *
 from PyQt5.QtCore import *
 from PyQt5.QtWidgets import *
+import numpy as np
+from annotationcore import Annotation, read_json, write_csv, write_json
+from shapeitem import Shape
 
 # def newIcon(icon):
 #     return QIcon(':/' + icon)
@@ -73,141 +73,17 @@ class Annotationscene(object):
         self.lineColor=None
         self.imsizes=None
         self.object_types=None
-    
-    def shapes_to_pandas(self):
-        imsize, objects, types = self.imsizes, self.shapes, self.object_types
-        df=pd.DataFrame(columns=['width', 'height', 'Object', 'X', 'Y'])
-        for i, obj in enumerate(objects):
-            X, Y=list(zip(*obj))
-            df=df.append(pd.DataFrame({'width': imsize[0], 'height': imsize[1], 'Object': i+1, 'Type': types[i], 'X': X, 'Y': Y}), ignore_index=True)
-        return df
 
     def save(self):
-
-        self.imData = b64encode(self.imageData).decode('utf-8')
-        self.shapes=[[(point.x(), point.y()) for point in poly] for poly in self.polygons]
-        self.shapes_to_pandas().to_csv(re.search(re.compile('(.+?)(\.[^.]*$|$)'), self.filename).group(1)+'.csv', sep=',')
-
+        annotation = Annotation(objects=[poly.coords for poly in self.polygons], types=self.object_types,
+                                colors=self.lineColor, imsize=self.imsizes, imagePath=self.imagePath,
+                                imageData=self.imageData)
+        write_csv(annotation, re.search(re.compile('(.+?)(\.[^.]*$|$)'), self.filename).group(1)+'.csv')
         try:
-            with open(self.filename, 'w') as f:
-
-                json.dump({
-                    'objects': self.shapes,
-                    'type': self.object_types,
-                    'width/height': self.imsizes,
-                    'lineColor': self.lineColor,
-                    'fillColor': self.fillColor,
-                    'imagePath': self.imagePath,
-                    'imageData': self.imData},
-                    f, ensure_ascii=True, indent=2)
-        except:
+            write_json(annotation, self.filename, savebytes=True, extra={'fillColor': self.fillColor})
+        except OSError:
             pass
 
- 
-
-class Shape(QGraphicsItem):
-
-    line_color = QColor(0, 6, 255)
-    select_line_color = QColor(255, 255, 255)
-    vertex_fill_color = QColor(0, 255, 0, 255)
-    hvertex_fill_color = QColor(255, 0, 0)
-    point_size = 1.5
-    hsize = 3.0
-
-    def __init__(self, line_color=None, point_size=None, parent=None):
-        super(Shape, self).__init__(parent)
-        self.points = []
-        self.selected = False
-        self.painter = QPainter()
-        self.hIndex = None
-        self.setFlag(QGraphicsItem.ItemIsSelectable, True)
-        self.setFlag(QGraphicsItem.ItemIsMovable, True)
-        self.closed = False
-        self.points_adjusted=None
-
-        if line_color is not None:
-            self.line_color = line_color
-
-        if point_size is not None:
-            self.point_size = point_size
-
-    def addPoint(self, point):
-        self.setSelected(True)
-        if self.points and point == self.points[0]:
-            self.closed = True
-        else:
-            self.points.append(point)
-
-    def popPoint(self):
-        if self.points:
-            return self.points.pop()
-        return None
-
-    def paint(self, painter, option, widget):
-
-        if self.points:
-            self.prepareGeometryChange()
-            color = self.select_line_color if self.selected else self.line_color
-            pen = QPen(color)
-            pen.setWidth(self.point_size/2)
-            painter.setPen(pen)
-            path=self.shape()
-            if self.closed == True:
-                path.closeSubpath()
-            painter.drawPath(path)
-            vertex_path=QPainterPath()
-            self.drawVertex(vertex_path, 0)
-            [self.drawVertex(vertex_path, i) for i in range(len(self.points))]
-            painter.drawPath(vertex_path)
-            painter.fillPath(vertex_path, self.vertex_fill_color)
-
-
-    def drawVertex(self, path, index):
-        psize = self.point_size
-        if index == self.hIndex:
-            psize = self.hsize
-        if self.hIndex is not None:
-            self.vertex_fill_color = self.hvertex_fill_color
-        else:
-            self.vertex_fill_color = Shape.vertex_fill_color
-        path.addEllipse(self.mapFromScene(self.points[index]), psize, psize)
- 
-
-    def shape(self):
-        path = QPainterPath()
-        polygon=self.mapFromScene(QPolygonF(self.points))
-        path.addPolygon(polygon)
-        return path
-
-    def boundingRect(self):
-        # xs=[point.x() for point in self.points]
-        # ys=[point.y() for point in self.points]
-        # return QRectF(min(xs), min(ys), max(xs) - min(xs), max(ys) - min(ys))
-        return self.shape().boundingRect()
-
-    def moveBy(self, tomove, delta):
-        if tomove=='all':
-            tomove=slice(0,len(self.points))
-        else:
-            tomove=slice(tomove,tomove+1)
-        self.points[tomove] = [point + delta for point in self.points[tomove]]
-
-    def highlightVertex(self, index):
-        self.hIndex = index
-
-    def highlightClear(self):
-        self.hIndex = None
-        self.selected = False
-
-    def __len__(self):
-        return len(self.points)
-
-    def __getitem__(self, index):
-        return self.points[index]
-
-    def __setitem__(self, index, value):
-        self.points[index] = value
-
 
 CURSOR_DEFAULT = Qt.ArrowCursor
 CURSOR_POINT   = Qt.PointingHandCursor
@@ -280,7 +156,7 @@ class SubQGraphicsScene(QGraphicsScene):
             self.overrideCursor(CURSOR_DRAW)
             #update the tail of the pointing line
             if self.line and self.polygon_not_finished():
-                self.line.points[0]=pos
+                self.line[0]=pos
                 self.line.setPos(pos)
             #initialize a pointing line for a new polygon
             elif self.line==None or self.polygonfinished():
@@ -291,14 +167,14 @@ class SubQGraphicsScene(QGraphicsScene):
 
             if self.QGitem:
                 #attract the cursor to the start point of the polygon and close it
-                if len(self.QGitem.points) > 1 and self.closeEnough(pos, self.QGitem.points[0]):
+                if len(self.QGitem) > 1 and self.closeEnough(pos, self.QGitem[0]):
 
-                    pos = self.QGitem.points[0]
+                    pos = self.QGitem[0]
                     self.overrideCursor(CURSOR_POINT)
                     self.QGitem.highlightVertex(0)
 
                 self.QGitem.addPoint(pos)
-                if (self.QGitem.points[0]==pos):
+                if (self.QGitem[0]==pos):
                     self.finalisepoly()
 
 
@@ -333,8 +209,8 @@ class SubQGraphicsScene(QGraphicsScene):
 
             if self.QGitem:
 
-                if len(self.QGitem.points)==1:  #initialize the pointing line collapsed to a point
-                    self.line.points=[self.QGitem.points[0], self.QGitem.points[0]]
+                if len(self.QGitem)==1:  #initialize the pointing line collapsed to a point
+                    self.line.setPoints(self.QGitem.coords[[0, 0]])
                 colorLine = self.lineColor
                 colorShape=self.shapeColor
                 #attract cursor to the polygons start point if close
@@ -344,8 +220,8 @@ class SubQGraphicsScene(QGraphicsScene):
                     self.overrideCursor(CURSOR_POINT)
                     self.QGitem.highlightVertex(0)
 
-                if len(self.line.points)==2: #update the pointing line
-                   self.line.points[1]=pos
+                if len(self.line)==2: #update the pointing line
+                   self.line[1]=pos
                 else: #load the pointing line (if another shape was just created)
                    self.line.addPoint(pos)
 
@@ -370,7 +246,7 @@ class SubQGraphicsScene(QGraphicsScene):
         #update selections/highlights based on cursor location
 
         #check if any vertex is epsilon close to the cursor position and find the corresponding shape
-        id_point=[[i for i, y in enumerate(poly.points) if distance(pos-y)<=self.epsilon] for poly in self.polys]
+        id_point=[[int(i) for i in np.nonzero(((poly.coords - (pos.x(), pos.y()))**2).sum(axis=1)<=self.epsilon)[0]] for poly in self.polys]
         id_shape=[i for i, y in enumerate(id_point) if y != []]
 
         itemUnderMouse=self.itemAt(pos, QTransform())
@@ -410,7 +286,7 @@ class SubQGraphicsScene(QGraphicsScene):
     def finalisepoly(self, premature=False):
         if self.QGitem:
             if premature:
-                if len(self.QGitem.points)==1:
+                if len(self.QGitem)==1:
                     self.objtypes.append('Point')
                 else:
                     self.objtypes.append('Line')
@@ -659,17 +535,14 @@ class MainWindow(QMainWindow):
 
     def loadjson(self, filename):
         try:
-            with open(filename, 'rb') as f:
-                data = json.load(f)
-                self.imagePath = data['imagePath']
-                self.imageData = b64decode(data['imageData'])
-                self.lineColor = data['lineColor']
-                self.fillColor = data['fillColor']
-                self.shapestoload = data['objects']
-                self.object_types= data['type']
-
-        except:
-            pass
+            annotation = read_json(filename)
+        except (OSError, ValueError, KeyError):
+            return
+        self.imagePath = annotation.imagePath
+        self.imageData = annotation.imageData
+        self.lineColor = annotation.colors
+        self.shapestoload = annotation.objects
+        self.object_types= annotation.types
 
     def resetState(self):
         if self.imageData:
@@ -686,7 +559,7 @@ class MainWindow(QMainWindow):
         if self.shapestoload:
             for ps in range(len(polygons)):
                 polygon=Shape()
-                polygon.points=[QPointF(p[0], p[1]) for p in polygons[ps]]
+                polygon.setPoints(polygons[ps])
                 polygon.closed=True
                 self.viewer.scene.polys.append(polygon)
                 self.viewer.scene.objtypes.append(types[ps])
@@ -15,13 +15,23 @@ copy of the image in bytes (optinal, default=False, checkable in the 'File' tab)
 among others, plus a .csv workbook featuring the above.
 
 Hotkeys:
-E: enable drawing mode
+E: enable drawing mode (Ctrl+click: magic wand, outline the region of similar color)
 M: moving mode (move vertices, shapes)
 N: navigation mode (pan mode)
 C: complete current annotation object (if a non-closed shape is sought, i.e. line or point)
-K: copy selected shape
-Del: delete selected/highlighted shape
-Ctrl+Z: undo last action (remove last added point)
+F: freehand mode (drag to draw a polygon, closed on release)
+W: livewire mode (click vertices, the segment to the cursor follows image edges;
+click the first vertex to close, C completes a line)
+R: selection mode (drag a rectangle, Shift+drag a lasso, hold Ctrl to add to
+the selection; drag selected shapes to move them, Esc clears the selection)
+K: copy selected shape (or all shapes selected in selection mode)
+Del: delete selected/highlighted shape (or all shapes selected in selection mode)
+Ctrl+A: select all shapes
+Ctrl+L: relabel the selected shapes
+Ctrl+T: change the type of the selected shapes
+Ctrl+Z: undo (remove last added point while drawing, otherwise undo the last
+move, deletion, copy, relabel or shape edit)
+Ctrl+Y: redo
 Ctrl+O: open an image
 Ctrl+S: save your annotations
 Ctrl+G: select pointing line color
@@ -30,24 +40,66 @@ Ctrl+Q: close the application
 I: Initialize (or edit the list of) labels
 L: Set line width of all objects (retrospectively)
 [: Set attraction epsilon (attracts cursor to shape's first point if epsilon close)
+S: Cycle snapping of drawn and moved vertices to other shapes within epsilon
+(off, vertices, vertices and edges)
 ]: Save original image bytes (check option)
 ': Enable autosave feature (check option, default every 5 minutes)
+
+Label files with 20000+ objects open in a virtualized scene (toggle it in the
+'Edit' tab): Shape items are created only for objects in view, and when more
+than 5000 objects are in view they are drawn read-only until you zoom in.
+
+'Edit' > 'Simplify shapes' drops vertices within a pixel tolerance (Douglas-Peucker);
+shapes with many vertices are drawn simplified while zoomed out.
+
+16-bit and multi-band images (e.g. GeoTIFFs) are shown through a contrast
+stretch ('Edit' > 'Adjust contrast' sets its percentiles and bands, also for
+ordinary images); tiles are rendered on demand and cached.
+
+The status bar shows the memory held by the image, its copies and caches
+(hover it for details); over the limit set under 'Edit' > 'Set memory limit'
+caches, the decoded copy of the photo and old undo steps are released.
+
+Run with --profile (or PYIMANNOTATE_PROFILE=trace.json) to show handler latencies
+in the status bar and write a timing trace on exit.
+
+Run with --watchdog (or --watchdog=MS, PYIMANNOTATE_WATCHDOG=stalls.log) to log
+the Python stack whenever the interface stops responding for over 500 ms.
 """
 
+import time
+IMPORTTIME=time.perf_counter() #before the PyQt and NumPy imports
+
 from functools import partial
-from base64 import b64encode, b64decode
-import json
+import math
 import re
-import pandas as pd
 import os
-from PyQt5.QtGui import *
-from PyQt5.QtCore import *
-from PyQt5.QtWidgets import *
+from PyQt5.QtCore import QPointF, QRect, QRectF, QSize, QTimer, Qt, pyqtSignal
+from PyQt5.QtGui import (QBrush, QColor, QIcon, QImage, QPainter, QPainterPath, QPen,
+                         QPixmap, QPolygonF, QTransform)
+from PyQt5.QtWidgets import (QAction, QApplication, QColorDialog, QComboBox, QDialog,
+                             QDialogButtonBox, QDockWidget, QFileDialog, QFrame, QGraphicsItem,
+                             QGraphicsPathItem, QGraphicsPixmapItem, QGraphicsScene, QGraphicsView, QGridLayout,
+                             QInputDialog, QLabel, QLineEdit, QListWidget, QMainWindow,
+                             QMessageBox, QProgressDialog, QPushButton, QSlider, QToolBar, QToolButton,
+                             QVBoxLayout, QWidget)
 import sys
 import threading
-
-#Application icon bytes to load from
-iconbytes=b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00^\x00\x00\x00R\x08\x06\x00\x00\x00\xdd\x10c\x15\x00\x00\x00\x01sRGB\x00\xae\xce\x1c\xe9\x00\x00\x00\x04gAMA\x00\x00\xb1\x8f\x0b\xfca\x05\x00\x00\x00\tpHYs\x00\x00\x0e\xc3\x00\x00\x0e\xc3\x01\xc7o\xa8d\x00\x00\x00!tEXtCreation Time\x002018:05:27 14:32:54M_Yo\x00\x00(\xddIDATx^\xed\x9d\t\x90&Wq\xe7\xb3\xbe\xfa\xce\xbefzFs\xa3\x0b\xa1\x03Y\x16\x92\x90\x02IF`\x10\x06\x83\r\x02\tq\xd8\x12+\x0c\x06\x04\x18X\xee\xc0\xb0\x08\x1f\xa0\r\xe3\x00F\x04\xd8Dl,\xebe#X\x8c\xbd`\xc0\x02dY\x88\xf0:\xb0\xd0\x81\x90\x84Nvt\xcch\xee\xa3\xaf\xef\xae\xaa\xfd\xfd\xf3Uu\x7f\xdd\xd3\x83\xe8\xee\xb1CD(G\xd9\xef\xd5\xabw\xe4\xcb\xcc\x97\x99\xefU}\xa5(\x03\x0c\xd0_\xcf,\x02Q\x94g\x16@h\xf9\xcb\x83w\xb3\xc4\xbe\x8e4\xf6\x11\xe1?d\x1e\xe9\xc0<Jy\x1a`\xb0\xaf\xa8\xc8Sw\xe1\xd8\x03\x8c\xa73\xeb\x83\xeaHy\x01\xf9(\xa5]9\xbfVy1P\x9a\x0f2Pw\xc1\xfd\xc3\xf2"\xc0\xaf\x8b\xba\x82\x90\x9f#x~\xbb(\xd2\xd8\xf3\xeb\x0e\xde_\x98\x0f\xf3(\xca\x95\n\xc8\x1f\xd5y\xf4\xe9\xab(\x9f\x8f\x83\xf3\x08s\xcd\xfb\xf5y\xcc\x813\xbe\xd7m[\xa5Z\xe5\xb2\x1bJ\x8b\xca\xde\x19\xf9E\x99\x02DE\xbe(\x1f\xbc\xbfX\x9e\xd4\xfb*\xea\n\xf2\xfca}\t\x06\xf3\x8b\xc1\x91\xea\x16y\xa5\x82<\x7f\x94\xe6\x919\x9fz`\xc5\xaf\x85Q&\xc6\x96,M\xfa\x96\xa5}\x8b+eO\xa3R\xb8o\x91\xf8[\xf4#\xc6\xa7s2\x92$\x9f\x82\'\x86\xcc-\x8300[i\x943U\xdc\x0c\x9a\xce}V\x99\x84\xd5o\xcfX\xb9\xbe\x8a\xfc\x9c\xd6G\xedf\x92\xc51\x8d$\x948/]\x08\x0b\xec\xd3,\xcc\x89\xec\x97\x87\xa3\xd9\xd7R\xe1(\x8d\x9d\xd1\x8fX:\xd8\x9d\xe7\xd5O\xa2\x0cl\xef5\xad\x04_\xcb\x95\xaa\xdf\x8bfWU\x80\xa8\xdb\xcc\xb2~o\xd2\x1ey\xf4a\xebg\x8bs>;\x02e\xd1\x11g\xb28\x84^\x8eN_\xcb\x81\xa31\x8f\xc0t\xfa)\x9ad23\xf4\xa0\x1b\x02\xb4<\xcb\x12\x93.c\xc4\xadZk\xd8q\'\x9cd5L\xf9\xe0(Q\xaf\x9de\xf7\xfc\xe4G\xf6\xbe\x8f\xfc\xa5\xed>\xd0RQ\xb83\x00\x8b\x93\xbbX\xcd\'\x86\xc5\xfaZN?\xcb\x81\xa31\x0f\xf5!L\xa5\xa3)\x0cOKV\x12\xd3\xc5\xfcRd\xd5rl\xbd\xb4\x8d\xf5@\xf5\x11\xc0o\x9c\xff,\xfb\xd8\xc7\xdfc\x1b\xd6m\x1a\xb0\xf0\x8c\x99t\xb3\xec\xae\xdbo\xb17\\\xf51;4\x1d\xd3W\xae\xf5\xf4\x1e\r\xc6C\xb3\x10q+\xf3\x92\x01\xef\xf0\xcb\x01\x8d\x0e\x9fd\xe8O\xff\x1d\tT#\xcf\x04\x18\xac\xbb\xa0C\xa7\xac\xa8>K\x7f\x01\x87\x8f\x1e\x00\n\n\x8d\xcdaa\xdb\xd9\xfb$\n\r\xc5\xe4\x14V\xa6\x94\x175\xb3$\xb3V\xd2\xb3QXX+e6\xd3m\xda\xf9\xcf=\xc7>\xff\xc5\x0f\xd8\xc6c6\xd9\xa0=)uq\xce)\xf6\'\xa9U\xacG\xda.Um&\xaa[;\xaeY;\xc5\x92A\x00\xee\x81\x7f\xa9\xb5\x19\xa8\x899j\xe3\xc1;t\xd3&DZ\x14q"\xad\x05\xa8\xb2\x1eT\xe3\xf3I\x15\x17D\xb3\xfd\xb5\xb2J\x8eU\xc7fZsT\xde\xfbb\xbc6\xe3\xf5\x98d\x1f\xec\xb2\xbc\xdb\xb4\x9bIJ\xd6B\xf5\xba\x8c)W\x97\x12A(\xdf&\x82\x98\xe9\x97\xa0\xb1L\xdd\xc8\x128\xd5gn\x1a\xbf\xcb\x98\x05*(TJLG\x1b\xc6\xcfQs\xf0\xb6(\xa1\xda\xf8\\\x9d\x8e\nt\xd5\xadi\xd0\xc5\xb8m\xb4\xbd\x0b\x8b\xe07\x82!\x03\xb3k\x98\x96v<l\x13\xd0\x1f\xc5u\xf3\xa0f\x11y\x97\xe2\x06\x81\x91DV+c\x97\x14\x0e\xc5V\xea\xc5H/\xb2!\xa4\x1aEM\xcaE\x1a\xf6J\xb6\x0b5\xaf\xe0A*Y\xdf\xaf+9\x96\x11R\xb9\xc8CD\x95iy=p6O\x9b\nS\xad`\xfb\x84u!\xf7b\xecb\x8c\x80Yo\x9e/G\xd4-Q\xeem\xd4Wb\xb5\x94\xf1\t\xcf*\x8e\x895J\xb1\xd5`\x0c\x0b\xdd\x92$A j\x87\xbeSO}EQ\xcf\x1a\x19a_\xda\xa2]\x87~\xdaV\xf3q\xa1[\xf4\x88\x16G\xcd\x8br\xa7#\x83\xbd\x99\x8f\xa7\xeb*s\x86\xfdV\x03\xebQ\xd7\xef\x97D+c\xc5\xb4\xd5Xe\xd2z\xd6\xb1j\xd4bLL\x0ce\xe2a\x96\xd4\xa8[\x01\xfb\xc8C\xaex>D\x1d\xc2\xc9;n\xb9\xcd\xde\xf8\xb6kl\xcf^*\x94W\xd9\x18\xc3Nv\xa7\xec\xcc3\xd6\xdb\xfe\xe6N\x1b\xae3\xc1\x84N\x90\xb6lZ\xa60\x89\x0e\xd3\x92:\x0c\x0bM\x0ej\xceyI\xc4\x0b\xf3JA4p\xe1]]y\x9f\xcay\x9f\n\r\x98$Z\x1d%u\xf2R\x1b\xd6\n\x95\x99;\xb7\x10c\xbfl\xf7m{\x9c\x8b\xd8\xc6F\x86\xad\xdbO\x10@\xc7V\x95\xfb\xb6\xe6\xd8Q\x8bY\xd7)\xccO\xa5\x10x\xba>\xdd\xc6\xcc\xab\x84\xa6J\xc4l`\xe8\x8f\xce\x187+\xc9\x1e\x13\x10\xfa\xbd0\x93\x94\xb2L\xe1\xb5\x0f\xa8D\xf7+T\x979\x16\r\x122\x8e\x95|\x1ac\x13\xa8\xdf\xef\x95lrw\xc7\xf6\xed\x8f\x10V\xc5*\x8d\xb6=\xe7\xfc\xe3m\xeb\x17?h\xeb\x8f\xd9\xc2\xa8s0\xcb\xf87\xbf\xfdOl\xff^\x96\xffT\x19B#\xdb\xbcy\xc4\xbe\xfa\xf5?\xb3-\'mF\x82\xd4t\x1e3\xf8 \x0f\xfdb\x11\xa0\xf8\x08w\x0e\xbf\xa1\xbe\n\xf0\xbcv\xabJ\x83\xdd\xcd0+\x0b!\x88\xc8\xec\x8f\xdf\xfbi\xbb\xfe[7\xbb)\xeb\xf6R\x1b\x19\xaa\xdb[\xde\xf4b{\xcb\xd5W\xd8\xf0X\r\xe1\xd0%}\xb18\xc2\x1c\x04\x8b\x11\xa6!\x16\x96\xeb\x9a\xb6\x81\x16F\x94\xd4\x85\x03\x90\xc9\xb9*\x03\x1f\xb4\x9d\xda\xf1\xe8\x03\xf6\xb67\xfeW\xbb\xef\xa1CV\xee"\xe6z\x17\xe7\xfat\xdb\xfa\xa5\xf7\xdb1\x0b\x18?7+4F\xce\xb2V-\xb3\x8b\xc5n&-\x1b\x1e\xc1L \x84\xa1j\x86\xd6G6\x82Y\x1avL\xb9\xeeR\x9e\xf8\xbd\x858\\\xcbldQ\xa4\x0f\xf53\x88*\xf3{\x89\x8dT{\x8e\xc3\x15\xa1\xfa\xef\xd9PM\xd8rl\x80u\xbff\xcf\x08\xcet\xf6X\x82)\xa9c\x9a\xea\xf5\x8a\xa5\xfd\x9e%\x1d\xea\xa1\x81\r\xcc\xe4\x10\xb4\x0fW"\xab\x93\x1f\xaej\x1e \xe3\xcd\xc7\xcc\x1a\x8c\xd7\xf0\xb9p\r\xaa\xcd\x08\xe9\x88\xe6\xe2\xb4\xcc\xd0\xbe\xc9\xbc: \xd7\x9e\xb6\xa0\xb9\x0f\x1f,\xf4C\xfdz9\xb2J\x05s\x85 *\xe52\xf2\x80\xbd\xe0bA\xc8,\xe3\xb3J\xc9*\x10:\xddo\xb3lq-\xb2\xd5\x88H\x12\x95\xfb)g\xd8z\xecY\t\xbbY\xca\xa6Yz3\x16kk\xccR>\x1cY\xd6\x8b!\xedclmH\x17 \xcb6N\xf13i5\xc7:c\x92bb\xe4&K6\x95\xe3\x0c4\xe1k\xa0\xab\x1c\xe3\xcc\xca%\x9b\xee\xc8]3A\x02\x822f\xa8\xccD\x15\xcd\xe1&\x88\x97\xa9\xd8)h\xd08\xcc#\x9d\x1e@\xcd\x0b7\x0f\r%\xd1N\x1b\xb5\x0b\x88\x07\xa1L\x0c\xd4\xe2\x96\xad\x0e\x88=\xcf&@\x85\x07\xe2\x07\x9d\x8b\xb9p8\xeduX%\x98\x1d6\xa9\x18:L\x16\x1c\x9c\xbfP\x1c\xe6\x18\xdf\xd7\x04q\x14ht\xbdBG\xd8J\xc6d\x82\n\x9a4\x03.\x94\xaa\t\x11B\xc4\x1a\x8c\x88~t\xf0\xb4\x10C\xb7\x8b!\xe0\xfeAg\x1d\xeaK\xa0\xfa\xc59\xc6\xfc\xba\xa27\xb6!j\x0c\x93\x0e\x93\xd6H\x85\xec\x08\xb9\xdbk\xcayf6Z\xadA\x7f\x8a\xb6\x8b\xcb\xeaW\xa8C*h\xc7g\x08\xfd`\xab\xd4\x04aZ\x89\x98\xca\x91y\x94\xd0L\xe6\x11\x13\t\x954/\x8d;\x8fQ\xa8t6DZ\xa0|\xce(\xf5\xc6}\xfe\xa2=\xa3]\x90\x0c\r+1\xfe\x05\x87\x8f\xc3\xee\xa4]\xcb\xca\xbe\xdd:\x0cJ\x1aD\x88\xdf\xa0\x034\t-\xc2\xa3\x91\x87p:\x0bnN\xcc\x11j R\x11\x92\x8d\x90\x07\x9c\xd2\x90\x9d\xcd\x1f\t\x9d\xa19\xa3\xfd\xd0H\xf9\x00)D\xa6\xac\xa4\xc4\xf6\xe2\xbcv\x80\x8fB\xc3\x0e\xc69\x04\x12-0\x11mH\xb4\xfa\xd0q4\xeb\xa0\r\x0f\xa5(\xf3\x14\x11\xd0\xa4\xc5\xed\xfd6^\x9d\xa1\xeb\xbd\x96\xc4\xdb\x98\xf0#\x96V\x1ff\x88\x9d\x96\x96\xb9\x8e\x1e\xa1\xef\x9d0d\x1f\xa3M\xe1\x88Y%\xac\xac\xb4\x9f3/\x17\xf6 \x14\xc1H\xc6jL\x08]\x91\xb1\xf5 #!\xbcMp\xfa}\xd4\xba\x87\x8c\xfb\x94\'\xd4\xf5\xb0\x92P\x14\xeeY\x86\xf9\xa9b\xb2"\x94\xb8p/\x83\x10\xb1\x7fr\xe7\xfa\x9f\xde\xf1Qk\xed7l\xbb\x96jbc\xe3e\xfb\xde\r[\xed\x98\xf5\xc7\xe3\x9f\x15\xedB\x98N\xe0\n\xf193\x0b\xad\x15\x88\xf0\x9cR@\xd5\x9c\xd7\x80v\x02a%\xe4\xe5\xb2}\xba\x99WRT\x9f\xd9Ak\xb7w\xd9\x1d\xb7}\xdf\xda\xdd\xfd(@\x0f\x879\xc3N\x10c\xee\x155\x96\x14B\r\x15\xf4\xd5\xec\xdb7\xdcj\xf7\xdd\xaf\xc8\x06\x06\xe2\xf8\xca\xf8\xa73\xcfXm\xbfy\xe1IV-\xd5\x88d0_\xdc\xeb\x13nVku\x1b\x1f_g\x9b\xb6\x9cbc\xab\x8e\xc3\x14\xad\xa3\xbbqV\xc3\x90E\xacn\xd1x\xd8\x1c)\xc3h\xa0\x98\x04\x96\x9a\x1a\xb7\xf7\xef\x9a\xb6\x07\xee\xfd\xb1m\xfb\xf9\xa36q\xa8\t\x8d=c\xeb\xc3^!\xb5\xfd\x13-\xfb\xc6\xb7\xef\xb0\xc9\x83)!z\xc9\xea\xc9\xb4=\xe7\xa2\x93\xec\xba\xeb>d\x1b\xd7>\rZ\xe6`\x80\xf1\x1fs\xc6\xf7\xa4\xfa\x84\x00\xe3\xe3\xb13~\xdd\xba\xe3\x89\x8f\xc5x\x11$\xc2\xd4*`\x86\xf6\r2\xfb\x89a@\xcb\x8b~\x1c&\xb9\xdcm\x13\xadm\xf6\x85/\\\xc3\x8e\xef\x11\x1b\x1am\xa3\x8d\x18g\xec\x9dW\xcb\xc3:\x81r3(w\x8d\x85W\xc2\xa1\xf5P7i\x9d\xf2n\xec0!\x998\xe5M\xd0Vv\x89qm\x8cp/\xb6\x13\xb6\xfc\xba\x9d\xfd\xeb/\xb2g\x9d\xf9Jl\xfb\xf1\xd6\xeb\xd6q\xd4m\xaajK\xa7\xd6R \x01}\xb2\n\xc5\xd5~\x86I\xc5\x9c\xfc\xfc\xfe\x87\xecK\x7f\xf57v\xe3M\xb7[\xefP\x86o\x91y&\xeegZ\x19\xce\xc1\x85\x839\x9a\x8e\x10fS\xc2n\xd9y\xe7\x1fg\x7f\xfd\x85?&\x9c<v\x1e\xe3\x8bQ\x00\xac\xb9v\xa4\xa0Rz\xf2\xb9\xaa\x82W\xd2$|"s\x90\xf3?\xc7\xdc>\x1e\x96_X\x06#\xe9\xc7\xf3J\xf3\xbc\xb4\xb9\xce\xaa/\xc58\xbbh\x8f\xb5f&\xac\xd9\xea\xb0\x02\xd1|!>\xa8O\xd4\xd2G\xc3\x92n\x97HD\x1b\x9a\xc4:\xd3\xac\xfd.\x1b!\xccb\xd6N\x90\x93\xe2\xe9.&\x81z\xdak\xb0y\xa2\x14]:\x84\xef\xdbg?\xdfv\x93\xfd\xf3\x0f\xbffw\xddy\xbdu\xba\xdb1\xa7M\x1f]\xda\xae}uP$\xf9 \xcc\x9b\xec\xb6\xaf\xae\xc8\x1e{\xf8a\xfb\xc0\x07\xff\xdc\xfe\xcf\xff\xfe\xa1\xed\xdc\xd5\xb5\xfd\x98\x99ny\xd8z\x15\xf6\x10\x04\x01=\x02\x83\x84\x94\xed!\xe6\x1e$\xa6\xc7v\xb0\xf2\xe0e\x98\xe0<\x98e|DL\xda\x85\xd9\x19\xbb\xae\x14{Vb\x99\xfa\xe1\x8f\x13"\x82\xc0\xd9\x0e\n\xe2\xa4\xc1\xbf\x08e?\x83\r\r\xa8~X%\xf3L\x14\xf2\x84\xe0\x94\xd5\x94`D{]\x85\xb5r\x88\x915Fp|\x84\xb6\x11X"\xea\x8a\x88`t\xd4\x1a\xcb\x89\tP\xb1\x1a!\x8c\xa2\xb1\x12\xf9z\x8d\xe5M\x1d\x91\xa7\xad\xbav\xe2\x11\xce\xae\xd2@\xd7<\xc5=\x8f\xc4\xb6\xf7\xc0\xddv\xd7\xcf\xfe\xd9&\xa7\xb7\xd1\xdfA\xa6%6\x88N9O\xe5\x85\xd8}\xed@QB\xe4n\x7f\xfb\xd5o\xd8\x83w\xe2s\xe2U\x98\xb4Q\x16\x7f\r\x9aa4\x1b*\x1d)hS\'V\xb3\xb6\xac\xdc\xc4\xbe#\x08\xd9\xffR\x1f;\xcf\xdc\x16\xf2^#\x00\x14\xcb\x81\xe8\x12f{\xe0\x91kwh\xa0\x021K\xcc\x06<\xc2\x01\xdd\xf4hu\x14f(\xcf\xd3\x17\x1e-\x94\r\xe6\xbdO\x99\xa7\x9c\xf1\xbavT\x1d\x98\x9b\xd5\x18O\x13\xd0\xd6\x9c"\xed.15\xc2T\x9e\x8b\xc8\xc5\xf3\x08Ht\xf5av\x89:\xb4\x0e\xc2\xe0^\xd2\xa6oL\x8f\xe8O{\x08\x11\x94[(\xda\xc9G4\x1a\x89=\xb6\xf3\x1e\xdb\xbb\xe7g\xccE\xf4\x88\xb6\x9cv\xccJ\x88bt\xce\x82\xc9\xe0\xde\xee\xed\x0f\xda\x8f\xfe\xf5>\x16V\xd5\x9a\x1dv\xcd\x84\xad\t\xe3e\x84\xd6\x95\x12\xfb\n\xb1;\xc5Y\xb3s\xae\x83Ii\x86\xd8\xa3g\x95\x84\xd0\x19\xbe\xc9\xc4\x04>\xce\xc1\xdc\x91\xc1;\xfe\xc4\x0e\xecS\x18\xc4P\xd0\xbe\x0e\xe7z\xc3\x8d\x9f\xb6u\x1b\x8ec\xc1\x88\xd19\xd3\x89\xafY\x0e\xf9uN,\x90E\x87pb-\x06Z\xcb \xd2n@\x02r\xa6\x92W ]0\\\xf7]\x089\x10\x95\x186\xfe`\xf3>\xfb\xeb/\xe1k\xbaw\xa3\xa1h\t\xda\x9d)\\\x00\\\x19\x94j72\xb0#Q\x99\x98\x19\x9c\xee\xdc\xfdL\x9a\xafk\x04V\xdc\x93\x0e(R\xd1U\x1c\x0f\xdbK.z\x9b\x9d{\xf6;\xf1\t\x1b\xb8\xc1<\xb8\x11z\x0ecj\xd7\xac\xdc\xdd?\xb9\xc5\xde\xf3\xae\xad\xf6\xd0\xb6\x03\xd6*\x8fP\xce\x0e\x7fz\xc2\xdex\xc5\x0b\xed\xf9\xcf\xfb5\x04=\xe9&\xa5\x8fb\xf8\xdc1Q%$\x9f\xa4m\xdb\xb2i\xa3\x9dq\xd6\x056:\x8a0\x03\x19\x0e\x81:\x87\x0c\xa6\x05\xc2\xc3\x19\x86&\xa3ry\xfc\x81j9q*\xeba[1\xbb\xbe5O\xd3)&\xa3\xcd\x03\x1b\x1c\x8f\x97\xd9dE\xfbC>\xc6q)\xef8\x05\x1e\x08\xf7\xbd\x1e\xe1\xa2\x1d\xa0\xbf&\x1a\xd6\xe3\x9e\xfac\x04f\x9cJ\xa3Ic\x98\'\xcdv\xa6\nT)\xc7A\x86\x17L\x0f%s\xe0\xf7\xd0x\t\xc1\x81\xe9h\x13\xa6\x8d\xce\xac\xb3G\xb2\xba+F\xe7\xb5fA\xfd\xa9L\xfc\x10CUk\xddH\xd5\xce=\xf7\x14{\xd9+^f\x97\xbd\xe6\xf5\xf6\xca\xcb.\xb7K/}\xad\xbd\xea\xd5\xaf\xb2W\xbe\xfaR{\xc5\xe5\x97\xd9+^}\xb9=\xfb\xfc\xe7\xdb\xf0\xc8|\xa6\x0b\x068\xbat\x88\xf1\xf81\x1b\x84N\xf71\xdb\xf1\xf8=\xb6k\xcf=\xb6{\xff\x8fm\xc7\xce\x1f\xd8\xf6\x9d7\xd9\xf6]?\xcc\xd3\x1bC~\xd7\xbf\x807S\x96\x97?.\xfc\x17\xea\xdfn;w\xdfe\xfb\xf6<\x083\x10\x9e\xf7\x1dp\x96\xd9O"\xd0\xe6QK\'\xc3\x91\xc7\xb9\xdcD\xa5\xf6Q\x8e\xba-?\xc5\x04\x14\xe2\xe6\xba1\x0f\x06L\xcd\'lb\x7fLhF)b_?^\xb5\xef\xdf\xf8\x17\xb6~\xfdf\xb9\x0b\x98![\x08`\x03\xc3I\xa2\xcc\xc3\x04U\xdb\xf6\xd0C\xb7\xd8\xf7n\xfa\x92ML\x8bq\xb8\x18\r\xe6\xfbu\xc8\x91}G\xbb\xb4\xfcD\x9d\x9f\xf0\xe1\x942\x9cQ!w\xd9\xca~6i\x15\xac\xd8\xde=\x13\xac\x1c\xb5E\'\x13\xec1eKb~\xae\xf1\xe9\x80\xa9q\xa0<\xa5O\xa1\x98Sf\xd7\xf9\x92\xe7\xbd\xcd\x9e}\xd6\xfb05k\xa9\xe0\x9e\xc55\xde#/o\x12\xae\xef\xc1\xd4\xbcK\xa6\xe6\xe1\x03\x1e\xc9d}\xbca:c\x9f\xfc\xf37\xda\x15W\xbd\x16\xaf\xc4\xeaa\x9enY\xd5\x9e)\xeb\x19\x86\xef_4W\xa6S\xd6t\x07 P\xb7,PS\x11\xc8\x00\xec8\x0fL<`\x9d\xce>H\xd8o\xd33;mrj/Q\xc3~\xd2]\xb3\xf9\xa9\xa9}61\xf5\xb8\x1d\x9a~\xd8&f\x1e\x04\xefGX\xf7\xd9ds\x9b\xcd4\xf7\xdb\xa1\x03\xfb\x89d2\xb0b\xf5\xe1\xb2\x8d\xac\xce\xd5\xe9I\x04R\x82\x18\xa1\x8e\x11%\x95\xab\xf0\x00N\xa7)<\xc0\xdeJ\xa0\x8a\xa6t\x9df\x98Q\xf8#\xd1\xe9\x88z!\xac\x80\xf1U\x88\xd8\xc2(k\x18t\x88\xa8\xa3\xee\x87j\t\xe1\xa0tGQ\x86L\x85\x14O\x0f(\x94\xd7\x06\xa7D\x81#D;\xd6\x88fHcBA\x852z\xbf\xaa=\xd3\xb3^\x8b\xd8}\x06\xdf\xb0\x14m\xff\x0f\x02EK=\x9d\xe6\xe2\xf8q\x1d\x1e\x81\xc9\xe4\xc8q\xeb\x9a\xbfh\xbf$\xa2c\x10\xed%\xbcp\x1e\xe4\x8c_\xee\xe4\xb4\x9d\xee e9\xcf\x83\x1eIdp\xd8SzV\xaf\x8e\xfc\x11Q\x1eQ\xc8\xc9\x89\x10\xd12\x802\t\xb1\xe2q.Q&\x04\x86\xe0\xc2z\xe7\xcf\xd1\x83`\x83\x83\xd1U\xd7!\xb7D\x10a\xb4\x95\xe6\xeb\xd9\x85w\x87\x9d\xf1\x84\xfeclM\x1c\x13\x16\xeb\x00\x8e%\xe0\xaf\xcf,\x00/Y\xde\xd4\n\x8ea\xc0J8\xc4L\xdbn.=4\x1a@\x81\x12M8\xcf\xfa\xc9\xa6R\x95\xe5\xa8\xc9(\x95p|\xbd\xc2\x15o]\xf4\xb1B\x10m\x83\xf3\x9c\xcbk\xf0\xa5AA\xd2\xacN\x0ct\xec\xf7\x06H\xf6 h\x11X\xfa\xa8\xb3\xa0\xb5\xa5\x8d\xc60\xe9\\\\.S\xe1\x14\xc9\xa9\t}\xc9\xc1D\xc5\xb8\xaeby\x08X\x8c\xac\xfc Jp\xe2\xbb\xaf\x1aPe\xbf\n\xa0%\xbe\x00~\x11\xe5\xcbf|0\n\xe2P\x1d\x86\x06\'X\x82\xd1\xb3\x889\x11\x8a\xd9\xbe-P\x1b1^BP\xb9\x04A=O\x17\xa2\xca\x85\xde\x966\xbf\x12\x90\xb3\xd2\xc9\xd5\x11\xc1/f\xed\xb2\x19\xef K\xa3\x14\xce\x16\xda\\0\xd8S\xddS\xaa\x8c\xcc\x87ku(sP\x1ba\xbe*\x0e\xc3\xe2\xfe\x93\x08\xb4\x02\x15f\xea\xe1\x87\x1fo;(\x05\x0bR=\x952\xe6\xe5\x8b\xc0\xe2\xa5\xbf,\xf8\xd1A8{\xc9\xf4DYcc*f\xcd\x04\xa8\x17\x7f\x82\xdb\x0f\xe5.\x80\x05\xe8\xf2X\x0c5\x862O\x12\x08;\xf9\xc0\xfc<\x13\xd2A\xa6\xcf\x03\xca\x05\x8b\xdc\xf3;\xcb\x9b\x9a6\x08 \x92/\x97\xc7m\xcb\x86\x0bm\xed\xaa\xd3l\xfd\xeaS\xc1Sl\xed\x9aSl\x1dx\xcc\xda\xd3m\xcd\xda_\x0b\xe5\xabN\xb5u\xe3\xcf\xcc\x91\xbc\xea\x8c\x87:\xc7\xac}\xa6m\xd8p\xb2\xf5t\xa8\x8d\x80\xb4\xd1\x91\xe0\x96\x0c\x83\x93\x94^\xe4\xabF\x0e]\x0c\xd3\xe3>\x1d\xbe\xb9B8Th\xa2\xa3\xdf\xc0<\xed\xf3\xfc48\x07e\xf5B\x94w\x05\xa7\xa2R\xbe\xf1c\xdez\xc3H\xe0m\xb5{\xf2\x8d\x1f\xd7\xa0"\xf8P\x8f\xf2\x05\xa7\xb1\x82\x15\xec\\\x89Q\x89cKqj33\x8f\xd8\xc1C\xdb)#\xbaa\xc7\x1ayh"\xd0\xe4\x8a%WL\xb4H{\xa0\x0e\xdat\xad\t\xf4\xad\x93=l\xff\xe3+\xd7X\xb9\xde\xb7D\xa7\x8a\x94.\x190QRH\xdf\xb9j\xce\n]\x01_\x81*\x03\x12\xfcH\xa5\\\xb7\xdf\xba\xf0mv\xee\xb3>jqu\xcc\xc7*|\x91hQ\xe3,\xaaZ\x87\xe6\xf7\xdcu\xab\xbd\xfb=[m\xdb\xb6\t\xa2\xb6U\xd6\xee\xcd\xd8H\xda\xb4\x8f\x7f\xf2\xad\xf6\xba\xdf\xbf\x84\xf0W\xa2\xd3S4\x9d\xf7\xc0\x1f\xe6+\x16\xe8\xe5\'\x7f\xc9I\x84\xd8\x88$4;\xfd@\xc9\xb2@o\x9e\rA\xec\x88\r\x0f\x9dlO\xdb\xf2\x1bv\xec\x96\x0bl\xcb\xa6\xf3l\xd3\xe6s\xc0\xb3\xc0\xb3\xc13sT\xfe\xd9\xa0\xee\x85\xfb\x1b\xbd\xec\x1c\xdbL\xf9\xe6\xcd\xe7\xda\xc6Mg\xd2\xefZK\xda=\xb6\xd81\xc4C\xe9Rm\xfc\x80\xb4f\x1d\xb3$!@\x08)L\xaf\xd7\xa5\x0c\xb1U\xabl\xfa*h\x1a;\xef\xcc\x9f\x82\x81\x99p\x8a\xfc\x0cu\xf2\x87$\xce@\xbd\xc1\xd6\xb3v\xe7\x10r\x99\xb2\xc6p\xcb*u\xbd=&6\xb7\xd9\xb5\xef\xcf7J\xb9\xc0\xc9\xa5}\x04\xe0\x81\x87\xca\xc3j(\xf2+`<\xcd\xa5\xb4\x02\xc2\xc9~\x17\xec\x8d\xb2\n\xc6\xe9\x7f3\x1d\x17\xb8\x05\xd4\x9b\xb2\x1b\xc0u9\xeaZ+Ie\xda\xfdn`\xc7;\n\xa3Fq\x05#\xcepi|Bds4`^H\xaa\xa8\x89\xfe\xbb\xcd\x0efm\xca\xba\xbd]\x8c\xd9\xf5U]B\xc3\xa3\x92\xb0\x01C\x87aZ]\xa7\xd3,\x11\x98\xd5c\x93\x08ce\x86j\xd4kOb\xbaZ\x81\x97:6\xa9\xd5\xaa("L\x86\xbf\xc5\x82\xd7nVC\xfb{\x95\xbe\x8a\xc2JR\xba\x02\xc6C\x84\x84\x99C\\\xaeb\xeb\xeb\x10\xaf%\xc5r#\xc6\x17\xe1z\xba\x14\x10;Z c\x87<\xfb\x00\x7f-P\xafV\x0c#<\x11\xaa\xd7\xe8D|f\xd5FN\xf9\x12\xc1}C>y\x07\xcdR\xa8q\xe9W&\xb2Zg\xcc\n\xcc\xacL0\xde~h\x11\x92\x97\xb6g3\x9e\xa6\xba\xd6a f\xa5Z\xeb\xb2K\x9d\xb6Fg\xca\xaa\xb4\xefv\t&\xfaz\xb8\'\x90\x89\xe9\xa2(\xfba\x04\x93`\xacBe<\xac\xf4\x1db\xc1|\xa5\x08w%6^\x92\xd6\x13|1+.\xe9\xd1\x19dh\xc4\xc3x\xa5\xfa\x05\x8a\x08\x91\x9b_k)\xd2F\xe7\xf13\xbd\xdb\xed\xba/\\m\xdd\xe4>w\x80\x02\x7f\xf7e)\xe6F\x8eSIP\xb5P\x84mW?:?\xea6\xb1\xc5NFl\'\x1e\x7f\xa6\x9d\xf8\xb4\xb3,K\x82I)\x9cl\xe8\x01\xea0#\xe5\xb8f;v\x1e\xb0\x1b\xff\xe9.;p\xa0mq:b\xad.\xdc\xe8\xa6\xf6\xe6\xab~\xd7~\xeb\xe2\x17\xd9\xd8\xe8\x88U*zIu\x94\xbeFP\xc8u\x10\x9e\xf3"\x83O\xf2{>\xefb\xee\xd0\xb3|\xc6\x8b\xd8)\xca\xd5Q\x88\x0c\x124!\xe2\xbe\xb4?@\xce\xdcYI\x0b\x162^\x02\x13L\xdbt\xf7v\xfb\x8b\xcf^\t\xa1;,\xd6+y\xf4\xa7w\xce\x97\xc5\xf8p\xe5\x90\xc9_\x90&\x1d\x94\x84\xfbe\tB\xaf)6a\x08\xe6C\xd7p\x8d\xa6\xe1\xe8X\x95=2!\x04N!\x9d;0\xb6\xe4\xed\xf5\xc2HW\xa6\x06\xc6\xd7\xab0<m\xd8\xda\xb1\xf5\xb6zh\xdcN8\xe1T|\xd6i\xb6f\xfd\x8966\x0c\xdf\xca\r7_%\xed\xeeM\xaf\xa9\x14\xcaYr.\xac\x00\xe4<D\'D\xa1\xf9\xee\xc91l^6\x88\xd4\x9c\x87\x03eE&\xd3\x03v=8@\xc3\x9cq\x98\x041}E0\xd0\\\xe1d\\\x8b\xfdq\xa2D\xae\xb0U\xa7\xa5:[\x12\x93\xc5\xf4\xd9\xea"\x80r\xe9\x97\xec\xb4\xea\xf5a\xb4\xda\xeb\xa5\xafR\xa5c\xd5Q\x1c\\\xe9 \xa6\xeaq;4q\xab\xed:x\x93\xdd\xf4\xaf\xd7\xd9W\xbf\xf9.\xfb\x9f\x7f\xffV\xfb\xfa\xf5\xef\xb0[\xee\xf8\x9cm\xdf~\xb3M\xb7\x1e\xb0$\xdb\xeb\xa6+I\'H\xf5\xba\xcc\xb2AZ\xab_\xb2\xe9u\xb6!B\xefQB\xb41\xb44t)\xda\xb5\xbc\xfc]\x15l|\x84\xb4\xf5<2\xa0VP\xc8\xf3\'\x00\xa6 \xe9\xd1\x02\x93%&\xa5]T\rf,I\xdbs8\xac\x89\x98\n\xfa\x03s\x1dM\xa3\xed\xa1,\xd4E\xc6\x8e\xca\xbb#\xe5"\xea{t\xceb\xd5\x91\xb6\xcc\x0f\xb7h\xaf 7\x81\xe62\xfeGG\xd9\xeaS\xc2\xec\xb1\x1a\x14\x89\xe9\xc7\x11\x07\xf6\xed\xb4\xfb\x7f~\x8b]\x7f\xe3\x97\xed\xeb\xdf\xb9\xd6n\xbcy\xab\xdd{\xef\r\xd6\xeclcE\xed\xa2\xaf\xdd+15\xa9\xe9}\xa38\xd7p\x85R:\xfe\xd4\x06v\x96\x99\x83 \xcaU\xae\xd4\x81>\xd4On\xe3\xf5>\xe5L\xf76\xfb\xec\xe7\xafF\x1b\xef\xc2\xdcH\x1b\x15\x0f\xab\xdeb\x1d\x1e\x01 f\xde0\x80\xef\xa4\xe9\xa6\x0f\x93b\xbdV\'FRo\xd3\xba\x13\xd8\xc4=\xc3\x05\x1d\x80{\x19\x13\xd0+\x8c\xbe.R?w?4\xd9\xb2\x7f\xbb\xe3\x01\xebv\xcaV\xad\xa0d#\x13(\xc8\x94\xadY5l5\xf8\x914q\xc2I\x0b\x93E;\xd1\xac\xfe\xf4J\ni\xd6\xe93\x9f\xb2\x8d\r\x9dn\'\x1cw\xaa]\xf4\xbcKl\xf3\xba\xd3V\xc6\xf8\xf0XO\x80mw\xf5\x90wW=\xae\xdd\xae\xeb~\xb1\xa8\x8a\xba\x02\xe5U\x0f\xc9\xd1{JT\x93\xf4\x0fZ/\xfe\x7f\xf6\x99\xcf\x8a\xf1\xf7\xba\t\x906\x95H\x97\xc3xi\x9e\xaf\x16\xa9\xb2\xec7}D\xd8i]\xf6\xdb\x84\x7fCU{\xe1\x85/\xb7s\xcez\xa7\xd5\xe2\xcd\xb4\xd1\n\x84\xd6\xd9\xf3\x17\xcdE\x02,\xdbO\xee\xb8\xdd>\xfc\xd1\xcf\xd8=\x0f\xec\xb6v_\x81Dj\xa3\x98\xeb\x8f\xbc\xff\xd5\xf6\xe2\x97\\`S\x13\x0f\xda\xbe\xbd\xf7\xe3\x84\x1f\xb0=\x13;l\xb2\xb9\xdbZD?\x95\xb8\x83\xa0\xc3N\xb9\xd7\xd2^\xb6lCCO\xb7\x17_\xfc\xcaY\xae,\x03R\x96\x9e\x9e\xae\xe81\x17\xa1\x17\xcb\'\xb3\x1d\xe4\x1f\'}\x9c\xeb=\xa4ZV\xc2"\xaf:\xa1\x9e\xd2\xa2NT\xda\xc9\xeeq\x9aU\x8e\xcd\x8cg\xfc\xc5%M:\xd6\x13\x91\xa50] -\x83\xe9\xce\xc3\xa2\xad\xb8\x8d\tq\xe7\xaa*\xb2\xeb\t\xa6B{\x89\xe4X\xc6\xda\x04-\xeb\x90\xd9:\x84%\xdc\x80\xd2o! \xd9\xe2\xf9Ji\x83\xf5\x0eR\xde\xdab\xe5\xec\x19V\x9a9\xd9v\xef\xddL<\x7f\x86mb\xe3x\xda\xe9/\xb4\xe7=\xff\rv\xe9\xe5\x1f\xb6\xd7]\xf6\t{\xd5o\x7f\xc4\x9e\xff\x9c\xdfgE)b\x1a\xf6\x13\xd7\xf2\x10\xeaK\xa4-{\xff\x0f\xdf\xfd\xd2\xca\xc2I7\x03h\xed\xde\xbd\xf7\xdac\xdbo\xb3V{\xbfU\xaa\xb2\x9dZ\xaa\xb2\xcf\x9a\xa6l\x8fPu\x07\x99\xa8p\x01\x07\x05O\x82\xadgWY\xdak\xdf\xba\xfeold5\xbd\xb6\xd8\xbd\xb2\\\xdd\x86Js\x97\x02b\xbeV\x8a\xda\xcaf\xe7\x90I\xf3)\xef\xf7\xf4\xc3\x81\x11{\xe9E\xefA\xe3\xff\xb3\xaf\x04\xcdCo\x82I+\x83\xd6+%R\xa3\xf9]w\xddn\xef~\xfbg\xec\x81\x1d\x93\xa6\xd7\x97j\xd3\xac\xc6Z\xc7>\xfd\xe97\xd9e\xaf{1V\x05eJ\xa7YX,\x83l\x0c\xa1\xc7\xfe\xe6\xc5\xc4\xd4\x03\xf6\xe8c7\xdb\xadw~\x8f\x95\xb0\xcd\x7f\xb5\xa2\xa7l\x99\x14`\xc5\xa6&:d\x0f>\xf8-\xfb\xca\xdf}\x0c\xcd}\xcc5\xd5_(`\xde:\xfb\xd0\xd2\x17\xf8\xa1\x944\xf0HLT\xb1\xaa\x889\xd2\xd8\x1c\xbcx)\x8c\xa7.\xdd\x1c~V\xa32\xddq\xdf\x01\xe2\xec\x7f\xfb\xa2\xab\xed\xbc\xb3?\xec{\x900\x82\xc6\rc\xcb\xec\xf8\xeb\xd9\xe4\xef\xb93\xbce\xf0\xf3G\x0eZ\xabDh\x98\xd2:\x99\xb6O]\xfbf{\xdd\x95\x97\xb0\n\x9at\xab\xf1P x\xa2\x17X-\x9a\xa6\xe5\x14\xa8\xed\xfd!\xbb\xe1\xe6k\xed\xff\xfe\xe8\xdbX\t"\xa2\x86\xde\xf0_\x01h\x82\xd2\xda\xac\xa4\x97\x91\x1ew\x87\x12\xe9\x897&B\xa1\xa1R9H=\xdc\xd6=\xdf\x7f\xab<Gw\xa0\x05\x8a\x19\xa4\x0eb\xb4\x18\x08\xd3\x96\x13\xd5\xcc\x02\xc3\xb8\xb0\x0b\x93\xa3De\x9e\r\xa2\x08\x8c\tQ\x96v\x94\x18\x05\xee\x04S\xe7\x0b6o*\x90Cf\r\x12i\xea\xd7\x80\xf2aj\xab\x0e\xb5:\xd0v\xcc\x97 4Q\x7f\xe3\xd0\x7f\x1c\xf8t\xbb\xf0\xfc\xb7\xda\xe5\x97|\xc46m8\xd7Z3+\x8a\xe3%U\x11\xae\x95 "D(KP=\x82\xee\xccr\x06\xfaa\x97\xaa\xb2\xf4\xdd\xde\xe6\xe8\xb7\xd5n\x01\x16\x8c\x9f\xcd?\xc9`V\x16\x0b\xb97O\xb0\xc2\xa2\xc2\x905\xaaO\xb3g\x9c|\xb1\xbd\xe8\xf9\xaf\xb7M\x1bO[\t\xe3C\x18\x19$\x9b\xbf\xad\xa3\x021\x18\xf4%\x9e3\xcf\xeb\xe5K\xde#\x0c\xb4}\x16\xe5H\x8f\x84\n\xfb\x06\xcc\xce\x93\x05\x8a\x95\xe0\xe9,\xe4\xf3\x13\xf8Y\xfd h\xf7z\xbcUK\xc7\xd9\xd3Oz\x81\xbd\xfc\xa5\x7f\xb8\x12\xc6\x0b\xd4\\\xa8\xd7\x99\xbd \xc0\xbc\x8b\x1c\xf2"\x8f4f\x9b\x91/LA\x81\xbf*\x10\x1c\x18\x98kZ\xc1\xf8yS\xc8\xcbT\xad_\'\x8ce\xc3\xd9[o\'ly\xeeJ\x18_\x98\x1a\x99\x19\xf5\x1c\xac\xa6@g\x1cI\xae\xb1\xfe*\x87\x88\x91\xa6\x17\x8c-\xe8\x94\x80\x06\xd1\xa3\x10PG\xb7~|\x1b\xf0\xc9\x0b\x9aq\xce\xc2EtFw\xbd\x1c\xd4\xf4Jz\x18\x92\xea\xe8|\xcdJ\x18\x0fD\xc4\xf00^!_V\x1a\n\x9d\xc9v\x17\x82\xa6\xc0C\xb8\x9c\xe9\xe1z\x00U\x07t\xabD\x1f:\x14\xab\xd4q[\xbaV\xb9S~t \x9f\xbf\x0b\\Nr\xf6\xba\xd0\xca\xa5\x006\xa6B\xc8\xa8\xf7D\x9dF?\x89\x94\xe9\xd5\xa1^\xa8"(\xe6\xa7\x81\xa2r\x9b \xa3\xcf\xeev\xc4\x92\xee\xf8\xca4>\xf3pI/2\xe9\xdd\xc1\x8e3/\xd6V\x99^}\x1b.\x1b\x9d\xdbk\x8fZT6\x889\xf8\xae\x97\xfb\xbd>\xce\x99\xac\xa3V\x8b"\xa1\x81zG\x03\xe6\xc9\x92\xae\x97#[1X\x1f\xd8hw\xb4\x81\x9c\xebA\x1b?\x8f*\xbd\x88\xbcGK\x81\xc5\x91\x0e\xd4b\xf1\xab\xef{\x88\x150^\xdb\xfdCt\xac\xdf\x8d"\xc9\xda\x90?\x91\xd2\xa35I]\xab\xc0\xf3l\x1a\x84:\'\xf1k\xfd\xd4\x86\rD\xd6ae\xf4\x10J\x87\x95\xd0\x15&V-g\xfe<\xb4\\\x83\xe1h\xa5N\x04g\xcd\xd3\x93\x04DOR*[\x19-o\xd4\x1a\xbe!\xd2a\x80\xe8\xd6\xbc\xf5+\x15\xcdSa\xa9+\x90\xaf0\tX\xd6A\xb1=\xe6Sz\xb7\xfc\rT\xdb\x12\xfd\xe83n\xda\xce\xc7\xef\xb3\x9f\xde\xf3\xf7\xd6\xcf\xf6\x10\x9eKK\x19\xc9_\xfa\xd7\xf9\xb7\x98\xc8H%\xea\xaaL6F;Y/\x07\x05\x08\xaeTj[\x97M\xc9mw\xfe\x14\xc2\x0f\x85\x97Xu\x0b\x81-\tr3\xf2\xef\xfa\x9a6]6\x92\xa6}\xe2\xcf\xfe\xc0~\xef\r\x97\xb2a$\xaeg\xe3\xa4\xf7$}4\xfa\xef%z\x90\xaf\x07\xffu\x7fqW\xbf\xd9\xd5^!\xd3O<IW\xc0x\xb2\xfd0\xb94k[\xb3\xfb\x08KH\x04+\xb4\x14C\xd5\x91\x06\xd7\x03\x00\xd5\x9b\x81(m8\x98\xb8_\x17\xa8\xe3\x05\x84\xc8\x0exz\xe6Q\xfb\xef_\xfe4\xe9\x03\xfe\x831\xc9\xe8\xc9\xc8x\xfdRE_\xd2\xf9\xe4\xa7\xdeb\xaf\xbf\xf2\x15V\xa1o\xdf\x12\x11gh8\xbd\x01"\x9d\x17\xa8\xdc\xcf\xf2KS\x16\x97k0^\xc7\xe3a\xe69\xe8r)\xd0\x85Ym\x1f *Wmtx\xc8?\x92S\xab\xae\xb5zm\x0b\xf84p\xb3\xd5\xab\xc7\x83\'\xfau\xa3v"x:\xf93\xc13@\xe5\x9fI\xd9f\x1b\xaen\xb0U\xe3\x1bq@e\x1cl\xd8\xaa\xf7\xba\x98#\xad\xcb\xa3\x04+\xeb\xab\x10\xa0\x18[aN\xfa:Hj3S-\xebv\x9a\xd6mO\xb3#\x9d\xb6~?\xe4{\x9d\xb6uZ\xd3\xd6nN[\x99\x1d{\x1c\xaf\nL\x17\xc7\xc1Y\x8d\xbf\xea\xed\x7fj\x07\x0f\x94pp%+\x13]\xac_\x13\xdb\r\xff\xf4\x97v\xccF\xfd\xf8L!\xa3\xb4\x97\x16\xda\x1a\x13\xcd\x84_c\x87\xa3NAf\x13\xfc\x95\xa6\x8c\x92jS%\x89\xab\x9d\x0e\x8e4\x92V\x8c\xca\xb8\xa73x\xef\x8bD\xbc\x88\x9a\xdcy\xcc\xa6\xbb\x0f\xd9g?\xfb~\x98\xfe !ip\xc8\xae\xc14\xd3o\xa0\x04\xfe\xde\xb9R\xd0\x7f\xfdGF?\xcd\x94#g*T\x07\xb9Wl\xbc\xb4{\x96\xd3\xf3{TV\x00\xa0G}z6\xfa;/x\x87\x9ds\xd6\x1f\xe0\xd77\xd1\x00\xba4\x9c\xcf3h\xab\xe8L\x98\xdf\xbdw\xdff\xef~\xcfgl\xdb\x83\x07l*kXT\xa9Z\x0f\xa6^p\xe6\xd3\xed\xa4S\x8e!\x8a\x9ba\xd5\xe8\x17,4I*\x1e\xd5U+1\xd1\xd9\x8c\x9dy\xfaI\xf6\xda+.\xb7\xb1\xd5k\xbc\\\x96X\xbe P\'\xe2\xa0\xd6\x17i\xaa;s\x9b\xdd\xf0rRaf\xc4\xd0\x00\xaa\x11\x98\xae\x9a\xf2\xe0\xab\xc0q\xf2E\x1d\x95\xe7y7M\xaa+A  \xff\x88D\x0e\xce%\x9d\x85\xebdP\xbf\x1d\x8d\xd1$\xd1\xc3\xf2\x15W\x9d\xb3")\xe4}4\xee\x95A})\xa4\x04\xf3\xf5\x01\t\xfdX@QS\\\xd5Y\x8b\xfa\xa4\x0f\x04\xe7\x11\x95\x10Az_\xd4\xef\xb7z\xb6j\xe8D[\xbb\xfa$\x8ar&\x0b\x98\xab\xe6\x1bLM\xea\xaf\x7f\x90\xb1u(\xdf\x86\rk\x9c&\xa2\x06\x02\x82\x8e\x95ju\xbb\xe5\xee\xed\xf6\xb5\x7f\xb8\xdd\xbe\xf5\xed\x9f\xd9?~\xfb\xa7\xf6\x9d\x7f\xbc\xcb\xbe\xf6\xdd\xbb\xed\xeb\xdf\xbc\xdf\xfe\xf6\xeb\xf7\xdb\xdf}\xf3^\xfb\xc1\xcd?\xb3\xb6">\r\xaf\x9f\xee\xeb\xad2X\xa1yx\xe7z\x0fR~8#\xb2\xc8b&\x82$\xf4%"\x9f\x84\xcf\\LT\xaakM\x0eMvT\xb9p\xe1u\x81bx\x81\xba\xaf\x07\xbfJ\x01\x8d\xeb(\xc1\xf6X\xc2}\xabVa^\x05\x86\xc1$\xb1D\xd1\x91\x8ef\xfd\xd1\x1d\x8c\x96\xe8d\x86Z0[\x1eC\xbf7\x8d\x86\x11\x1c\xd8\x83\xd1\xee\xd2P\x1c\xf9*oO\xbb.Q\x94\x1e\xc4K\x18\xb5F\x990\xb0j\xc7n9\xc3\xd6\xac=\x95\x19m\xa0\x16t\x8a\x0eg\xc7\xdc\x1c\xca\x95Q5\xb1\xc6\xf0:{\xd9\xef>\xd7\x86\x86b\x1b\xab\xa2\x1e\xfa\x05\x8b\x8e\xbe}\xe5\xe0\xbd\xfa}\x9b\xec\xf5\xad\xc5\x18\xfa\xbe\x9bV\x84\x08Q\xf4\xd3\xcby\x1b\xf8(\xd0\x0c\xc2H^\xa8\xcf\\\xe9w\xc9\xfe\xdbdU\xf4OC\x05c"\x91\xb8q\xca[\x8b\x98\xa5C1\xa9\xa1\xd9~\x1c\\\xb8}\xebe\x1d\xff \x83\x96k\x82\xb9\x93v\xf5\xdbh1\xcd\xd4\xb2x\x196\xc5^&:\x01\xd5\x0f\xdc\x86k\x04\xb3%\x9b\xc2y\xcd\xa0\x89MVJ\x9fv\nG\xfdA6\xed|\x82\x08/\x8eXI-\x82\xdf\x99Q;\xfd\xa4\x8b\xed\xbcg]\x82_z\x06B\rG\xc2\xf3\xa6\xe4\xa6\xb0\x8c\x8d\xd6\xef\x98\x08\x0f\x1af/{\xf9k\xec\x85/=\xdf\x1a\xe5\x1e+f\xca*i\xc7\xaahr\x03>\xad\x86\xa6Qx]\'\xb8\xd07\xca\xd2\na\x04\x91Z5F\xe0RbW\x81\x02B>\xfe\xd8\xc7\xaf\xb9f\xe7\x8e\x1d\xf6\x8d\xebo\x820\xd9H-\xe7\xd4\xeaC\x91]q\xe5Kmhd51\x8a\x9e\xdch\n\xae\x16\xbeb\xf3\xec\xf2\xa0h?\xdb\x87~\xd2\xd3\xb5n\xb7e\x0f\xdd\xff3\x98\xdd\xb0\x91\xd1U\x10>\xc6dV[\xad\xb2\n-\x1b\x05G\xb0\x9d\xa3V\xa9\xaeF\x1b\xd7\xda\x14\x0b\xa5\xd9+\xc3\xf0:i\x03\x95\xa9\xb1\xa3\x1c\xb2\xf1\x91\xb56T]c\x95\x88\xb68\xfbri\xdc\x86\x876\xdb\xa6u\xa7\xd8\xd9g\xfc\xa6\x9d\xf7\xecW\xda\xe6-gc\x01\x8fA\xc0\x08\x90\xa9I\xc54\xb1\xc1iU\xe4@\xd1b\x9d\xaeV\x10\xe4\xf9\x17\\h\xc7\x9f\x88I%|l\xb0\xb9[\x05\x0e\r\xc76<V\xb1\xea*\x84\xc5\xaa+\xb73k"E\xf5W\x8b{\xb6\xf9\xf8q{\xe9\xcb\x9e\xcb\xf8c\xce\xd7\xb0\xffa\x1c9\xd7\xdbo\xf9\xb1]\xf5G\x1f\xb7\xf6>\x96%\xceA\xcbh\xd5\x9a\xb2}\xf7\xfb[m\xdd\xfacY\x05\xc5\xd7;\x84\xde\x0e\x1c\x94\xe2/\x0by\x1b\xf5\xa3>\n5\xa3\xaf\x8c\xcdE?\xd9g\xbbv>DA\x8b(@\x1f\x84\xd0\x0f\x8ee\x9a\x04\x85\x91\x91\t\xaaX\'\x89\xec\xba/~\xd9n\xfe\xc1O\xa1.f\x89\xc7\xd6\xa87\xec\x92\xdf9\xcd\xde\xf0\xea\x8b\xadVn`fP\x97\xa8J?}\xfa+[\xb5V\x83Q\xe3DQkQ\xb0c\xe8\x0eS\xa2\xf8\xbb\xea\x06\x8a\x9eQ\xdb\xc192\x92\xb6 \t\xed\xfb\t\x1c\xa8\x94\xad\xd5Lm\xea\xd0v\xa2\x99Ik\xb7\xd0n\xf9\x04\xcc\xb3\x8e\xc3w\xed\xddo\x1f\xfc\xd0\x97m\xf7\xae\x16\xbdU\xac\x91N\xdbs\x9ew\xb2}n\xeb\x07m\xe3Z}\x93L\xe3\xe8}$Vt\x88j`\xfc;?n3{\x91GZ!.e\xf9\x10\xd5\x84\xef\xd5\x88\xf1M\xaaJ-\xf4\xd3\x1b\xc0_;\x1ep\x90\x0eZ\x11\x850\x8a\xbcRA\x91\x1f\xbc\xafI\x16\xf7\xb9\x83\x9d\xd4\xc7\x82\xca5\xd9W\x9c\x90>\x0e\xa4:}\xbd\n\xc8\x90\xaa*\x13\x08#|\xa7Hz\xf5\x9b?`\xdf\xfd\xce\x8fm\xa8\xb1\xda\xf6\xb4\xba\xb6\xba^\xb37^y\x81\xbd\xf7}\x97\xd9\xd8\xaaM\xf8\x076f\xb1\xfa\x93\x0f\xc1\xc1\x91*\xe6)Y\x83>\xb1\x1fDh\xfa\x16\x8d\x9e\xa2\x85\x177T\x96\xcf\x11\x86&\xbd\t6r\xc4\xde\x99\xe6\n\xb3\xa8\x8bk\xa1\x1e\xab\x04\x81\xb9\xee`\xf5\xe4\x0b{\x10\xf9\xc8\xc3\x0f\xd9\xd5o\xbd\xd6\xee\xbf\x7f\x9fu\xd9\'d\xed\t{\xe1\xc5\xa7\xd9g\xb6~`\x80\xf1:6\x08\xf6\x03\x80\xad\xb2\xab\xd2m<\x96>\xb0S\xec8\xbds1L\xbf\x92\xf5\t\xd08\xcb\x1fk\xa9LQ\xcfa\xa8\xf2#\xa1:T\x1d\x11\xa1\xbe\x94\x87\x024\xb2\\\xd1\xbb\x94h\x9c\xde\xa7\xccVS\xce5B\x8e\xcahI\x0cs\xa2\xfd\\3\xb6\x87\xb3P\xd3n\xa3\xd9\xb1\xb5\xf1\xa4\x95j\xc3\x9a\xb4-Gc\xb0\x85\xf0\xb07di{\x8c\xc9\xd4-\xed\xd2W\x9a?\xc4\xce\x08\xeb\xfcc\x15t\xe3\n\xa47\x85\xf5i_\xe5\x07\xe8$\x1fW\xc4t\xbd\x99\xaa\xb7\x82\xf5\xf6\xf0A\xcc\xd6\x0c>p\x12E\xd0\xe7\x02d\t\xa4\x06T\xe1\x9f\x9eN\xf5\xbb\xfa\xf6$>\xa5\xcd\xbc\xa4-\xbd\x18\x0b\xa2\xfb\xf3aV\xe5\xd40A\x03\xa3\x04I*\x16\xd5\xd7\xcc\x00}\xceD\x0e1\x8d\xd0<$\xaeO?e\x92&\xd1I\xe6e\xda\xc9\nu\xaf\xc8\x0b\x07\xef\x15\xf9\x85\xf5\xe9K\xdbl\x86\xd0\xf7&\x03\xc2\xd4YD0eP\xa9\x8e\x1b\x98\x88\xf4U(\xa87\xb4+F|h\xb6^\xd2\xd3\x93Ei\xb4\xd7Co"v\x90N>\xb3\xf6v\x8ckz\xa9Vo$\x0f\xce\xc7#-\xcc\x0e\xf3\xd45\x92\x06\xb5\x12\x88\x96"\xe2v\xad\x84y(\xbf\xc0\x00\xf9\nv!\x16\xc8\xf0\x8a\xa8\xf4\xe60\xdbI\x840\xe87D\x8cv\xf6n?r@J\n\xbd*\xfa\xec6{^6\xb9\x1e\xc6\xa9\xa7>\x03\xf5\xb1}}f\xe1Ht\xd2\x87\xc8\xb9\xf2\xa5`\xde\x87\xf7#,t\xad\xb8.\xca\x14:j\x07[\x07\xc7\xc0q\xae\x85\x1a7bU\xe2\x8f\xba\x91\xcd\xb0\xbbm\xa0\x99\xdaL%\xfd\x1e\n\x12N\x0e\x15\xc6\xa1?\xd6/Rf\xea\xfd\xfa\xd8\xd0!\xda\x1d5\x97\x11\x1c3\xfdz\xb9\x02\xdb\xe0M\xb4yJ(\x0f\xe3\xe7\xc8*L\xa8\x9fd\xba\x16m\xd0\x08\xb3\xe5\xa5t\x1cQ\xd2\xb1\x00\xf4a\xc3\xe9\x81\x1ct\xcd1^ \xd3\xc7\x8a.v\xaeoz\xe7\x9f\xda\x81=\xb8\xb5)\xbd\xb0S\xb2M\x1b\x87\xed\x8b\xff\xed\xbd\xb6~C\xd8\xe6\xca\x97Jz.W\x89u\xb9P4\x1d\xa4\xa6\xc8\xd3\xafn{\xd4$\xd0\x85\x8f9\x1f4\x15\xbd\xeew\xed\xa7\xbef7\xde\xf8o\x1eFN\xe3#\xd6\x8d\x0c\xd9\x15\xbf\xf7\x02\xbb\xf2\xca\x8b\xadZg\xf2R\xabb<\xa5\x8e\x87\xf77\x07\xdc+\xea\xfb\x1c\xa1\'\xaf\xee\x89.\x84\xba\xd0}W\xcc\x80\x12\xd4\xce\xdd\xfb\xec\xfd\x7f\xf4E{\xe8\x91)+c1\xea\xf5\xae]p\xc1\x89v\xdd_}\xc0?\xf8\x19TJ\xc0\x8a\x99=${\xfb5vp/\x9aB\x087\x8cT\xa6;S\xb6aS\xd5\xba\x93;\xad\xcc\xa6F\x9f\xb8\xb5\x04{Is\xff\xf6\xa2L\x01]h\xdc\x85\xa9`\xb1|0\x030$\x9fM\xf8\x92*y\x0f\xe3\x82\x86\x08\xf4+\x8b\xe0WdA+\xdc\xd3.V\xe3\xb9.\xa1\xdd\x98\x87\xfa\x90\x1d<\xd8\x84\x0f\xfa\xdc\xa0jh\x8d\xa2w\tNvH\xcb\x19\xbd\xd5fP\x1b\x03=\x88A\xf3Jht\x88\xd1\x05\xa2Ec\x8a6\xd1\xa1\xb1d>\x02\xf8xz\x95\x8f8=|\x1f\x1e)\x12xhgMuQA^-1+q\x9f\xcd\x12\xf5\xa0\xab\xd9\xab\xd8\xe4\xb4\x9eI\xc46Ri\xdby\x17\x1eg[\xbf\xf0![\xbf\xf6\xd8\x9c\xf1a\xfc\xa8\xe7\xe1\xe4\xadD5\x9f\xb0\xc9\xbd\xf8}\xd9>\xd6\xa5~\xdbTJ&m\xb8\xa2\x0f&C$\x9d\xf6\xd9\xbd\xf6\x99\xa8\x84\xad\xd8^\xd6VS\x16\x04\x96\x84\xbc\xcfI\xcc\xcb\x19\\\xe4\x07\xb7\xe7\xb2\xb9\xb2\xcc\xeeC@\xb7\xdby\xf3Y\xf0\x81\xf4!ih\xa1\xad>\x16\xad*\x12\xbe\xbe\xac-;\xeb\xef\'j\xfb\x08\xa3\x1b8\xe8&\xb6E\x9f\xadj\xb5\x9b6\xca\x0e\xb8\x04\xf3\xaae\x82\x06\xccPx9#\xa7\x899\xe9\xdb3\x1a\xb9\x98\x89R\x81\x8b ,q\xea\xe9\xf4\xd4\xd9\xcb\x98\xfe\xe9g\xe9\x89\xcf\x89=\x9b\xb7\xac\xc2t\x17\x14\xc4\xe9\xfbd]}E\xbb\xdb\xb7F\xd4\xb4\x0b.:\xc9\xb6~\xfe\xc30^\xbf\x82\xd1\xfc\x03\xe3K\xddI\xdc\x05\n\x12\xb3\xfbKX\xd6\xa5\x84\xad\xbb\x9c\x99\xc7\xd0Uk\'5b\xd8:\x1d\xfa\xc7A\xf2 $\x04_\xd4\\\x14\xf5\xf9o\xc5\xd6\x9e\x0e\xe6\x19\xb4@\xd5\x13\x19\x8eL0\x85p}Hy\x10}\xf7L\x05\xd5\x91m\xd6\xb7\xbf\xd4\x97l\xbcf\xaf\'A\t\xb3G\x99\xc9\x8b\xe9\xa2\r]d\x0e\xb5\nL\xc2\xd6\xe8\r\x98\x19L\x91R\x8d)\xba\x85\xe1^\xe8S\xa9\xfa\xd4\xbcf\xe7\xc6x\xfa\xc0[\x97\x08\xa8\'f\xd2\xbf\xee\xf9\xd9\x15>\xc4\x0f\xdf\\g\xf4\x99s\xe2{\xf8\xd4Nu\xd6Dl\xd8o\xdb0;\\)gJ\x99\x82\x16\x89HA\xa4D\xe8\x98\x12\x80\xdey\xeb\x8f\xec\xaa?\xfc/6qH\x93\tR\x7f\n\x8e\x00p\xcd\x17\xb20\xbf(V\xb64^\x877\xfa\xb6p\x99\x08\xad\xd9k\xa1\xf1\xe7\xd8\xe7\xd0\xf8\x8d\xeb\xe6\x7f\xb8?\xea\xb6\xb2l\xfb#\xf7\xd8\xff\xfa\xca\xb7lJG\x06\xf9\x8d\xa7\xe0\xc8\xa0\x15\x18\x98/\xdb\x1f\x98_\xfc\xca[+"c\x1fP.\xeb\xa5\xde\x8e\x9d|\xea\tv\xe9k.\xb5\xf1\xf1\xf9\x0f\xb8\xa3\xd6L\x92\xa9\xd2\xcc\xcc$\xbbA\xd9\x9f\xa74\xfe\x89\xc0\xbfq\xefJ\x0e\xaf\x82\xd3\xc9\x19\x1f\x8e\x93\xe5\xcb\xfc\x1d|\x1d!sO\xfb\x8dF#\xdf\x11\xe7\x10\xb5\x9b\x1d\xf60e\x7f\x8f\xdb\xc3\xaf\xa7\xe0\tA\x1a\x1f\xfe\xce1\xac\xf85\xb8\xe4!\xa7\xdb\xedN\x10\x96c\xef\xeb\x8a\xdbUw\x01\xe3\t\xb3\xf8O\xe1!\xc2\xf3\xad\xb2 t\x1d:^\x98_\xacLp\xa4\xba\x82\xe5\xb4[J]\xc1r\xda-\xa5\xae /\xf7\xa3\x06\xa1\xca\x15\xa2\xea\x88%D+\xfa\xbf\x9d\xa9X\x91O\xe0\'A\x83\x8e\xa5+\xa3\xa1n\x0e8\xe7$\xd3\x03\x86\xf0\xa4\xac\xe8\xec\x17\r\xbc0\xbf\xb0\xae\xe0H\xed\x96RW\xb0\x9cvK\xa9+XN;\xa2>\xe7\x95@\x1a-\xc8\x19/\xdb\x82\xf6\x8b\xf1\xf3\xfb\xd1\x11D\xd1\x8f3\xde\xff\xd7,\x80\n\xe7n<\x05G\x0213h\xf2\x1c\xcf@i\xbc3\x1bX,B)\xee\xe5\x903^\xbbBI\xee)\xc6/\x17\xc4\xd7\x82\xdf\x0bx\xbc(<\xc5\xe9\xa3\x04\x83J\xae\xfcB\\\x089\xe3\xc3\xa1\xbe`PZ\x8b\xe5\x9f\xe8\xbe`0_\xc0R\xda-\xa5\xee ,\xa5\xddR\xea\x0e\x82\xcaf\x11\x8e.\x9a\x1f\xc0\xc5\xc1\xec\xff\x03\xc4I0\x9eev\xf5\x17\x00\x00\x00\x00IEND\xaeB`\x82'
+import numpy as np
+from instrumentation import profiler
+from stallwatch import watchdog
+from livewire import CostMap, LiveWire
+from imagebridge import COLOR_FORMATS, image_array
+from raster import Contrast, RasterItem, read_raster
+from history import Command, History
+from shapeitem import Shape, ShapeStyle, detailTolerance, toPolygonF
+from memory import MemoryAccountant
+from annotationcore import (DEFAULT_COLOR, Annotation, SegmentIndex, ShapeStore, StrokeSimplifier, as_points,
+                            flood_fill, pack, points_in_polygon, read_json, simplify, trace_contours,
+                            write_csv, write_json)
+
+#Application icon, decoded by Qt only when the window first needs it
+ICONPATH=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'icon.png')
 
 
 class LineWidthDialog(QDialog):
@@ -69,7 +121,7 @@ class LineWidthDialog(QDialog):
  
         self.slider.setMinimum(0)
         self.slider.setMaximum(10)
-        self.slider.setValue(self.lwidth)
+        self.slider.setValue(int(round(self.lwidth)))
         self.form.addWidget(self.slider, 1, 0)
         self.buttonBox=QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel, Qt.Horizontal)
 
@@ -82,8 +134,12 @@ class LineWidthDialog(QDialog):
         self.size = self.slider.value()
         if self.size != self.lwidth:
             self.scene.point_size=self.size
-            for shape in self.allshapes:
-                shape.point_size=self.size
+            styles={shape.style for shape in self.allshapes}
+            styles.update(labelclass.style for labelclass in self.scene.labelclasses)
+            [shape.prepareGeometryChange() for shape in self.allshapes] #the bounding rects include the width
+            for style in styles:
+                style.setStyle(width=self.size)
+            self.scene.update()
         
 class EpsilonSliderDialog(QDialog):
     '''A window with a slider to set attraction epsilon, i.e. pull the cursor
@@ -122,6 +178,95 @@ class EpsilonSliderDialog(QDialog):
         
 
 
+class ContrastDialog(QDialog):
+    '''A window with sliders for the lower and upper percentiles of the
+    contrast stretch and, for multi-band images, the bands shown as red,
+    green and blue. The image is redrawn while the sliders move; Cancel
+    restores the previous mapping
+    '''
+    def __init__(self, raster=None, parent=None):
+        super(ContrastDialog, self).__init__(parent)
+        self.setWindowTitle("Contrast editor")
+        self.raster=raster
+        contrast=raster.contrast
+        self.previous=(list(contrast.bands), contrast.lower, contrast.upper, list(contrast.windows))
+
+        self.form=QGridLayout(self)
+        self.sliders=[]
+        for row, (name, value) in enumerate([('Lower percentile', contrast.lower), ('Upper percentile', contrast.upper)]):
+            slider=QSlider(Qt.Horizontal)
+            slider.setMinimum(0)
+            slider.setMaximum(1000) #tenths of a percent
+            slider.setValue(int(round(10*value)))
+            slider.valueChanged.connect(self.stretch)
+            self.form.addWidget(QLabel(name), row, 0)
+            self.form.addWidget(slider, row, 1)
+            self.sliders.append(slider)
+        self.valueLabel=QLabel()
+        self.form.addWidget(self.valueLabel, 2, 1)
+
+        self.bandBoxes=[]
+        if contrast.nbands > 1:
+            channels=['Red', 'Green', 'Blue'] if len(contrast.bands) == 3 else ['Gray']
+            for i, channel in enumerate(channels):
+                box=QComboBox(self)
+                [box.addItem('Band {}'.format(band+1)) for band in range(contrast.nbands)]
+                box.setCurrentIndex(contrast.bands[i])
+                box.currentIndexChanged.connect(self.setBands)
+                self.form.addWidget(QLabel(channel), 3+i, 0)
+                self.form.addWidget(box, 3+i, 1)
+                self.bandBoxes.append(box)
+
+        autobutton=QPushButton('Auto (2-98%)', self)
+        autobutton.clicked.connect(lambda: self.setPercentiles(2.0, 98.0))
+        fullbutton=QPushButton('Full range', self)
+        fullbutton.clicked.connect(lambda: self.setPercentiles(0.0, 100.0))
+        self.form.addWidget(autobutton, 6, 0)
+        self.form.addWidget(fullbutton, 6, 1)
+
+        self.buttonBox=QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel, Qt.Horizontal)
+        self.form.addWidget(self.buttonBox, 7, 0, 1, 2)
+        self.buttonBox.accepted.connect(self.accept)
+        self.buttonBox.rejected.connect(self.reject)
+        self.rejected.connect(self.restore)
+        self.showWindow()
+
+    def percentiles(self):
+        lower, upper = (slider.value()/10.0 for slider in self.sliders)
+        return min(lower, upper), max(lower, upper)
+
+    def setPercentiles(self, lower, upper):
+        for slider, value in zip(self.sliders, (lower, upper)):
+            slider.blockSignals(True)
+            slider.setValue(int(round(10*value)))
+            slider.blockSignals(False)
+        self.stretch()
+
+    def stretch(self, *args):
+        self.raster.contrast.stretch(*self.percentiles())
+        self.raster.refresh()
+        self.showWindow()
+
+    def setBands(self, *args):
+        contrast=self.raster.contrast
+        contrast.lower, contrast.upper = self.percentiles()
+        contrast.setBands([box.currentIndex() for box in self.bandBoxes])
+        self.raster.refresh()
+        self.showWindow()
+
+    def showWindow(self):
+        lower, upper = self.percentiles()
+        windows=', '.join('{:g}-{:g}'.format(low, high) for low, high in self.raster.contrast.windows)
+        self.valueLabel.setText('{:.1f}-{:.1f}%: {}'.format(lower, upper, windows))
+
+    def restore(self):
+        contrast=self.raster.contrast
+        bands, contrast.lower, contrast.upper, windows = self.previous
+        contrast.bands=bands
+        contrast.setWindow(windows)
+        self.raster.refresh()
+
+
 class PropertiesWindow(QDialog):
     '''A window that pops up on right click (see mousepressevent in qscene).
     Lets the user reassign an annotated ("closed") shape to a different label class.
@@ -129,7 +274,8 @@ class PropertiesWindow(QDialog):
     def __init__(self, shape=None, all_labels=[None], scene=None, parent=None):
         super(PropertiesWindow, self).__init__(parent)
         self.shape=shape
-        self.points = self.shape.points
+        self.scene=scene
+        self.points = self.shape.coords
         self.objtype=self.shape.objtype
         self.label=self.shape.label
         self.all_labels=all_labels
@@ -193,11 +339,8 @@ class PropertiesWindow(QDialog):
         self.shape.editable=self.editable_status
         oldlabel=self.shape.label
         newlabel=self.qbox.currentText()
-        if oldlabel != newlabel:
-            if oldlabel in self.label_names:
-                self.all_labels[self.label_names.index(oldlabel)].untieShape(self.shape)
-                newlabelclass=self.all_labels[self.label_names.index(newlabel)]
-                newlabelclass.assignObject(self.shape)
+        if oldlabel != newlabel and self.shape.labelclass is not None:
+            self.scene.relabelShapes([self.shape], self.all_labels[self.label_names.index(newlabel)])
         return
 
     
@@ -356,20 +499,44 @@ def distance(delta):
 
 class LabelClass(object):
     '''Class to keep record of a label class characteristics with a method to
-    assign shapes to it
+    assign shapes to it. Shapes point back to their class (shape.labelclass)
+    and polygons is an insertion-ordered dict used as a set, so membership
+    changes are O(1)
     '''
     def __init__(self):
-        self.polygons = []
-        self.fillColor=None
+        self.polygons = {}
+        self.style=ShapeStyle()
         self.name=None
 
+    def __len__(self):
+        return len(self.polygons)
+
+    @property
+    def fillColor(self):
+        return self.style.color
+
+    @fillColor.setter
+    def fillColor(self, color):
+        self.style.setStyle(color=color)
+
     def assignObject(self, obj):
-        self.polygons.append(obj)
-        obj.line_color=self.fillColor
+        if obj.labelclass is not None and obj.labelclass is not self:
+            obj.labelclass.untieShape(obj)
+        self.polygons[obj]=None
+        obj.labelclass=self
+        obj.style=self.style
         obj.label=self.name
         
     def untieShape(self, obj):
-        self.polygons.pop(self.polygons.index(obj))
+        self.polygons.pop(obj, None)
+        if obj.labelclass is self:
+            obj.labelclass=None
+
+    def refresh(self):
+        '''Push the current name to every shape of the class (colors and
+        widths are shared through the style)'''
+        for obj in self.polygons:
+            obj.label=self.name
 
 
 class Annotationscene(object):
@@ -385,176 +552,594 @@ class Annotationscene(object):
         self.object_types=None
         self.labels=None
         self.savebytes=False
-    
-    def shapes_to_pandas(self):
-        imsize, objects, types, labels = self.imsizes, self.shapes, self.object_types, self.labels
-        df=pd.DataFrame(columns=['width', 'height', 'Object', 'X', 'Y'])
-        for i, obj in enumerate(objects):
-            X, Y=list(zip(*obj))
-            df=df.append(pd.DataFrame({'width': imsize[0], 'height': imsize[1], 'Object': i+1, 'Type': types[i], 'Label': labels[i], 'X': X, 'Y': Y}), ignore_index=True)
-        return df
+        self.simplifyTolerance=None #Douglas-Peucker tolerance (pixels) applied to the saved objects
+
+    def toAnnotation(self):
+        objects=[poly if isinstance(poly, np.ndarray) else poly.coords for poly in self.polygons]
+        return Annotation(objects=objects, types=self.object_types, labels=self.labels, colors=self.lineColor,
+                          imsize=self.imsizes, imagePath=self.imagePath, imageData=self.imageData)
 
     def save(self):
+        annotation=self.toAnnotation()
+        if self.simplifyTolerance:
+            annotation.objects=simplify(annotation.objects, self.simplifyTolerance,
+                                        [objtype=='Polygon' for objtype in annotation.types])
+        write_csv(annotation, re.search(re.compile('(.+?)(\.[^.]*$|$)'), self.filename).group(1)+'.csv')
+        try:
+            write_json(annotation, self.filename, savebytes=self.savebytes)
+        except OSError:
+            pass
 
-        self.shapes=[[(point.x(), point.y()) for point in poly] for poly in self.polygons]
-        self.shapes_to_pandas().to_csv(re.search(re.compile('(.+?)(\.[^.]*$|$)'), self.filename).group(1)+'.csv', sep=',')
-        if self.savebytes:
-            self.imData = b64encode(self.imageData).decode('utf-8')
-        
-            try:
-                with open(self.filename, 'w') as f:
-    
-                    json.dump({
-                        'objects': self.shapes,
-                        'type': self.object_types,
-                        'label': self.labels,
-                        'width/height': self.imsizes,
-                        'lineColor': self.lineColor,
-                        'imagePath': self.imagePath,
-                        'imageData': self.imData},
-                        f, ensure_ascii=True, indent=2)
-            except:
-                pass
-        else:
-            try:
-                with open(self.filename, 'w') as f: 
-                        json.dump({
-                            'objects': self.shapes,
-                            'type': self.object_types,
-                            'label': self.labels,
-                            'width/height': self.imsizes,
-                            'lineColor': self.lineColor,
-                            'imagePath': self.imagePath},
-                            f, ensure_ascii=True, indent=2)
-            except:
-                pass
 
- 
+def pixmapBytes(pixmap):
+    '''Memory of a QPixmap's pixels'''
+    return pixmap.width()*pixmap.height()*pixmap.depth()//8
 
-class Shape(QGraphicsItem):
-    '''The main class controlling shape's points, its color, highlight behavior
+
+def processStart():
+    '''perf_counter time the process (interpreter) started and what it was
+    measured from: /proc on Linux (10 ms resolution), otherwise the import of
+    this module, which misses the interpreter startup'''
+    try:
+        with open('/proc/self/stat') as f:
+            ticks=float(f.read().rsplit(')', 1)[1].split()[19]) #field 22, starttime
+        with open('/proc/uptime') as f:
+            uptime=float(f.read().split()[0])
+        return time.perf_counter() - (uptime - ticks/os.sysconf('SC_CLK_TCK')), 'process start'
+    except (OSError, ValueError, IndexError, AttributeError):
+        return IMPORTTIME, 'module import'
+
+
+class Stroke(QGraphicsItem):
+    '''Freehand stroke being drawn, in scene coordinates. Its vertices are
+    kept in paths of up to chunk segments: a new vertex extends only the last
+    path and paint strokes only the paths crossing the exposed area, so long
+    strokes cost the same per mouse move as short ones. The segment from the
+    last vertex to the cursor is drawn separately
     '''
-    line_color = QColor(0, 6, 255)
-    select_line_color = QColor(255, 255, 255)
-    vertex_fill_color = QColor(0, 255, 0, 255)
-    hvertex_fill_color = QColor(255, 0, 0)
-    point_size = 1.5
-    hsize = 3.0
-
-    def __init__(self, line_color=None, point_size=None, parent=None):
-        super(Shape, self).__init__(parent)
-        self.points = []
-        self.selected = False
-        self.painter = QPainter()
-        self.hIndex = None
-        self.setFlag(QGraphicsItem.ItemIsSelectable, True)
-        self.setFlag(QGraphicsItem.ItemIsMovable, True)
-        self.closed = False
-        self.points_adjusted=None
-        self.objtype=None
-        self.label=None
-        self.editable=False
-        
-        if line_color is not None:
-            self.line_color = line_color
+    chunk = 64
+
+    def __init__(self, pos, pen, parent=None):
+        super(Stroke, self).__init__(parent)
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption, True)
+        self.pen = pen
+        self.margin = pen.widthF() + 1
+        self.paths = [QPainterPath(pos)]
+        self.sizes = [0]
+        self.last = self.tail = pos
+        self.box = [pos.x(), pos.y(), pos.x(), pos.y()]
+
+    def extend(self, vertex, tail):
+        '''Append vertex (if not None) and move the free end to tail,
+        repainting only the area of the segments that changed'''
+        dirty = QPolygonF([self.last, self.tail, tail]).boundingRect()
+        if vertex is not None:
+            self.paths[-1].lineTo(vertex)
+            self.sizes[-1] += 1
+            if self.sizes[-1] == self.chunk:
+                self.paths.append(QPainterPath(vertex))
+                self.sizes.append(0)
+            self.last = vertex
+        self.tail = tail
+        self.grow(tail)
+        m = self.margin
+        self.update(dirty.adjusted(-m, -m, m, m))
+
+    def grow(self, p):
+        '''Enlarge the bounding box to contain p, with slack so that the scene
+        index is updated only every so often'''
+        x0, y0, x1, y1 = self.box
+        x, y = p.x(), p.y()
+        if x0 <= x <= x1 and y0 <= y <= y1:
+            return
+        self.prepareGeometryChange()
+        slack = max(x1-x0, y1-y0)/4
+        self.box = [min(x0, x-slack), min(y0, y-slack), max(x1, x+slack), max(y1, y+slack)]
 
-        if point_size is not None:
-            self.point_size = point_size
+    def boundingRect(self):
+        x0, y0, x1, y1 = self.box
+        m = self.margin
+        return QRectF(x0-m, y0-m, x1-x0+2*m, y1-y0+2*m)
 
-    def addPoint(self, point):
-        self.setSelected(True)
-        if self.points and point == self.points[0]:
-            self.closed = True
-        else:
-            self.points.append(point)
+    def paint(self, painter, option, widget):
+        painter.setPen(self.pen)
+        exposed = option.exposedRect
+        for path in self.paths:
+            if path.controlPointRect().adjusted(-self.margin, -self.margin, self.margin, self.margin).intersects(exposed):
+                painter.drawPath(path)
+        painter.drawLine(self.last, self.tail)
 
-    def popPoint(self):
-        if self.points:
-            return self.points.pop()
-        return None
 
-    def paint(self, painter, option, widget):
+CURSOR_DEFAULT = Qt.ArrowCursor
+CURSOR_POINT   = Qt.PointingHandCursor
+CURSOR_DRAW    = Qt.CrossCursor
+CURSOR_MOVE    = Qt.ClosedHandCursor
+CURSOR_GRAB    = Qt.OpenHandCursor
+
+class StoreOverview(QGraphicsItem):
+    '''Read-only drawing of the objects of a ShapeStore, used by the virtualized
+    scene when too many objects are in view to materialize them as Shapes
+    '''
+    def __init__(self, store, parent=None):
+        super(StoreOverview, self).__init__(parent)
+        self.store=store
+        self.rect=QRectF()
+        self.simplified={} #store index -> (tolerance, bbox, simplified vertices)
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption, True)
+
+    def refreshBounds(self):
+        self.prepareGeometryChange()
+        bbox=self.store.bbox[self.store.live()]
+        bbox=bbox[np.isfinite(bbox).all(axis=1)]
+        self.rect=QRectF()
+        if len(bbox):
+            x0, y0 = bbox[:, :2].min(axis=0)
+            x1, y1 = bbox[:, 2:].max(axis=0)
+            self.rect=QRectF(x0, y0, x1-x0, y1-y0).adjusted(-2, -2, 2, 2)
 
-        if self.points:
-            self.prepareGeometryChange()
-            color = self.select_line_color if self.selected else self.line_color
-            pen = QPen(color)
-            pen.setWidth(self.point_size/2)
-            painter.setPen(pen)
-            path=self.shape()
-            if self.closed == True:
-                path.closeSubpath()
-            painter.drawPath(path)
-            vertex_path=QPainterPath()
-            self.drawVertex(vertex_path, 0)
-            [self.drawVertex(vertex_path, i) for i in range(len(self.points))]
-            painter.drawPath(vertex_path)
-            painter.fillPath(vertex_path, self.vertex_fill_color)
-
-
-    def drawVertex(self, path, index):
-        psize = self.point_size
-        if index == self.hIndex:
-            psize = self.hsize
-        if self.hIndex is not None:
-            self.vertex_fill_color = self.hvertex_fill_color
+    def boundingRect(self):
+        return self.rect
+
+    def outlines(self, ids, tolerance):
+        '''Vertices of the objects ids simplified to tolerance; objects not
+        cached (or changed since) are simplified together in one call'''
+        store, cache = self.store, self.simplified
+        stale=[i for i in ids if i not in cache or cache[i][0] != tolerance
+               or not np.array_equal(cache[i][1], store.bbox[i])]
+        if stale:
+            result=simplify([store.objects[i] for i in stale], tolerance,
+                            [store.types[i]=='Polygon' for i in stale])
+            for i, coords in zip(stale, result):
+                cache[i]=(tolerance, store.bbox[i].copy(), coords)
+        return [cache[i][2] for i in ids]
+
+    def paint(self, painter, option, widget):
+        r=option.exposedRect
+        store=self.store
+        ids=store.query((r.left(), r.top(), r.right(), r.bottom())).tolist()
+        if Shape.renderTolerance:
+            lod=option.levelOfDetailFromTransform(painter.worldTransform())
+            outlines=self.outlines(ids, detailTolerance(lod, Shape.renderTolerance))
         else:
-            self.vertex_fill_color = Shape.vertex_fill_color
-        path.addEllipse(self.mapFromScene(self.points[index]), psize, psize)
- 
+            outlines=[store.objects[i] for i in ids]
+        for i, coords in zip(ids, outlines):
+            label=store.labels[i]
+            painter.setPen((label.style if label is not None else Shape.style).pen)
+            if store.types[i]=='Polygon':
+                painter.drawPolygon(toPolygonF(coords))
+            else:
+                painter.drawPolyline(toPolygonF(coords))
 
-    def shape(self):
-        path = QPainterPath()
-        polygon=self.mapFromScene(QPolygonF(self.points))
-        path.addPolygon(polygon)
-        return path
 
-    def boundingRect(self):
-        return self.shape().boundingRect()
+class VirtualLayer(object):
+    '''Virtualized scene contents: every finished object lives in a ShapeStore
+    and Shape items exist only for objects intersecting the viewport plus a
+    margin. Shapes leaving the view write their edits back to the store and are
+    recycled for the objects coming into view, so the number of items depends
+    on what is visible rather than on the size of the label file
+    '''
+    margin = 0.5 #fraction of the view size added on every side
+    limit = 5000 #above this many objects in view, draw them with a StoreOverview
 
-    def moveBy(self, tomove, delta):
-        if tomove=='all':
-            tomove=slice(0,len(self.points))
+    def __init__(self, scene, store):
+        self.scene=scene
+        self.store=store
+        self.shapes={} #store index -> materialized Shape
+        self.pool=[]
+        self.overview=StoreOverview(store)
+        self.overview.setVisible(False)
+        scene.addItem(self.overview)
+
+    def materialize(self, i):
+        shape=self.pool.pop() if self.pool else Shape()
+        shape.setPos(0, 0)
+        shape.setPoints(self.store.objects[i])
+        shape.objtype=self.store.types[i]
+        shape.closed=shape.objtype=='Polygon'
+        shape.selected=False
+        shape.marked=False
+        shape.editable=False
+        shape.hIndex=None
+        shape.storeIndex=i
+        label=self.store.labels[i]
+        if label is not None:
+            label.assignObject(shape)
+        self.shapes[i]=shape
+        self.scene.polys[shape]=None
+        self.scene.addItem(shape)
+
+    def release(self, i):
+        shape=self.shapes.pop(i)
+        self.writeBack(shape)
+        self.scene.polys.pop(shape, None)
+        if shape.labelclass is not None:
+            shape.labelclass.untieShape(shape)
+        self.scene.removeItem(shape)
+        shape.storeIndex=None
+        if len(self.pool) < self.limit:
+            self.pool.append(shape)
+
+    def writeBack(self, shape):
+        self.store.update(shape.storeIndex, shape.coords, shape.objtype, shape.labelclass)
+
+    def flush(self):
+        '''Write the state of every materialized shape to the store'''
+        for shape in self.shapes.values():
+            self.writeBack(shape)
+
+    def add(self, shape):
+        '''Register a finished shape (new, copied or re-finished after editing)'''
+        if shape.storeIndex is None:
+            shape.storeIndex=self.store.append(shape.coords, shape.objtype, shape.labelclass)
+            self.shapes[shape.storeIndex]=shape
         else:
-            tomove=slice(tomove,tomove+1)
-        self.points[tomove] = [point + delta for point in self.points[tomove]]
+            self.writeBack(shape)
+
+    def remove(self, shape):
+        if shape.storeIndex is not None:
+            self.store.remove(shape.storeIndex)
+            self.shapes.pop(shape.storeIndex, None)
+            shape.storeIndex=None
+
+    def releaseAll(self):
+        self.scene.history.rebind({shape: i for i, shape in self.shapes.items()})
+        [self.release(i) for i in list(self.shapes)]
+
+    def resolve(self, refs):
+        '''Materialize the objects among refs given by store id (the shapes
+        they stood for were recycled) and let the history refer to the shapes'''
+        ids=[i for i in refs if not isinstance(i, Shape)]
+        [self.materialize(i) for i in ids if i not in self.shapes]
+        self.scene.history.rebind({i: self.shapes[i] for i in ids})
+
+    def sync(self, refs):
+        '''Write the materialized shapes among refs back to the store'''
+        for shape in refs:
+            if isinstance(shape, Shape) and shape.storeIndex is not None:
+                self.writeBack(shape)
+
+    def update(self, rect):
+        '''Materialize the objects intersecting rect (plus the margin) and recycle
+        the others, except the shapes being drawn, edited or selected'''
+        dx, dy = self.margin*rect.width(), self.margin*rect.height()
+        wanted=set(self.store.query((rect.left()-dx, rect.top()-dy, rect.right()+dx, rect.bottom()+dy)).tolist())
+        busy=set(self.scene.selection)
+        busy.update((self.scene.QGitem, self.scene.selectedShape))
+        overview=len(wanted) > self.limit
+        if overview:
+            wanted=set()
+        if overview != self.overview.isVisible():
+            self.flush()
+            self.overview.refreshBounds()
+            self.overview.setVisible(overview)
+        released=[self.shapes[i] for i in self.shapes if i not in wanted and self.shapes[i] not in busy]
+        #the history refers to recycled shapes by their store ids
+        self.scene.history.rebind({shape: shape.storeIndex for shape in released})
+        [self.release(shape.storeIndex) for shape in released]
+        [self.materialize(i) for i in wanted if i not in self.shapes]
+
+    def counts(self):
+        '''Number of stored objects per label'''
+        self.flush()
+        result={}
+        for i in self.store.live():
+            label=self.store.labels[i]
+            result[label]=result.get(label, 0)+1
+        return result
+
+
+SHAPE_NBYTES=1024 #rough memory of a Shape item besides its vertices, for the undo budget
+
+
+class MoveVertex(Command):
+    '''A vertex moved by (dx, dy); steps of the same drag merge'''
+    def __init__(self, scene, shape, index, delta, drag):
+        self.scene, self.shape, self.index, self.drag = scene, shape, index, drag
+        self.delta=(delta.x(), delta.y())
+
+    def apply(self, sign):
+        self.shape.moveBy(self.index, QPointF(sign*self.delta[0], sign*self.delta[1]))
+        self.scene.refresh(self.shape)
+
+    def undo(self):
+        self.apply(-1)
+
+    def redo(self):
+        self.apply(1)
+
+    def mergeWith(self, other):
+        if (type(other) is MoveVertex and other.shape is self.shape and other.index == self.index
+                and other.drag == self.drag):
+            self.delta=(self.delta[0]+other.delta[0], self.delta[1]+other.delta[1])
+            return True
+        return False
 
-    def highlightVertex(self, index):
-        self.hIndex = index
+    def refs(self):
+        return (self.shape,)
 
-    def highlightClear(self):
-        self.hIndex = None
-        self.selected = False
+    def rebind(self, mapping):
+        self.shape=mapping.get(self.shape, self.shape)
 
-    def __len__(self):
-        return len(self.points)
 
-    def __getitem__(self, index):
-        return self.points[index]
+class MoveShapes(Command):
+    '''Shapes translated by (dx, dy); steps of the same drag merge'''
+    def __init__(self, scene, shapes, delta, drag):
+        self.scene, self.shapes, self.drag = scene, tuple(shapes), drag
+        self.delta=(delta.x(), delta.y())
 
-    def __setitem__(self, index, value):
-        self.points[index] = value
+    def apply(self, sign):
+        for shape in self.shapes:
+            shape.translateBy(sign*self.delta[0], sign*self.delta[1])
+        self.scene.refresh(*self.shapes)
 
+    def undo(self):
+        self.apply(-1)
+
+    def redo(self):
+        self.apply(1)
+
+    def nbytes(self):
+        return self.overhead + 8*len(self.shapes)
+
+    def mergeWith(self, other):
+        if type(other) is MoveShapes and other.shapes == self.shapes and other.drag == self.drag:
+            self.delta=(self.delta[0]+other.delta[0], self.delta[1]+other.delta[1])
+            return True
+        return False
+
+    def refs(self):
+        return self.shapes
+
+    def rebind(self, mapping):
+        self.shapes=tuple(mapping.get(shape, shape) for shape in self.shapes)
+
+
+class AddShapes(Command):
+    '''Shapes added to the scene (drawn, copied); RemoveShapes is its inverse'''
+    def __init__(self, scene, shapes):
+        self.scene, self.shapes = scene, tuple(shapes)
+        self.labelclasses=[shape.labelclass for shape in self.shapes]
+
+    def undo(self):
+        self.scene.discardShapes(self.shapes)
+
+    def redo(self):
+        self.scene.insertShapes(self.shapes, self.labelclasses)
+
+    def nbytes(self):
+        return self.overhead + sum(SHAPE_NBYTES + shape.coords.nbytes for shape in self.shapes)
+
+    def refs(self):
+        return self.shapes
+
+    def rebind(self, mapping):
+        self.shapes=tuple(mapping.get(shape, shape) for shape in self.shapes)
+
+
+class RemoveShapes(AddShapes):
+    def undo(self):
+        AddShapes.redo(self)
+
+    def redo(self):
+        AddShapes.undo(self)
+
+
+class SetGeometry(Command):
+    '''Vertices, type, closure and label of a shape replaced (editing a
+    finished shape). States are Shape.state() tuples'''
+    def __init__(self, scene, shape, before, after):
+        self.scene, self.shape, self.before, self.after = scene, shape, before, after
+
+    def apply(self, state):
+        self.shape.setState(state)
+        self.scene.refresh(self.shape)
+        self.scene.shapesChanged.emit()
+
+    def undo(self):
+        self.apply(self.before)
+
+    def redo(self):
+        self.apply(self.after)
+
+    def nbytes(self):
+        return self.overhead + self.before[0].nbytes + self.after[0].nbytes
+
+    def refs(self):
+        return (self.shape,)
+
+    def rebind(self, mapping):
+        self.shape=mapping.get(self.shape, self.shape)
+
+
+class Relabel(Command):
+    '''Shapes moved to another label class'''
+    def __init__(self, scene, shapes, before, after):
+        self.scene, self.shapes, self.before, self.after = scene, tuple(shapes), before, after
+
+    def apply(self, labelclasses):
+        for shape, labelclass in zip(self.shapes, labelclasses):
+            if labelclass is not None:
+                labelclass.assignObject(shape)
+        self.scene.refresh(*self.shapes)
+        self.scene.shapesChanged.emit()
+
+    def undo(self):
+        self.apply(self.before)
+
+    def redo(self):
+        self.apply([self.after]*len(self.shapes))
+
+    def nbytes(self):
+        return self.overhead + 16*len(self.shapes)
+
+    def refs(self):
+        return self.shapes
+
+    def rebind(self, mapping):
+        self.shapes=tuple(mapping.get(shape, shape) for shape in self.shapes)
+
+
+class ChangeType(Command):
+    '''Object type (and closure) of shapes changed'''
+    def __init__(self, scene, shapes, before, after):
+        self.scene, self.shapes, self.before, self.after = scene, tuple(shapes), before, after
+
+    def apply(self, objtypes):
+        for shape, objtype in zip(self.shapes, objtypes):
+            shape.objtype=objtype
+            shape.closed=objtype=='Polygon'
+        self.scene.refresh(*self.shapes)
+        self.scene.shapesChanged.emit()
+
+    def undo(self):
+        self.apply(self.before)
+
+    def redo(self):
+        self.apply([self.after]*len(self.shapes))
+
+    def nbytes(self):
+        return self.overhead + 16*len(self.shapes)
+
+    def refs(self):
+        return self.shapes
+
+    def rebind(self, mapping):
+        self.shapes=tuple(mapping.get(shape, shape) for shape in self.shapes)
+
+
+class SetVertices(Command):
+    '''Vertices of shapes replaced (simplification)'''
+    def __init__(self, scene, shapes, before, after):
+        self.scene, self.shapes, self.before, self.after = scene, tuple(shapes), before, after
+
+    def apply(self, coords):
+        for shape, points in zip(self.shapes, coords):
+            shape.setPoints(points.copy())
+        self.scene.refresh(*self.shapes)
+
+    def undo(self):
+        self.apply(self.before)
+
+    def redo(self):
+        self.apply(self.after)
+
+    def nbytes(self):
+        return self.overhead + sum(points.nbytes for points in self.before) + sum(points.nbytes for points in self.after)
+
+    def refs(self):
+        return self.shapes
+
+    def rebind(self, mapping):
+        self.shapes=tuple(mapping.get(shape, shape) for shape in self.shapes)
+
+
+class StoreVertices(Command):
+    '''Vertices of objects of a virtualized scene replaced (simplification).
+    The objects are store ids, or shapes once the history has rebound them;
+    materialized shapes follow the store'''
+    def __init__(self, scene, ids, before, after):
+        self.scene, self.ids, self.before, self.after = scene, tuple(ids), before, after
+
+    def apply(self, coords):
+        layer=self.scene.virtual
+        for i, points in zip(self.ids, coords):
+            if isinstance(i, Shape):
+                i.setPoints(points.copy())
+                if layer is not None and i.storeIndex is not None:
+                    layer.writeBack(i)
+                continue
+            layer.store.update(i, points.copy())
+            if i in layer.shapes:
+                layer.shapes[i].setPoints(points.copy())
+        if layer is not None:
+            layer.overview.update()
+        self.scene.update()
+
+    def undo(self):
+        self.apply(self.before)
+
+    def redo(self):
+        self.apply(self.after)
+
+    def nbytes(self):
+        return self.overhead + sum(points.nbytes for points in self.before) + sum(points.nbytes for points in self.after)
+
+    def rebind(self, mapping):
+        self.ids=tuple(mapping.get(i, i) for i in self.ids)
+
+
+#fewest vertices each object type needs
+MIN_VERTICES={'Polygon': 3, 'Line': 2, 'Point': 1}
 
-CURSOR_DEFAULT = Qt.ArrowCursor
-CURSOR_POINT   = Qt.PointingHandCursor
-CURSOR_DRAW    = Qt.CrossCursor
-CURSOR_MOVE    = Qt.ClosedHandCursor
-CURSOR_GRAB    = Qt.OpenHandCursor
 
 class SubQGraphicsScene(QGraphicsScene):
     '''Overwrite QGraphicsScene to prescribe actions to mouse events, 
     collect annotated shapes and label classes, tracks which mode the program is in
-    at any moment (drawing, navigating, moving)
+    at any moment (drawing, navigating, moving, selecting, freehand drawing, livewire)
     '''
-    NAVIGATION, DRAWING, MOVING = 0, 1, 2
+    NAVIGATION, DRAWING, MOVING, SELECTING, FREEHAND, LIVEWIRE = 0, 1, 2, 3, 4, 5
     POLYDRAWING, POLYREADY = 0, 1
     epsilon=30.0
+    preciseUpdates=True #repaint only the shapes that changed instead of the whole scene
+    coalesceHover=True #process hover at most once per frame (drags stay exact)
+    historyLimit=64*2**20 #memory budget (bytes) of the undo/redo history
+    SNAP_NONE, SNAP_VERTEX, SNAP_EDGE = 0, 1, 2
+    snapRebuild=256 #rebuild the snapping index once this many shapes changed
+    freehandTolerance=1.0 #screen pixels a freehand stroke may deviate from its simplified outline
+    freehandSpacing=2.0 #screen pixels between freehand samples, closer ones are dropped
+    wandTolerance=24 #largest per-channel difference (display levels) from the clicked pixel in a magic wand region
+    wandLimit=1024 #largest window (pixels) searched by the magic wand
+    wandSimplify=1.0 #Douglas-Peucker tolerance (pixels) of magic wand outlines
+    wireRadius=160 #pixels around the last vertex searched by the livewire
+    wireBudget=0.02 #seconds of livewire search per mouse move or idle slice
+    wireSimplify=0.5 #Douglas-Peucker tolerance (pixels) of livewire segments
+    shapesChanged=pyqtSignal()
+    message=pyqtSignal(str) #short feedback for the status bar
     def __init__(self, parent=None):
         super(SubQGraphicsScene, self).__init__(parent)
         self.mode=self.NAVIGATION
         self.QGitem=None
-        self.polys=[]
+        self.polys={} #finished shapes, insertion-ordered dict used as a set
+        self.virtual=None #VirtualLayer when only visible shapes are materialized
+        self.highlighted={} #shapes selected or with a highlighted vertex, used as a set
+        self.unhighlighted={} #shapes cleared since the last refresh(), still to be repainted
+        self.selection={} #marked shapes of the selection mode, used as an ordered set
+        self.band=None #rubber band/lasso item while dragging out a selection
+        self.bandPoints=None
+        self.lassoing=False
+        self.dragShapes=None #selected shapes being dragged
+        self.stroke=None #Stroke item while a freehand shape is drawn
+        self.strokeSimplifier=None
+        self.image=None #decoded QImage of the photo, in one of the imagebridge COLOR_FORMATS
+        self.pixels=None
+        self.valueScale=1.0 #pixel values per display level, above 1 for 16-bit images
+        self.imageSource=None #returns the photo again after releaseImage
+        #livewire: edge costs of the photo (cached per tile), the search from the
+        #last vertex, the proposed segment and the cursor it was proposed for
+        self.wireCost=None
+        self.wire=None
+        self.wireItem=None
+        self.wirePos=None
+        self.wireTimer=QTimer(self)
+        self.wireTimer.setSingleShot(True)
+        self.wireTimer.timeout.connect(self.continueWire)
+        #snapping to finished shapes: a SegmentIndex of their outlines built on
+        #demand, plus the shapes added or changed since (tested directly)
+        self.snapMode=self.SNAP_NONE
+        self.snapIndex=None
+        self.snapIds={} #shape -> owner id in snapIndex
+        self.snapSkip=None #owners whose indexed outline is out of date
+        self.snapDirty={}
+        self.history=History(self.historyLimit)
+        self.dragId=0 #incremented on every press, undo steps of one drag merge
+        self.editOrigin=None #(shape, (coords, type, closed)) of a finished shape being edited
+        #hover highlighting runs once per display frame for the latest cursor position
+        self.pendingHover=None
+        self.hoverTimer=QTimer(self)
+        self.hoverTimer.setSingleShot(True)
+        screen=QApplication.primaryScreen()
+        self.hoverTimer.setInterval(int(1000/(screen.refreshRate() if screen and screen.refreshRate() > 0 else 60)))
+        self.hoverTimer.timeout.connect(self.flushHover)
         self._cursor = CURSOR_DEFAULT
         self.overrideCursor(self._cursor)
         self.line=None
@@ -563,12 +1148,230 @@ class SubQGraphicsScene(QGraphicsScene):
         self.selectedVertex=None
         self.selectedShape=None
         self.polystatus=self.POLYDRAWING
-        self.objtypes=[]
         self.labelclasses=[]
         self.labelmode=0 #the default class
-        self.initializeClass('default', QColor(0, 6, 255)) #initialize default class
         self.point_size=1.5
+        self.initializeClass('default', QColor(0, 6, 255)) #initialize default class
         
+    def refresh(self, *shapes):
+        '''Repaint the given shapes (old and new bounding rects, Qt tracks both
+        after prepareGeometryChange), or the whole scene if precise updates are off.
+        Without shapes, repaint those whose highlight changed since the last such
+        call and the shape being drawn with its pointing line'''
+        if not self.preciseUpdates:
+            self.update()
+            return
+        if not shapes:
+            shapes=list(self.highlighted)+list(self.unhighlighted)+[self.QGitem, self.line]
+            self.unhighlighted={}
+        for shape in shapes:
+            if shape is not None:
+                shape.update()
+
+    def addItem(self, item):
+        super(SubQGraphicsScene, self).addItem(item)
+        if isinstance(item, Shape):
+            self.snapChanged(item)
+
+    def removeItem(self, item):
+        super(SubQGraphicsScene, self).removeItem(item)
+        if isinstance(item, Shape):
+            self.snapChanged(item)
+
+    def snapChanged(self, shape):
+        '''Note a shape added, removed or reshaped after the snapping index was built'''
+        if self.snapIndex is not None:
+            self.snapDirty[shape]=None
+            i=self.snapIds.get(shape)
+            if i is not None:
+                self.snapSkip[i]=True
+
+    def setSnapMode(self, mode):
+        '''Change the snapping mode, dropping the index (rebuilt on demand)'''
+        self.snapMode=mode
+        self.snapIndex=None
+        self.snapIds={}
+        self.snapDirty={}
+
+    def buildSnapIndex(self):
+        shapes=[shape for shape in self.polys if len(shape)]
+        self.snapIndex=SegmentIndex([shape.coords for shape in shapes], [shape.closed for shape in shapes])
+        self.snapIds={shape: i for i, shape in enumerate(shapes)}
+        self.snapSkip=np.zeros(len(shapes), dtype=bool)
+        self.snapDirty={}
+
+    def snapTarget(self, pos, exclude=None):
+        '''Point to snap pos to: the nearest vertex of a finished shape within
+        epsilon or, with edge snapping, the nearest point on an edge if no vertex
+        is that close. None if snapping is off or nothing is close'''
+        if self.snapMode == self.SNAP_NONE:
+            return None
+        if self.snapIndex is None or len(self.snapDirty) > self.snapRebuild:
+            self.buildSnapIndex()
+        xy, radius, edges = (pos.x(), pos.y()), self.epsilon**0.5, self.snapMode == self.SNAP_EDGE
+        skip=self.snapSkip
+        if exclude in self.snapIds:
+            skip=skip.copy()
+            skip[self.snapIds[exclude]]=True
+        found=[self.snapIndex.nearest(xy, radius, edges, skip)]
+        changed=[shape for shape in self.snapDirty if shape in self.polys and shape is not exclude and len(shape)]
+        if changed:
+            found.append(SegmentIndex([shape.coords for shape in changed], [shape.closed for shape in changed],
+                                      indexed=False).nearest(xy, radius, edges))
+        found=[hit for hit in found if hit is not None]
+        if not found:
+            return None
+        return QPointF(*min(found)[2])
+
+    @property
+    def objtypes(self):
+        return [shape.objtype for shape in self.polys]
+
+    def addShape(self, shape):
+        self.polys[shape]=None
+        if self.virtual is not None:
+            self.virtual.add(shape)
+
+    def removeShape(self, shape):
+        self.polys.pop(shape, None)
+        if self.virtual is not None:
+            self.virtual.remove(shape)
+
+    def insertShapes(self, shapes, labelclasses):
+        '''Put finished shapes (back) into the scene with their label classes'''
+        for shape, labelclass in zip(shapes, labelclasses):
+            if labelclass is not None:
+                labelclass.assignObject(shape)
+            self.addShape(shape)
+            self.addItem(shape)
+        self.shapesChanged.emit()
+
+    def discardShapes(self, shapes):
+        '''Take finished shapes out of the scene'''
+        for shape in shapes:
+            if shape is self.selectedShape:
+                self.clearShapeSelections()
+            self.highlighted.pop(shape, None)
+            self.unhighlighted.pop(shape, None)
+            self.selection.pop(shape, None)
+            shape.marked=False
+            self.removeShape(shape)
+            if shape.scene() is self:
+                self.removeItem(shape)
+            if shape.labelclass is not None:
+                shape.labelclass.untieShape(shape)
+        self.shapesChanged.emit()
+
+    def relabelShapes(self, shapes, labelclass):
+        '''Assign shapes to labelclass as one undoable step'''
+        shapes=[shape for shape in shapes if shape.labelclass is not labelclass]
+        if not shapes:
+            return
+        before=[shape.labelclass for shape in shapes]
+        for shape in shapes:
+            labelclass.assignObject(shape)
+        self.record(Relabel(self, shapes, before, labelclass))
+        self.refresh(*shapes)
+        self.shapesChanged.emit()
+
+    def record(self, command):
+        '''Add an applied command to the history. In the virtualized mode the
+        shapes it changed are written back to the store, so that the
+        materialized set follows them to their new place'''
+        self.history.push(command)
+        if self.virtual is not None:
+            self.virtual.sync(command.refs())
+
+    def undo(self):
+        self.clearShapeSelections()
+        if self.virtual is not None and self.history.canUndo():
+            self.virtual.resolve(self.history.undoStack[-1].refs())
+        command=self.history.undo()
+        if self.virtual is not None and command is not None:
+            self.virtual.sync(command.refs())
+
+    def redo(self):
+        self.clearShapeSelections()
+        if self.virtual is not None and self.history.canRedo():
+            self.virtual.resolve(self.history.redoStack[-1].refs())
+        command=self.history.redo()
+        if self.virtual is not None and command is not None:
+            self.virtual.sync(command.refs())
+
+    def virtualize(self, store):
+        '''Switch to the virtualized mode with the objects of store; shapes
+        currently in the scene are moved into the store'''
+        if self.virtual is not None:
+            self.devirtualize()
+        ids={}
+        for shape in list(self.polys):
+            ids[shape]=store.append(shape.coords, shape.objtype, shape.labelclass)
+            self.polys.pop(shape)
+            if shape.labelclass is not None:
+                shape.labelclass.untieShape(shape)
+            self.removeItem(shape)
+        self.virtual=VirtualLayer(self, store)
+        self.history.rebind(ids)
+        self.shapesChanged.emit()
+
+    def devirtualize(self):
+        '''Materialize every stored object and leave the virtualized mode'''
+        if self.virtual is None:
+            return
+        layer=self.virtual
+        layer.releaseAll()
+        self.removeItem(layer.overview)
+        self.virtual=None
+        store=layer.store
+        shapes={}
+        for i in store.live().tolist():
+            shape=Shape()
+            shape.setPoints(store.objects[i])
+            shape.objtype=store.types[i]
+            shape.closed=shape.objtype=='Polygon'
+            if store.labels[i] is not None:
+                store.labels[i].assignObject(shape)
+            shapes[i]=shape
+        self.addShapes(list(shapes.values()))
+        self.history.rebind(shapes)
+        self.shapesChanged.emit()
+
+    def labelCounts(self):
+        '''Number of finished shapes per label class'''
+        if self.virtual is not None:
+            return self.virtual.counts()
+        return {labelclass: len(labelclass) for labelclass in self.labelclasses}
+
+    def contents(self):
+        '''Vertex arrays, types, label names and colors of all finished shapes,
+        including those not materialized in the virtualized mode'''
+        if self.virtual is None:
+            shapes=list(self.polys)
+            return ([shape.coords for shape in shapes], [shape.objtype for shape in shapes],
+                    [shape.labelclass.name if shape.labelclass is not None else None for shape in shapes],
+                    [shape.line_color.name() for shape in shapes])
+        self.virtual.flush()
+        store=self.virtual.store
+        ids=store.live()
+        labels=[store.labels[i] for i in ids]
+        return ([store.objects[i] for i in ids], [store.types[i] for i in ids],
+                [label.name if label is not None else None for label in labels],
+                [label.fillColor.name() if label is not None else DEFAULT_COLOR for label in labels])
+
+    def addShapes(self, shapes, progress=None, step=1000):
+        '''Add many finished shapes at once. The BSP index is switched off while
+        inserting and rebuilt in one go at the end; progress(i) is called every
+        step shapes'''
+        self.setItemIndexMethod(QGraphicsScene.NoIndex)
+        try:
+            for i, shape in enumerate(shapes):
+                if progress is not None and i % step == 0:
+                    progress(i)
+                self.polys[shape]=None
+                self.addItem(shape)
+        finally:
+            self.setItemIndexMethod(QGraphicsScene.BspTreeIndex)
+
     def drawing(self):
         return self.mode == self.DRAWING
 
@@ -578,6 +1381,22 @@ class SubQGraphicsScene(QGraphicsScene):
     def moving(self):
         return self.mode == self.MOVING
 
+    def selecting(self):
+        return self.mode == self.SELECTING
+
+    def freehand(self):
+        return self.mode == self.FREEHAND
+
+    def livewiring(self):
+        return self.mode == self.LIVEWIRE
+
+    def setMode(self, mode):
+        if mode != self.SELECTING:
+            self.clearMarks()
+        if self.livewiring() and mode != self.LIVEWIRE and self.QGitem is not None:
+            self.finalisepoly(premature=True)
+        self.mode=mode
+
     def polygon_not_finished(self):
         return self.polystatus == self.POLYDRAWING
 
@@ -588,23 +1407,47 @@ class SubQGraphicsScene(QGraphicsScene):
         return self.selectedVertex is not None
 
     def keyPressEvent(self, event):
+        self.flushHover()
         if event.key() == Qt.Key_Delete:
-            self.deleteSelected()
+            if self.selection:
+                self.deleteMarked()
+            else:
+                self.deleteSelected()
         if event.key() == Qt.Key_K:
-            self.copySelected()
-        if (event.key() == Qt.Key_Z) and (QApplication.keyboardModifiers() == Qt.ControlModifier):
-        	self.undoAction()
-
+            if self.selection:
+                self.copyMarked()
+            else:
+                self.copySelected()
+        if event.key() == Qt.Key_Escape:
+            self.clearMarks()
     
 
     def undoAction(self):
+        '''Remove the last point of the shape being drawn, otherwise undo the
+        last edit'''
+        if self.wireItem is not None and self.QGitem is not None:
+            if len(self.QGitem) > 1:
+                self.QGitem.popPoint()
+                self.startWire(self.QGitem[-1])
+            else:
+                self.removeItem(self.QGitem)
+                self.QGitem=None
+                self.polystatus=self.POLYREADY
+                self.clearWire()
+            self.refresh()
+            return
+        if not self.QGitem:
+            self.undo()
         if self.QGitem:
-        	if len(self.QGitem.points) > 1:
+        	if len(self.QGitem) > 1:
         		self.QGitem.popPoint()
-        		self.line.points[0]=self.QGitem.points[-1]
-        		self.update()
+        		self.line[0]=self.QGitem[-1]
+        		self.refresh(self.QGitem, self.line)
         	else:
-	            self.removeItem(self.QGitem)
+	            if self.restoreEdit(self.QGitem): #cancel editing a finished shape
+	                self.addShape(self.QGitem)
+	            else:
+	                self.removeItem(self.QGitem)
 	            if self.line:
 	            	if self.line in self.items():
 	                	self.removeItem(self.line)
@@ -612,12 +1455,20 @@ class SubQGraphicsScene(QGraphicsScene):
 	            	self.line.popPoint()
 	            self.polystatus=self.POLYREADY
 	            self.QGitem = None
-	            self.update()
+	            self.refresh()
+
+    def restoreEdit(self, shape):
+        '''Put back the state a finished shape had before it was made editable.
+        Returns False if shape is not being edited'''
+        if self.editOrigin is None or self.editOrigin[0] is not shape:
+            return False
+        shape.setState(self.editOrigin[1])
+        self.editOrigin=None
+        self.refresh(shape)
+        return True
 
     def refreshShapestoLabels(self, labelclass):
-        labelpolygons=labelclass.polygons
-        labelclass.polygons=[]
-        [labelclass.assignObject(shape) for shape in labelpolygons]
+        labelclass.refresh()
         return
 
     def initializeClasses(self, names, colors):
@@ -632,7 +1483,7 @@ class SubQGraphicsScene(QGraphicsScene):
         self.shapeColor=color
         active_labelclass=self.labelclasses[self.labelmode]
         active_labelclass.fillColor=self.shapeColor
-        self.refreshShapestoLabels(labelclass=active_labelclass)
+        self.update()
         return
 
     def setLabelMode(self, classindex):
@@ -649,7 +1500,7 @@ class SubQGraphicsScene(QGraphicsScene):
         else:
             ind=self.labelclasses.index(labelclass)
         labelclass.name=name
-        labelclass.fillColor=color
+        labelclass.style.setStyle(color=color, width=self.point_size)
         if ind is not None:
             self.labelclasses[ind]=labelclass
         else:
@@ -661,6 +1512,8 @@ class SubQGraphicsScene(QGraphicsScene):
     def mousePressEvent(self, event):
         '''Draw, move vertices/shapes, open properties window'''
         pos = event.scenePos()
+        self.flushHover()
+        self.dragId+=1
 
         if (event.button() == Qt.RightButton) and not self.drawing():
             if self.selectedShape:
@@ -673,28 +1526,35 @@ class SubQGraphicsScene(QGraphicsScene):
 
                 if propdialogexec:
                     if self.selectedShape.editable:
+                        self.editOrigin=(self.selectedShape, self.selectedShape.state())
                         self.selectedShape.closed=False
                         self.QGitem=self.selectedShape
-                        p=self.QGitem.points[-1]
+                        p=self.QGitem[-1]
                         self.line=Shape(point_size=self.point_size)
                         self.addItem(self.line)
                         self.line.setPos(p)
                         self.line.addPoint(p)
                         self.polystatus = self.POLYDRAWING
                         self.mode = self.DRAWING
-                        shapeid = self.polys.index(self.selectedShape)
                         if self.selectedShape in self.polys:
-                            self.polys.pop(shapeid)
-                            self.objtypes.pop(shapeid)
+                            del self.polys[self.selectedShape]
                             self.QGitem.setZValue(len(self.polys)+2)
-                self.update()
+                self.refresh(self.selectedShape)
+
+        if (self.drawing() & (event.button() == Qt.LeftButton) and self.QGitem is None
+                and QApplication.keyboardModifiers() & Qt.ControlModifier):
+            self.magicWand(pos)
+            event.accept()
 
-        if self.drawing() & (event.button() == Qt.LeftButton):
+        elif self.drawing() & (event.button() == Qt.LeftButton):
             self.overrideCursor(CURSOR_DRAW)
+            snapped=self.snapTarget(pos)
+            if snapped is not None:
+                pos=snapped
             #update the tail of the pointing line
             if self.line and self.polygon_not_finished():
                 self.line.prepareGeometryChange()
-                self.line.points[0]=pos
+                self.line[0]=pos
                 self.line.setPos(pos)
             #initialize a pointing line for a new polygon
             elif self.line==None or self.polygonfinished():
@@ -706,14 +1566,15 @@ class SubQGraphicsScene(QGraphicsScene):
             if self.QGitem:
                 #attract the cursor to the start point of the polygon and close it
                 self.QGitem.prepareGeometryChange()
-                if len(self.QGitem.points) > 1 and self.closeEnough(pos, self.QGitem.points[0]):
+                if len(self.QGitem) > 1 and self.closeEnough(pos, self.QGitem[0]):
 
-                    pos = self.QGitem.points[0]
+                    pos = self.QGitem[0]
                     self.overrideCursor(CURSOR_POINT)
                     self.QGitem.highlightVertex(0)
+                    self.highlighted[self.QGitem]=None
 
                 self.QGitem.addPoint(pos)
-                if (self.QGitem.points[0]==pos):
+                if (self.QGitem[0]==pos):
                     self.finalisepoly()
 
 
@@ -725,7 +1586,7 @@ class SubQGraphicsScene(QGraphicsScene):
                 self.QGitem.setPos(pos)
                 self.QGitem.addPoint(pos)
                 self.QGitem.setZValue(len(self.polys)+1)
-            self.update()
+            self.refresh(self.QGitem, self.line)
             event.accept()
 
         elif self.moving() & (event.button() == Qt.LeftButton):
@@ -733,11 +1594,53 @@ class SubQGraphicsScene(QGraphicsScene):
             self.selectShapebyPoint(pos)
             self.prevPoint=pos
             event.accept()
-            self.update()
+            self.refresh(self.selectedShape)
+
+        elif self.livewiring() & (event.button() == Qt.LeftButton):
+            self.overrideCursor(CURSOR_DRAW)
+            if self.QGitem is None:
+                self.polystatus=self.POLYDRAWING
+                self.QGitem=Shape(point_size=self.point_size)
+                self.addItem(self.QGitem)
+                self.QGitem.setPos(pos)
+                self.QGitem.addPoint(pos)
+                self.QGitem.setZValue(len(self.polys)+1)
+            else:
+                closing=len(self.QGitem) > 1 and self.closeEnough(pos, self.QGitem[0])
+                segment=self.wirePath(self.QGitem[0] if closing else pos)[1:]
+                if closing:
+                    segment=segment[:-1]
+                self.QGitem.setPoints(np.concatenate((self.QGitem.coords, segment)))
+                if closing:
+                    self.QGitem.closed=True
+                    self.finalisepoly()
+                    event.accept()
+                    return
+            self.startWire(self.QGitem[-1])
+            self.refresh(self.QGitem)
+            event.accept()
+
+        elif self.freehand() & (event.button() == Qt.LeftButton):
+            if self.QGitem is None and self.stroke is None:
+                self.overrideCursor(CURSOR_DRAW)
+                self.startStroke(pos)
+            event.accept()
+
+        elif self.selecting() & (event.button() == Qt.LeftButton):
+            modifiers=QApplication.keyboardModifiers()
+            item=self.itemAt(pos, QTransform())
+            if isinstance(item, Shape) and item.marked and not modifiers & (Qt.ShiftModifier | Qt.ControlModifier):
+                #drag the whole selection
+                self.overrideCursor(CURSOR_MOVE)
+                self.dragShapes=tuple(self.markedShapes())
+                self.prevPoint=pos
+            else:
+                self.startBand(pos, lasso=bool(modifiers & Qt.ShiftModifier))
+            event.accept()
 
         elif self.navigating():
             self.overrideCursor(CURSOR_GRAB)
-            self.update()
+            self.refresh()
 
 
     def mouseMoveEvent(self, event):
@@ -748,22 +1651,46 @@ class SubQGraphicsScene(QGraphicsScene):
             self.overrideCursor(CURSOR_DRAW)
 
             if self.QGitem:
-                if len(self.QGitem.points)==1:  #initialize the pointing line collapsed to a point
-                    self.line.points=[self.QGitem.points[0], self.QGitem.points[0]]
+                if len(self.QGitem)==1:  #initialize the pointing line collapsed to a point
+                    self.line.setPoints(self.QGitem.coords[[0, 0]])
                 colorLine = self.lineColor
+                snapped = self.snapTarget(pos)
+                if snapped is not None:
+                    pos = snapped
+                    self.overrideCursor(CURSOR_POINT)
                 if len(self.QGitem) > 1 and self.closeEnough(pos, self.QGitem[0]):
                     pos = self.QGitem[0]
                     colorLine = self.QGitem.line_color
                     self.overrideCursor(CURSOR_POINT)
                     self.QGitem.highlightVertex(0)
+                    self.highlighted[self.QGitem]=None
 
-                if len(self.line.points)==2: #update the pointing line
-                   self.line.points[1]=pos
+                if len(self.line)==2: #update the pointing line
+                   self.line[1]=pos
                 else: #load the pointing line (if another shape was just created)
                    self.line.addPoint(pos)
 
                 self.line.line_color = colorLine
-                self.update()
+                self.refresh(self.QGitem, self.line)
+            return
+
+        if self.stroke is not None:
+            self.extendStroke(pos)
+            return
+
+        if self.livewiring() and self.wireItem is not None:
+            self.overrideCursor(CURSOR_DRAW)
+            if len(self.QGitem) > 1 and self.closeEnough(pos, self.QGitem[0]):
+                pos=self.QGitem[0]
+                self.overrideCursor(CURSOR_POINT)
+            self.updateWire(pos)
+            return
+
+        if self.selecting() and Qt.LeftButton & event.buttons():
+            if self.band is not None:
+                self.updateBand(pos)
+            elif self.dragShapes:
+                self.moveMarked(pos)
             return
 
         #moving shapes/vertices
@@ -775,74 +1702,272 @@ class SubQGraphicsScene(QGraphicsScene):
                     self.moveShape(self.selectedShape, pos)
                 else:
                 	self.moveVertex(pos)
-                self.update()
+                self.refresh(self.selectedShape)
             elif self.selectedShape and self.prevPoint:
                 self.selectedShape.prepareGeometryChange()
                 self.moveShape(self.selectedShape, pos)
-                self.update()
             return
 
-        #update selections/highlights based on cursor location
+        #update selections/highlights based on cursor location, at most once per frame
+        if profiler.enabled:
+            profiler.count('mouse move')
+        if self.coalesceHover:
+            self.pendingHover=pos
+            if not self.hoverTimer.isActive():
+                self.hoverTimer.start()
+        else:
+            self.hoverAt(pos)
+        event.accept()
 
+    def flushHover(self):
+        '''Run the hover logic for the latest cursor position now, if one is
+        pending. Called before any action relying on the current highlight'''
+        self.hoverTimer.stop()
+        if self.pendingHover is not None:
+            pos, self.pendingHover = self.pendingHover, None
+            self.hoverAt(pos)
+
+    def hoverAt(self, pos):
+        '''Highlight the vertex or shape under pos'''
+        if profiler.enabled:
+            profiler.count('hover')
         #check if any vertex is epsilon close to the cursor position and find the corresponding shape
-        id_point=[[i for i, y in enumerate(poly.points) if distance(pos-y)<=self.epsilon] for poly in self.polys]
-        id_shape=[i for i, y in enumerate(id_point) if y != []]
+        shape, vertex = self.findVertex(pos)
+        if shape is None:
+            itemUnderMouse=self.itemAt(pos, QTransform())
+            if isinstance(itemUnderMouse, Shape):
+                shape=itemUnderMouse
+        if self.preciseUpdates and self.unchangedHighlight(shape, vertex):
+            return
 
-        itemUnderMouse=self.itemAt(pos, QTransform())
         self.clearShapeSelections()
         #if shape/vertex combination found, highlight vertex and shape
-        if id_shape != []:
-            self.selectedVertex=id_point[id_shape[0]][0]
-            self.selectShape(self.items()[:-1][::-1][id_shape[0]])
+        if vertex is not None:
+            self.selectedVertex=vertex
+            self.selectShape(shape)
             self.selectedShape.highlightVertex(self.selectedVertex)
-            self.update()
             return
-        elif itemUnderMouse in self.items()[:-1]: #if the cursor is inside of a shape, highlight it
+        elif shape is not None: #if the cursor is inside of a shape, highlight it
             self.selectedVertex = None
-            self.selectShape(itemUnderMouse)
+            self.selectShape(shape)
             self.selectedShape.hIndex=None
-            self.update()
             return
         else:#nothing found: no shape under the cursor, no vertices in vicinity, clear all
             self.selectedVertex = None
-            self.update()
+            self.refresh()
             return
 
-        event.accept()
-
     def mouseReleaseEvent(self,event):
+        if self.band is not None:
+            self.finishBand(event.scenePos())
+        if self.stroke is not None:
+            self.extendStroke(event.scenePos())
+            self.finishStroke()
+        self.dragShapes=None
         if self.navigating or (event.button() == Qt.LeftButton and self.selectedShape):
             self.overrideCursor(CURSOR_DEFAULT)
-            self.update()
+            self.refresh(self.selectedShape)
         event.accept()
 
+    def findVertex(self, pos):
+        '''Return the shape and index of the vertex closest to pos, if it is
+        epsilon close (squared distance); (None, None) otherwise. Only shapes whose
+        bounding box is near pos (found through the scene index) are searched
+        '''
+        r = self.epsilon**0.5
+        best, found = self.epsilon, (None, None)
+        for item in self.items(QRectF(pos.x()-r, pos.y()-r, 2*r, 2*r), Qt.IntersectsItemBoundingRect):
+            if isinstance(item, Shape) and item is not self.QGitem and item is not self.line and len(item):
+                d = ((item.coords - (pos.x(), pos.y()))**2).sum(axis=1)
+                i = int(d.argmin())
+                if d[i] <= best:
+                    best, found = d[i], (item, i)
+        return found
+
     def closeEnough(self, p1, p2):
         return distance(p1 - p2) < self.epsilon
 
     def finalisepoly(self, premature=False):
         if self.QGitem:
             if premature:
-                if len(self.QGitem.points)==1:
-                    self.objtypes.append('Point')
+                if len(self.QGitem)==1:
                     self.QGitem.objtype='Point'
                 else:
-                    self.objtypes.append('Line')
                     self.QGitem.objtype='Line'
             else:
-                self.objtypes.append('Polygon')
                 self.QGitem.objtype='Polygon'
             if self.line:
                 self.removeItem(self.line)
                 self.line.popPoint()
             self.QGitem.editable=False
-            self.polys.append(self.QGitem)
+            self.addShape(self.QGitem)
             if self.labelmode is not None:
                 labelobject=self.labelclasses[self.labelmode]
                 labelobject.assignObject(self.QGitem)
-                self.QGitem.label=labelobject.name
+            if self.editOrigin is not None and self.editOrigin[0] is self.QGitem:
+                self.record(SetGeometry(self, self.QGitem, self.editOrigin[1], self.QGitem.state()))
+                self.editOrigin=None
+            else:
+                self.record(AddShapes(self, [self.QGitem]))
+            self.refresh(self.QGitem)
             self.QGitem = None
             self.polystatus=self.POLYREADY
-            self.update()
+            self.clearWire()
+            self.shapesChanged.emit()
+
+    def setImage(self, image, pixels=None, valueScale=1.0):
+        '''Keep the decoded photo for the pixel tools, converted once if its
+        pixels are not colors or gray levels. High-bit-depth and multi-band
+        images come as pixels (H, W, C) instead, with the pixel values per
+        display level in valueScale'''
+        if image is not None and image.format() not in COLOR_FORMATS:
+            image=image.convertToFormat(QImage.Format_RGB32)
+        self.image=image
+        self.pixels=pixels
+        self.valueScale=valueScale
+        self.wireCost=None
+        self.imageSource=None
+
+    def releaseImage(self, source):
+        '''Drop the decoded photo (and the edge costs made from it) when
+        source() can return it again, e.g. from the pixmap on screen; the
+        pixel tools restore it when next used. Returns the bytes freed'''
+        if self.image is None:
+            return 0
+        freed=self.image.byteCount()
+        self.image=None
+        self.pixels=None
+        self.wireCost=None
+        self.imageSource=source
+        return freed
+
+    def imagePixels(self):
+        '''(H, W, C) view of the photo's color channels, None without a photo'''
+        if self.image is None and self.imageSource is not None:
+            self.setImage(self.imageSource())
+        if self.pixels is None and self.image is not None and not self.image.isNull():
+            pixels=image_array(self.image)
+            self.pixels=pixels[:, :, :3] if pixels.shape[2] == 4 else pixels
+        return self.pixels
+
+    def magicWand(self, pos):
+        '''Outline the region of pixels connected to pos whose color is within
+        wandTolerance of the pixel at pos and add it as a polygon'''
+        pixels=self.imagePixels()
+        if pixels is None:
+            return
+        x, y = int(math.floor(pos.x())), int(math.floor(pos.y()))
+        if not (0 <= x < pixels.shape[1] and 0 <= y < pixels.shape[0]):
+            return
+        region, origin = flood_fill(pixels, (x, y), self.wandTolerance*self.valueScale, limit=self.wandLimit)
+        contours=trace_contours(region)
+        if not contours:
+            return
+        outline=max(contours, key=len)
+        if self.wandSimplify:
+            outline=simplify([outline], self.wandSimplify)[0]
+        self.addPolygon(outline + origin)
+
+    def costMap(self):
+        '''Livewire edge costs of the photo, None without a photo'''
+        if self.wireCost is None and self.imagePixels() is not None:
+            self.wireCost=CostMap(self.imagePixels(), scale=4.0*self.valueScale)
+        return self.wireCost
+
+    def startWire(self, pos):
+        '''Start a livewire search from pos, the last vertex of the shape'''
+        self.wireTimer.stop()
+        self.wire=None
+        costmap=self.costMap()
+        x, y = int(math.floor(pos.x())), int(math.floor(pos.y()))
+        if costmap is not None and 0 <= x < costmap.width and 0 <= y < costmap.height:
+            self.wire=LiveWire(costmap, (x, y), self.wireRadius)
+        if self.wireItem is None:
+            self.wireItem=QGraphicsPathItem()
+            self.wireItem.setPen(QPen(self.lineColor, 0))
+            self.wireItem.setZValue(len(self.polys)+2)
+            self.addItem(self.wireItem)
+        self.wireItem.setPath(QPainterPath())
+
+    def wirePath(self, pos, expand=True):
+        '''Vertices of the segment proposed from the last vertex to pos: the
+        cheapest path over the edge costs found so far (searching for up to
+        wireBudget first), or a straight line outside the searched window'''
+        start, end = self.QGitem.coords[-1], (pos.x(), pos.y())
+        path=None
+        if self.wire is not None:
+            target=(int(math.floor(pos.x())), int(math.floor(pos.y())))
+            if expand:
+                self.wire.expand(self.wireBudget, target)
+            path=self.wire.path(*target)
+            if not self.wire.done():
+                self.wireTimer.start()
+        if path is None or len(path) < 2:
+            return np.array([start, end])
+        path[0], path[-1] = start, end
+        return simplify([path], self.wireSimplify, closed=False)[0]
+
+    def updateWire(self, pos, expand=True):
+        self.wirePos=pos
+        path=QPainterPath()
+        path.addPolygon(toPolygonF(self.wirePath(pos, expand)))
+        self.wireItem.setPath(path)
+
+    def continueWire(self):
+        '''Extend the search while the cursor rests and refresh the proposal'''
+        if self.wire is not None and self.wirePos is not None and self.QGitem is not None:
+            self.wire.expand(self.wireBudget)
+            self.updateWire(self.wirePos, expand=False)
+
+    def clearWire(self):
+        self.wireTimer.stop()
+        self.wire=None
+        self.wirePos=None
+        if self.wireItem is not None:
+            if self.wireItem.scene() is self:
+                self.removeItem(self.wireItem)
+            self.wireItem=None
+
+    def pixelSize(self):
+        '''Scene units per screen pixel in the first view (1 without a view)'''
+        views=self.views()
+        return 1.0/views[0].transform().m11() if views else 1.0
+
+    def startStroke(self, pos):
+        '''Begin a freehand shape at pos, decimated on the fly to
+        freehandTolerance screen pixels at the current zoom'''
+        scale=self.pixelSize()
+        self.strokeSimplifier=StrokeSimplifier(pos.x(), pos.y(), self.freehandTolerance*scale,
+                                               self.freehandSpacing*scale)
+        self.stroke=Stroke(pos, self.labelclasses[self.labelmode].style.pen)
+        self.stroke.setZValue(len(self.polys)+1)
+        self.addItem(self.stroke)
+
+    def extendStroke(self, pos):
+        fixed=self.strokeSimplifier.push(pos.x(), pos.y())
+        self.stroke.extend(None if fixed is None else QPointF(*fixed), pos)
+
+    def finishStroke(self):
+        '''Turn the stroke into a polygon (dropped if it has fewer than 3
+        vertices); its end is joined to its start'''
+        coords=self.strokeSimplifier.finish()
+        self.removeItem(self.stroke)
+        self.stroke=self.strokeSimplifier=None
+        if len(coords) > 3 and self.closeEnough(QPointF(*coords[-1]), QPointF(*coords[0])):
+            coords=coords[:-1]
+        self.addPolygon(coords)
+
+    def addPolygon(self, coords):
+        '''Add coords as a finished polygon of the active label class (one undo
+        step), unless it has fewer than 3 vertices'''
+        if len(coords) < 3:
+            return
+        self.QGitem=Shape()
+        self.QGitem.setPoints(coords)
+        self.QGitem.closed=True
+        self.QGitem.setZValue(len(self.polys)+1)
+        self.addItem(self.QGitem)
+        self.finalisepoly()
 
     def overrideCursor(self, cursor):
         self._cursor = cursor
@@ -852,65 +1977,224 @@ class SubQGraphicsScene(QGraphicsScene):
 
         if self.selectedShape:
             shape = self.selectedShape
-            c,o,s =[shape.closed, shape.objtype, shape.point_size]
-            p=[point for point in shape.points]
+            c,o,s =[shape.closed, shape.objtype, shape.style]
+            p=shape.coords.copy()
             
             newshape=Shape()
             
-            newshape.points, newshape.closed, newshape.objtype, newshape.point_size = p, c, o, s
+            newshape.setPoints(p)
+            newshape.closed, newshape.objtype, newshape.style = c, o, s
 
-            self.polys.append(newshape)
-            self.objtypes.append(newshape.objtype)
+            self.addShape(newshape)
             
             newshape.setZValue(len(self.polys)+1)
             self.addItem(newshape)
             
-            labelid=[label.name for label in self.labelclasses].index(shape.label)
-            self.labelclasses[labelid].assignObject(newshape)
+            if shape.labelclass is not None:
+                shape.labelclass.assignObject(newshape)
+            self.record(AddShapes(self, [newshape]))
 
-            print('Shape copied')
+            self.message.emit('Shape copied')
+            self.shapesChanged.emit()
             self.clearShapeSelections()
             self.selectShape(newshape)
-            self.update()
             return
 
 
     def deleteSelected(self):
         if self.selectedShape:
-            shape = self.items()[:-1][::-1].index(self.selectedShape)
-            if self.selectedShape in self.polys:
-                self.polys.pop(shape)
-                self.objtypes.pop(shape)
-            self.removeItem(self.selectedShape)
+            shape=self.selectedShape
+            finished=shape in self.polys or self.restoreEdit(shape)
+            command=RemoveShapes(self, [shape])
+            self.discardShapes([shape])
+            if finished:
+                self.record(command)
             if self.line:
             	if self.line in self.items():
             		self.removeItem(self.line)
             	self.line.popPoint()
-            labelind=self.findShapeInLabel(self.selectedShape)
-            if len(labelind) > 0:
-                label, shapeind = labelind[0]
-                self.labelclasses[label].polygons.pop(shapeind)
             self.polystatus=self.POLYREADY
             self.selectedShape = None
             self.QGitem = None
             self.clearShapeSelections()
-            print('Shape deleted')
-            self.update()
+            self.message.emit('Shape deleted')
+            self.refresh()
             return
 
-    def findShapeInLabel(self, shape):
-        if len(self.labelclasses) > 0:
-            labelpolys=[l.polygons for l in self.labelclasses]
-            return ([(i, label.index(shape)) for i, label in enumerate(labelpolys) if shape in label])
-        else:
-            return 2*[None]            
 
 
+    def startBand(self, pos, lasso=False):
+        '''Start dragging out a rubber band rectangle (or a lasso) at pos'''
+        self.lassoing=lasso
+        self.bandPoints=[(pos.x(), pos.y())]
+        self.band=QGraphicsPathItem()
+        pen=QPen(ShapeStyle.select_color, 0, Qt.DashLine)
+        self.band.setPen(pen)
+        self.band.setZValue(2**30)
+        self.addItem(self.band)
+
+    def bandPolygon(self, pos):
+        '''Vertices of the band for the cursor at pos'''
+        if self.lassoing:
+            return as_points(self.bandPoints)
+        (x0, y0), x1, y1 = self.bandPoints[0], pos.x(), pos.y()
+        return as_points([(x0, y0), (x1, y0), (x1, y1), (x0, y1)])
+
+    def updateBand(self, pos):
+        if self.lassoing:
+            self.bandPoints.append((pos.x(), pos.y()))
+        path=QPainterPath()
+        path.addPolygon(toPolygonF(self.bandPolygon(pos)))
+        path.closeSubpath()
+        self.band.setPath(path)
+
+    def finishBand(self, pos):
+        '''Select what the band encloses; a click without a drag selects the
+        shape under the cursor'''
+        if self.lassoing:
+            self.bandPoints.append((pos.x(), pos.y()))
+        polygon=self.bandPolygon(pos)
+        self.removeItem(self.band)
+        self.band=None
+        add=bool(QApplication.keyboardModifiers() & Qt.ControlModifier)
+        extent=polygon.max(axis=0) - polygon.min(axis=0)
+        if len(polygon) < 3 or (extent == 0).any():
+            item=self.itemAt(pos, QTransform())
+            self.markShapes([item] if isinstance(item, Shape) and item in self.polys else [], add)
+        else:
+            self.selectArea(polygon, lasso=self.lassoing, add=add)
+
+    def selectArea(self, polygon, lasso=False, add=False):
+        '''Mark the finished shapes lying entirely inside polygon, an (N, 2)
+        array (the 4 corners of a rectangle unless lasso). Candidates come from
+        the scene index and all their vertices are tested in one pass'''
+        (x0, y0), (x1, y1) = polygon.min(axis=0), polygon.max(axis=0)
+        candidates=[item for item in self.items(QRectF(x0, y0, x1-x0, y1-y0), Qt.IntersectsItemBoundingRect)
+                    if isinstance(item, Shape) and len(item) and item in self.polys]
+        if candidates:
+            coords, starts, counts = pack([shape.coords for shape in candidates])
+            if lasso:
+                inside=points_in_polygon(coords, polygon)
+            else:
+                inside=((coords >= (x0, y0)) & (coords <= (x1, y1))).all(axis=1)
+            enclosed=np.logical_and.reduceat(inside, starts)
+            candidates=[shape for shape, keep in zip(candidates, enclosed) if keep]
+        self.markShapes(candidates, add)
+
+    def selectAll(self):
+        self.markShapes(list(self.polys))
+
+    def markShapes(self, shapes, add=False):
+        '''Make shapes the selection (or add them to it)'''
+        if not add:
+            self.clearMarks()
+        for shape in shapes:
+            shape.marked=True
+            self.selection[shape]=None
+        self.refresh(*shapes)
+        self.message.emit('{} shapes selected'.format(len(self.selection)))
+
+    def clearMarks(self):
+        for shape in self.selection:
+            shape.marked=False
+        self.refresh(*self.selection)
+        self.selection={}
+
+    def markedShapes(self):
+        '''Selected shapes that are still finished (not being edited)'''
+        return [shape for shape in self.selection if shape in self.polys]
+
+    def deleteMarked(self):
+        '''Delete the selection as one undoable step'''
+        shapes=self.markedShapes()
+        self.clearMarks()
+        if shapes:
+            command=RemoveShapes(self, shapes)
+            self.discardShapes(shapes)
+            self.record(command)
+            self.message.emit('{} shapes deleted'.format(len(shapes)))
+
+    def copyMarked(self):
+        '''Copy the selection as one undoable step and select the copies'''
+        shapes=self.markedShapes()
+        copies=[]
+        for shape in shapes:
+            newshape=Shape()
+            newshape.setPoints(shape.coords.copy())
+            newshape.closed, newshape.objtype, newshape.style = shape.closed, shape.objtype, shape.style
+            newshape.setZValue(len(self.polys)+len(copies)+1)
+            copies.append(newshape)
+        if copies:
+            self.insertShapes(copies, [shape.labelclass for shape in shapes])
+            self.record(AddShapes(self, copies))
+            self.message.emit('{} shapes copied'.format(len(copies)))
+            self.markShapes(copies)
+
+    def moveMarked(self, pos):
+        delta = pos - self.prevPoint
+        if delta:
+            for shape in self.dragShapes:
+                shape.translateBy(delta.x(), delta.y())
+            self.record(MoveShapes(self, self.dragShapes, delta, self.dragId))
+            self.prevPoint = pos
+            self.refresh(*self.dragShapes)
+
+    def relabelMarked(self, labelclass):
+        self.relabelShapes(self.markedShapes(), labelclass)
+
+    def changeMarkedType(self, objtype):
+        '''Change the type of the selected shapes having enough vertices for
+        objtype, as one undoable step. Returns the number of shapes changed'''
+        shapes=[shape for shape in self.markedShapes()
+                if shape.objtype != objtype and len(shape) >= MIN_VERTICES[objtype]
+                and (objtype != 'Point' or len(shape) == 1)]
+        if shapes:
+            command=ChangeType(self, shapes, [shape.objtype for shape in shapes], objtype)
+            command.redo()
+            self.record(command)
+        return len(shapes)
+
+    def simplifyShapes(self, tolerance):
+        '''Douglas-Peucker simplification of the selected shapes, or of all
+        finished shapes (including those not materialized in the virtualized
+        mode). Returns the number of vertices before and after'''
+        shapes=self.markedShapes() or list(self.polys)
+        if self.virtual is not None and not self.selection:
+            #simplify the store; materialized shapes pick up the result
+            layer=self.virtual
+            layer.flush()
+            store=layer.store
+            ids=store.live()
+            objects=[store.objects[i] for i in ids]
+            result=simplify(objects, tolerance, [store.types[i]=='Polygon' for i in ids])
+            changed=[k for k, (old, new) in enumerate(zip(objects, result)) if new is not old]
+            if changed:
+                command=StoreVertices(self, [int(ids[k]) for k in changed], [objects[k].copy() for k in changed],
+                                      [result[k] for k in changed])
+                command.redo()
+                self.record(command)
+            return sum(len(obj) for obj in objects), sum(len(obj) for obj in result)
+        before=[shape.coords.copy() for shape in shapes]
+        result=simplify(before, tolerance, [shape.closed for shape in shapes])
+        changed=[k for k, (old, new) in enumerate(zip(before, result)) if new is not old]
+        if changed:
+            changedshapes=[shapes[k] for k in changed]
+            command=SetVertices(self, changedshapes, [before[k] for k in changed], [result[k] for k in changed])
+            command.redo()
+            self.record(command)
+        return sum(len(obj) for obj in before), sum(len(obj) for obj in result)
 
     def selectShape(self, shape):
         shape.selected = True
         self.selectedShape = shape
-        self.update()
+        self.highlighted[shape]=None
+        self.refresh(shape)
+
+    def unchangedHighlight(self, shape, vertex):
+        '''True if hovering would highlight exactly what is highlighted already'''
+        if shape is not self.selectedShape or vertex != self.selectedVertex:
+            return False
+        return shape is None or (shape.selected and shape.hIndex == vertex)
 
     def selectShapebyPoint(self, point):
         """Select the first shape created which contains this point."""
@@ -920,35 +2204,47 @@ class SubQGraphicsScene(QGraphicsScene):
 
         itemUnderMouse=self.itemAt(point, QTransform())
 
-        if itemUnderMouse in self.items()[:-1]:
+        if isinstance(itemUnderMouse, Shape):
             self.selectShape(itemUnderMouse)
             return
 
     def clearShapeSelections(self):
         if self.selectedShape:
             self.selectedShape.highlightClear()
+            self.refresh(self.selectedShape)
             self.selectedShape = None
             self.forceAllSelectionsClear()
-            self.update()
 
     def forceAllSelectionsClear(self):
+    	if self.preciseUpdates: #only shapes highlighted since the last clear
+    		for shape in self.highlighted:
+    			shape.highlightClear()
+    			shape.update()
+    		self.unhighlighted.update(self.highlighted)
+    		self.highlighted={}
+    		return
     	for shape in self.items()[:-1]:
-    		shape.highlightClear()
+    		if isinstance(shape, Shape):
+    			shape.highlightClear()
     	self.update()
     	return
 
     def moveVertex(self, pos):
-        self.selectedShape.prepareGeometryChange()
-        self.selectedShape.moveBy(self.selectedVertex, pos - self.selectedShape[self.selectedVertex])
+        snapped = self.snapTarget(pos, exclude=self.selectedShape)
+        if snapped is not None:
+            pos = snapped
+        delta = pos - self.selectedShape[self.selectedVertex]
+        self.selectedShape.moveBy(self.selectedVertex, delta)
+        self.record(MoveVertex(self, self.selectedShape, self.selectedVertex, delta, self.dragId))
 
 
     def moveShape(self, shape, pos):
         delta = pos - self.prevPoint
         if delta:
-            shape.prepareGeometryChange()
             shape.moveBy('all', delta)
+            self.record(MoveShapes(self, [shape], delta, self.dragId))
             self.prevPoint = pos
-            self.update()
+            self.refresh(shape)
             return True
         return False
 
@@ -970,28 +2266,69 @@ class QViewer(QGraphicsView):
         self.setBackgroundBrush(QBrush(QColor(30, 30, 30)))
         self.setFrameShape(QFrame.NoFrame)
         self.pixmap = QPixmap()
+        self.raster = None #RasterItem drawing 16-bit and multi-band images instead of the photo
+        #refresh the materialized shapes of a virtualized scene once per batch of view changes
+        self.viewTimer = QTimer(self)
+        self.viewTimer.setSingleShot(True)
+        self.viewTimer.setInterval(0)
+        self.viewTimer.timeout.connect(self.updateVirtual)
+        self.horizontalScrollBar().valueChanged.connect(self.viewChanged)
+        self.verticalScrollBar().valueChanged.connect(self.viewChanged)
+
+    def viewChanged(self, *args):
+        if self.scene.virtual is not None:
+            self.viewTimer.start()
+
+    def updateVirtual(self):
+        if self.scene.virtual is not None:
+            self.scene.virtual.update(self.mapToScene(self.viewport().rect()).boundingRect())
+
+    def resizeEvent(self, event):
+        super(QViewer, self).resizeEvent(event)
+        self.viewChanged()
 
 
 
     def setPhoto(self, pixmap=None):
 
         if pixmap and not pixmap.isNull():
+            self.setRaster(None)
             self.setDragMode(QGraphicsView.ScrollHandDrag)
             self.photo.setPixmap(pixmap)
             self.fitInView(self.sceneRect(), Qt.KeepAspectRatio)
             self.pixmap=pixmap
+            self.viewChanged()
         else:
             self.setDragMode(QGraphicsView.NoDrag)
             self.photo.setPixmap(QPixmap())
 
+    def setRaster(self, contrast, fit=True):
+        '''Show a Contrast mapping of an image in place of the photo, or
+        remove it (contrast None)'''
+        if self.raster is not None:
+            self.scene.removeItem(self.raster)
+            self.raster=None
+        if contrast is None:
+            return
+        self.photo.setPixmap(QPixmap())
+        self.pixmap=QPixmap()
+        self.raster=RasterItem(contrast)
+        self.raster.setZValue(-1)
+        self.scene.addItem(self.raster)
+        self.setDragMode(QGraphicsView.ScrollHandDrag)
+        if fit:
+            self.fitInView(self.raster.boundingRect(), Qt.KeepAspectRatio)
+        self.viewChanged()
+
     def wheelEvent(self, event):
-        if not self.photo.pixmap().isNull():
+        if not self.photo.pixmap().isNull() or self.raster is not None:
 
             factor=1.1
             if event.angleDelta().y() > 0:
                 QGraphicsView.scale(self,factor,factor)
             else:
                 QGraphicsView.scale(self,1/factor,1/factor)
+            self.viewChanged()
 
 
 class MainWindow(QMainWindow):
@@ -1000,13 +2337,17 @@ class MainWindow(QMainWindow):
     them to the scene
     '''
     autosaveSignal=pyqtSignal()
+    progressThreshold=5000 #show a progress dialog when loading more objects
+    virtualThreshold=20000 #virtualize the scene when loading more objects
+    memoryLimit=2*2**30 #bytes of images and caches kept before releasing what can be rebuilt, 0 for no limit
     def __init__(self):
         super(MainWindow, self).__init__()
         self.imageData = None
         self.imagePath = None
         self.imsizes = None
         self.viewer = QViewer(self)
-        self.viewer.setViewportUpdateMode(QGraphicsView.BoundingRectViewportUpdate)
+        self.viewer.setViewportUpdateMode(QGraphicsView.MinimalViewportUpdate if self.viewer.scene.preciseUpdates
+                                          else QGraphicsView.BoundingRectViewportUpdate)
         self.setCentralWidget(self.viewer)
         self.annotationscene=Annotationscene()
         self.shapestoload=None
@@ -1018,15 +2359,28 @@ class MainWindow(QMainWindow):
         self.autosave=False
         self.timer=None
         self.autosavetime=2*60.0
+        self.autovirtual=False
+        self.simplifyTolerance=1.0 #pixels, for the Edit menu and saving
+        self.simplifyonsave=False
         self.autosaveSignal.connect(self.defaultSave, Qt.QueuedConnection)
+        self.viewer.scene.shapesChanged.connect(self.refreshLabelCounts)
+        self.viewer.scene.message.connect(lambda text: self.statusbar.showMessage(text, 3000))
         
         self.currentlabel=None
-        self.modedict={0: 'navigation', 1: 'drawing', 2: 'moving'}
+        self.modedict={0: 'navigation', 1: 'drawing', 2: 'moving', 3: 'selecting', 4: 'freehand', 5: 'livewire'}
         
         self.labelnames=None
         self.labelcolors=None
 
         self.statusbar = self.statusBar()
+        self.memory = MemoryAccountant(self.memoryLimit)
+        self.trackMemory()
+        self.showMemory()
+        self.perflabel = None
+        if profiler.enabled:
+            self.showInstrumentation()
+        if watchdog.enabled:
+            self.startWatchdog()
 
         self.fileListWidget = QListWidget()
         self.fileListWidget.itemDoubleClicked.connect(self.imagenameDoubleClicked)
@@ -1063,12 +2417,31 @@ class MainWindow(QMainWindow):
         setEditing = action('&Drawing Mode', self.setEditing, 'E', 'Drawing', 'Enable drawing mode')
         setMoving = action('&Moving Mode', self.setMoving, 'M', 'Moving', 'Enable moving mode')
         setNavigating = action('&Navigation Mode', self.setNavigating, 'N', 'Navigating', 'Enable navigation mode')
+        setFreehand = action('&Freehand Mode', self.setFreehand, 'F', 'Freehand', 'Drag to draw a polygon')
+        setLivewire = action('&Livewire Mode', self.setLivewire, 'W', 'Livewire', 'Click vertices joined along image edges')
+        setSelecting = action('&Selection Mode', self.setSelecting, 'R', 'Selecting', 'Select shapes with a rectangle (Shift: lasso)')
         setClosed = action('&Annotation complete', self.setClosure, 'C', 'Closing shape', 'Complete current annotation')
         initLabels = action('&Edit labels', self.initLabels, 'I', 'Label classes initialized', 'Edit label classes')
         setwidth = action('&Set line width', self.openLineWidthSlider, 'L', 'Line width set', 'Set line width')
         setepsilon = action('&Set attraction epsilon', self.openEpsilonSlider, '[', 'Epsilon set', 'Set epsilon')
+        adjustcontrast = action('&Adjust contrast', self.adjustContrast, None, 'contrast',
+                                'Stretch the contrast of the image and choose the bands shown')
+        setmemory = action('&Set memory limit', self.setMemoryLimit, None, 'memory',
+                           'Memory kept by images and caches before releasing what can be rebuilt')
+        setwand = action('&Set magic wand tolerance', self.setWandTolerance, None, 'wand',
+                         'Color tolerance of the magic wand (Ctrl+click in drawing mode)')
+        snapping = action('&Cycle snapping (off, vertices, edges)', self.cycleSnapping, 'S', 'snapping',
+                          'Snap drawn and moved vertices to the vertices or edges of other shapes')
+        undo = action('&Undo', self.viewer.scene.undoAction, 'Ctrl+Z', 'undo', 'Undo the last point or edit')
+        redo = action('&Redo', self.viewer.scene.redo, ['Ctrl+Y', 'Ctrl+Shift+Z'], 'redo', 'Redo the last undone edit')
+        selectall = action('&Select all shapes', self.selectAll, 'Ctrl+A', 'select all', 'Select all shapes')
+        relabel = action('&Relabel selection', self.relabelSelection, 'Ctrl+L', 'relabel', 'Move the selected shapes to a label class')
+        simplifyshapes = action('&Simplify shapes', self.simplifyShapes, None, 'simplify', 'Remove vertices within a tolerance of the outline (selected or all shapes)')
+        changetype = action('&Change type of selection', self.changeSelectionType, 'Ctrl+T', 'change type', 'Change the type of the selected shapes')
         saveoriginal = QAction('&Save original image bytes', self, checkable=True, shortcut="]", triggered=self.checkaction)
         autosave = QAction('&Enable autosaving', self, checkable=True, shortcut="'", triggered=self.checkautosave)
+        simplifysave = QAction('&Simplify shapes when saving', self, checkable=True, triggered=self.checksimplify)
+        self.virtualaction = QAction('&Virtualize scene (materialize visible shapes only)', self, checkable=True, triggered=self.checkvirtual)
         
         
         menubar = self.menuBar()
@@ -1076,13 +2449,13 @@ class MainWindow(QMainWindow):
         editMenu = menubar.addMenu('Edit')
         modesMenu = menubar.addMenu('Modes')
         
-        self.actions_to_menus(fileMenu, [openshort, save, autosave, saveoriginal, quitaction])
-        self.actions_to_menus(editMenu, [initLabels, setwidth, setepsilon, shapecolorselect, linecolorselect])
-        self.actions_to_menus(modesMenu, [setEditing, setMoving, setNavigating, setClosed])
+        self.actions_to_menus(fileMenu, [openshort, save, autosave, saveoriginal, simplifysave, quitaction])
+        self.actions_to_menus(editMenu, [undo, redo, selectall, relabel, changetype, simplifyshapes, initLabels, setwidth, setepsilon, snapping, setwand, adjustcontrast, shapecolorselect, linecolorselect, self.virtualaction, setmemory])
+        self.actions_to_menus(modesMenu, [setEditing, setFreehand, setLivewire, setMoving, setNavigating, setSelecting, setClosed])
         
         self.toolbar=QToolBar()
         self.toolbar.clear()
-        [self.addbutton(self.toolbar, action) for action in [openshort, save, setEditing, setMoving, setNavigating, setClosed, initLabels, shapecolorselect, linecolorselect, quitaction]]
+        [self.addbutton(self.toolbar, action) for action in [openshort, save, setEditing, setFreehand, setLivewire, setMoving, setNavigating, setSelecting, setClosed, initLabels, shapecolorselect, linecolorselect, quitaction]]
         self.addToolBar(Qt.LeftToolBarArea, self.toolbar)
 
 
@@ -1096,6 +2469,85 @@ class MainWindow(QMainWindow):
             self.statusbar.showMessage('{} | {} | {}'.format(action+': '+self.imname, 'MODE: '+self.modedict[self.viewer.scene.mode], ''))
         return
 
+    def reportStartup(self):
+        '''Report the time from process start to the first iteration of the
+        event loop with the window shown
+        '''
+        start, since = processStart()
+        self.startuptime = 1000*(time.perf_counter() - start)
+        self.statusbar.showMessage('Started in {:.0f} ms (since {})'.format(self.startuptime, since), 5000)
+
+    def showInstrumentation(self):
+        '''Show rolling percentiles of the instrumented handlers in the status bar
+        '''
+        self.perflabel = QLabel()
+        self.statusbar.addPermanentWidget(self.perflabel)
+        self.perftimer = QTimer(self)
+        self.perftimer.timeout.connect(lambda: self.perflabel.setText(profiler.statusText()))
+        self.perftimer.start(1000)
+
+    def trackMemory(self):
+        '''Register the image buffers and caches with the memory accountant,
+        cheapest to rebuild first'''
+        scene, viewer = self.viewer.scene, self.viewer
+        self.memory.track('image file bytes', lambda: len(self.imageData or b''),
+                          self.releaseImageData, redundant=True)
+        self.memory.track('livewire edge costs', lambda: scene.wireCost.nbytes() if scene.wireCost else 0,
+                          lambda excess: self.releaseCostMap())
+        self.memory.track('contrast tiles', lambda: viewer.raster.nbytes() if viewer.raster else 0,
+                          lambda excess: viewer.raster.evict(excess))
+        self.memory.track('decoded image', lambda: scene.image.byteCount() if scene.image else 0,
+                          lambda excess: scene.releaseImage(viewer.photo.pixmap().toImage)
+                          if not viewer.photo.pixmap().isNull() else 0)
+        self.memory.track('undo history', lambda: scene.history.nbytes, scene.history.trim)
+        self.memory.track('image pixels', lambda: scene.pixels.nbytes if scene.image is None and scene.pixels is not None else 0)
+        self.memory.track('displayed pixmap', lambda: pixmapBytes(viewer.photo.pixmap()))
+
+    def releaseImageData(self, excess=0):
+        '''Drop the file bytes of the decoded image unless they are saved with
+        the labels or cannot be read from the image file again'''
+        if self.savebytes or not self.imageData or not (self.imagePath and os.path.isfile(self.imagePath)):
+            return 0
+        freed=len(self.imageData)
+        self.imageData=None
+        self.annotationscene.imageData=None
+        return freed
+
+    def releaseCostMap(self):
+        scene=self.viewer.scene
+        freed=scene.wireCost.nbytes()
+        scene.wireCost=None
+        return freed
+
+    def showMemory(self):
+        '''Show the memory held by images and caches in the status bar,
+        enforcing the limit on every update'''
+        self.memorylabel = QLabel()
+        self.statusbar.addPermanentWidget(self.memorylabel)
+        self.memorytimer = QTimer(self)
+        self.memorytimer.timeout.connect(self.updateMemory)
+        self.memorytimer.start(1000)
+        self.updateMemory()
+
+    def updateMemory(self):
+        self.memory.enforce()
+        self.memorylabel.setText(self.memory.statusText())
+        self.memorylabel.setToolTip(self.memory.details())
+
+    def setMemoryLimit(self):
+        limit, ok = QInputDialog.getInt(self, 'Memory limit', 'Limit for images and caches (MB, 0 for none):',
+                                        self.memory.limit//2**20, 0, 2**20)
+        if ok:
+            self.memory.limit=limit*2**20
+            self.updateMemory()
+
+    def startWatchdog(self):
+        '''Beat the stall watchdog's heartbeat from the event loop'''
+        self.heartbeat = QTimer(self)
+        self.heartbeat.timeout.connect(watchdog.heartbeat)
+        self.heartbeat.start(int(1000*watchdog.interval))
+        watchdog.start()
+
     def checkaction(self, checked=False):
         if checked:
             self.savebytes=True
@@ -1103,6 +2555,53 @@ class MainWindow(QMainWindow):
             self.savebytes=False
     
 
+    def cycleSnapping(self):
+        scene=self.viewer.scene
+        scene.setSnapMode((scene.snapMode+1) % 3)
+        self.statusbar.showMessage('Snapping: {}'.format(['off', 'vertices', 'vertices and edges'][scene.snapMode]), 3000)
+
+    def setWandTolerance(self):
+        scene=self.viewer.scene
+        tolerance, ok = QInputDialog.getInt(self, 'Magic wand', 'Color tolerance (0-255):', scene.wandTolerance, 0, 255)
+        if ok:
+            scene.wandTolerance=tolerance
+
+    def adjustContrast(self):
+        '''Open the contrast editor; an ordinary photo is switched to the
+        contrast pipeline (over its decoded pixels) first'''
+        viewer=self.viewer
+        if viewer.raster is None:
+            viewer.scene.imagePixels() #restores a released photo
+            image=viewer.scene.image
+            if image is None or image.isNull():
+                return
+            pixels=image_array(image)
+            bands=[2, 1, 0] if pixels.shape[2] == 4 else None #blue, green, red, alpha
+            viewer.setRaster(Contrast(pixels, bands), fit=False)
+        ContrastDialog(viewer.raster, parent=self).exec_()
+
+    def checksimplify(self, checked=False):
+        self.simplifyonsave=checked
+
+    def simplifyShapes(self):
+        tolerance, ok = QInputDialog.getDouble(self, 'Simplify shapes', 'Tolerance (pixels):',
+                                               self.simplifyTolerance, 0.01, 100.0, 2)
+        if not ok:
+            return
+        self.simplifyTolerance=tolerance
+        t0=time.perf_counter()
+        before, after = self.viewer.scene.simplifyShapes(tolerance)
+        self.statusbar.showMessage('Simplified {} to {} vertices ({:.0f}% fewer) in {:.0f} ms'.format(
+            before, after, 100.0*(before-after)/max(before, 1), 1000*(time.perf_counter()-t0)), 5000)
+
+    def checkvirtual(self, checked=False):
+        if checked:
+            self.viewer.scene.virtualize(ShapeStore())
+            self.viewer.updateVirtual()
+        else:
+            self.viewer.scene.devirtualize()
+        self.viewer.scene.update()
+
     def iterateTimer(self):
         self.autosaveSignal.emit()
         self.timer=threading.Timer(self.autosavetime, self.iterateTimer)
@@ -1122,15 +2621,13 @@ class MainWindow(QMainWindow):
                 self.timer=None
                 
     def defaultSave(self):
-        labels=self.labelAssigner()
-        return self.saveFile(os.path.join(self.currentPath, self.imname+'.json'), self.viewer.scene.polys, self.viewer.scene.objtypes,
-                                  labels, [shape.line_color.name() for shape in self.viewer.scene.polys])
+        return self.saveFile(os.path.join(self.currentPath, self.imname+'.json'), *self.viewer.scene.contents())
     
                 
     def openLineWidthSlider(self):
         polys=self.viewer.scene.polys
         if len(polys) > 0:
-            dialog=LineWidthDialog(allshapes=polys, scene=self.viewer.scene)
+            dialog=LineWidthDialog(allshapes=list(polys), scene=self.viewer.scene)
             dialog.exec()
 
     def openEpsilonSlider(self):
@@ -1173,23 +2670,65 @@ class MainWindow(QMainWindow):
         self.viewer.scene.triggerClosure()
 
     def setEditing(self):
-        self.viewer.scene.mode=self.viewer.scene.DRAWING
+        self.viewer.scene.setMode(self.viewer.scene.DRAWING)
+        self.viewer.scene.overrideCursor(CURSOR_DRAW)
+        self.updateStatusBar()
+        return
+
+    def setFreehand(self):
+        self.viewer.scene.setMode(self.viewer.scene.FREEHAND)
+        self.viewer.scene.overrideCursor(CURSOR_DRAW)
+        self.updateStatusBar()
+        return
+
+    def setLivewire(self):
+        self.viewer.scene.setMode(self.viewer.scene.LIVEWIRE)
         self.viewer.scene.overrideCursor(CURSOR_DRAW)
         self.updateStatusBar()
         return
 
     def setMoving(self):
-        self.viewer.scene.mode=self.viewer.scene.MOVING
+        self.viewer.scene.setMode(self.viewer.scene.MOVING)
         self.viewer.scene.overrideCursor(CURSOR_GRAB)
         self.updateStatusBar()
         return
 
     def setNavigating(self):
-        self.viewer.scene.mode=self.viewer.scene.NAVIGATION
+        self.viewer.scene.setMode(self.viewer.scene.NAVIGATION)
         self.viewer.scene.overrideCursor(CURSOR_GRAB)
         self.updateStatusBar()
         return
 
+    def setSelecting(self):
+        self.viewer.scene.setMode(self.viewer.scene.SELECTING)
+        self.viewer.scene.overrideCursor(CURSOR_DEFAULT)
+        self.updateStatusBar()
+        return
+
+    def selectAll(self):
+        self.setSelecting()
+        self.viewer.scene.selectAll()
+
+    def relabelSelection(self):
+        scene=self.viewer.scene
+        if not scene.selection:
+            self.statusbar.showMessage('Select shapes first (selection mode, R)', 3000)
+            return
+        names=[labelclass.name for labelclass in scene.labelclasses]
+        name, ok = QInputDialog.getItem(self, 'Relabel selection', 'Label class:', names, scene.labelmode, False)
+        if ok:
+            scene.relabelMarked(scene.labelclasses[names.index(name)])
+
+    def changeSelectionType(self):
+        scene=self.viewer.scene
+        if not scene.selection:
+            self.statusbar.showMessage('Select shapes first (selection mode, R)', 3000)
+            return
+        objtype, ok = QInputDialog.getItem(self, 'Change type of selection', 'Object type:', ['Polygon', 'Line', 'Point'], 0, False)
+        if ok:
+            changed=scene.changeMarkedType(objtype)
+            self.statusbar.showMessage('{} of {} shapes changed to {}'.format(changed, len(scene.selection), objtype), 3000)
+
     def imagenameDoubleClicked(self, item=None):
         path=self.currentPath+item.text()
         dialog=QMessageBox()
@@ -1215,22 +2754,11 @@ class MainWindow(QMainWindow):
         dialogue.exec()
         savepath=dialogue.selectedFiles()
         if savepath:
-            return self.saveFile(filename=savepath[0], polygons=self.viewer.scene.polys, object_types=self.viewer.scene.objtypes,
-                                 labels=self.labelAssigner(), colors=[shape.line_color.name() for shape in self.viewer.scene.polys])
+            return self.saveFile(savepath[0], *self.viewer.scene.contents())
    
     def labelAssigner(self):
-        if len(self.viewer.scene.labelclasses) > 0:
-            shapetolabel=[]
-            for shape in self.viewer.scene.polys:
-                l=self.viewer.scene.findShapeInLabel(shape)
-                if len(l)>0:
-                    shapetolabel.append(self.viewer.scene.labelclasses[l[0][0]].name)
-                else:
-                    shapetolabel.append(None)
-            
-        else:
-            shapetolabel=len(self.viewer.scene.polys)*[None]
-        return shapetolabel
+        return [shape.labelclass.name if shape.labelclass is not None else None
+                for shape in self.viewer.scene.polys]
         
         
     def selectColor(self):
@@ -1263,7 +2791,16 @@ class MainWindow(QMainWindow):
         self.labelListWidget.clear()
         [self.labelListWidget.addItem(label) for label in labellist]
         [self.labelListWidget.item(i).setForeground(colors[i]) for i in range(len(colors))]
+        self.refreshLabelCounts()
         return
+
+    def refreshLabelCounts(self):
+        '''Show the number of objects of each class as the label list tooltip'''
+        counts=self.viewer.scene.labelCounts()
+        for i, labelclass in enumerate(self.viewer.scene.labelclasses):
+            item=self.labelListWidget.item(i)
+            if item is not None:
+                item.setToolTip('{} objects'.format(counts.get(labelclass, 0)))
     
 
     def populateImageList(self):
@@ -1300,9 +2837,18 @@ class MainWindow(QMainWindow):
    "Select label file", self.currentPath+self.imname+'.json', "Label Files (*.json)")[0]
                     self.loadjson(labelfilepath)
             
-            image = QImage.fromData(self.imageData)
-            self.imsizes=(image.size().width(), image.size().height())
-            self.viewer.setPhoto(QPixmap.fromImage(image))
+            raster = read_raster(self.imageData)
+            if raster is None:
+                image = QImage.fromData(self.imageData)
+                self.imsizes=(image.size().width(), image.size().height())
+                self.viewer.setPhoto(QPixmap.fromImage(image))
+                self.viewer.scene.setImage(image)
+            else:
+                contrast=Contrast(raster)
+                self.imsizes=(contrast.width, contrast.height)
+                self.viewer.setRaster(contrast)
+                scale=np.mean([high-low for low, high in contrast.windows])/255.0
+                self.viewer.scene.setImage(None, raster, max(scale, 1e-9))
 
             self.loadShapes(self.shapestoload, self.object_types)
             self.populateLabelList()
@@ -1310,6 +2856,7 @@ class MainWindow(QMainWindow):
             self.annotationscene.imageData=self.imageData
             self.annotationscene.imsizes=self.imsizes
             self.updateStatusBar()
+            self.updateMemory()
             
             if self.autosave and (self.timer is not None):
                 self.timer.cancel()
@@ -1319,40 +2866,49 @@ class MainWindow(QMainWindow):
 
     def loadjson(self, filename, jsonfile=False):
         try:
-            with open(filename, 'rb') as f:
-                
-                data = json.load(f)
-                self.lineColor = data['lineColor']
-                self.shapestoload = data['objects']
-                self.object_types = data['type']
-                self.labels = data['label']
-                
-                
-                if jsonfile:
-                    self.imagePath = data['imagePath']
-                    if 'imageData' in data:
-                        self.imageData = b64decode(data['imageData'])
-                    else:
-                        self.imageData=process(self.imagePath, None)
-                        if self.imageData is None:
-                            self.imagePath = QFileDialog.getOpenFileName(self,
+            annotation = read_json(filename)
+        except (OSError, ValueError, KeyError):
+            return
+        self.lineColor = annotation.colors
+        self.shapestoload = annotation.objects
+        self.object_types = annotation.types
+        self.labels = annotation.labels
+
+        if jsonfile:
+            self.imagePath = annotation.imagePath
+            if annotation.imageData is not None:
+                self.imageData = annotation.imageData
+            else:
+                self.imageData=process(self.imagePath, None)
+                if self.imageData is None:
+                    self.imagePath = QFileDialog.getOpenFileName(self,
    "Please select corresponding image", "Images")[0]
-                            self.imageData=process(self.imagePath, None)
-                    
-        except:
-            pass
+                    self.imageData=process(self.imagePath, None)
 
 
     def resetState(self):
-        if self.imageData:
+        if self.imsizes is not None:
+            self.imsizes=None
             self.imageData=None
             self.shapestoload=None
             self.object_types=None
-            self.viewer.scene.objtypes=[]
+            self.viewer.scene.clearWire()
+            self.viewer.setRaster(None)
             [self.viewer.scene.removeItem(item) for item in self.viewer.scene.items()[:-1]]
-            self.viewer.scene.polys=[]
+            self.viewer.scene.polys={}
+            self.viewer.scene.selection={}
+            self.viewer.scene.band=None
+            self.viewer.scene.setSnapMode(self.viewer.scene.snapMode)
+            self.viewer.scene.virtual=None
+            self.viewer.scene.history.clear()
+            self.viewer.scene.editOrigin=None
+            self.viewer.scene.setImage(None)
+            if self.autovirtual:
+                self.virtualaction.setChecked(False)
+                self.autovirtual=False
             for labelclass in self.viewer.scene.labelclasses:
-                labelclass.polygons=[]
+                labelclass.polygons={}
+            self.viewer.scene.shapesChanged.emit()
             self.viewer.scene.update()
             self.viewer.viewport().update()
             return
@@ -1360,30 +2916,41 @@ class MainWindow(QMainWindow):
     def loadShapes(self, polygons, types):
         if self.shapestoload:
             
-            if isinstance(self.lineColor[0],str):
-                self.lineColor=[QColor(color) for color in self.lineColor]
+            colors=[color if isinstance(color,str) else color.name() for color in self.lineColor]
             self.viewer.scene.labelclasses=[]
-            labellist=list(zip(self.labels, self.lineColor))
-            labellistuniques=[]
-            [labellistuniques.append(x) for x in labellist if x not in labellistuniques]
-            labellistuniques=list(zip(*labellistuniques))
-            self.labelnames,self.labelcolors = list(labellistuniques[0]),list(labellistuniques[1])
+            labellistuniques=list(dict.fromkeys(zip(self.labels, colors))) #linear, order preserving
+            self.labelnames=[name for name, color in labellistuniques]
+            self.labelcolors=[QColor(color) for name, color in labellistuniques]
             self.initlabclasses()
             labeldict={self.labelnames[c]: label for c,label in enumerate(self.viewer.scene.labelclasses)}
-            
+
+            if self.virtualaction.isChecked() or len(polygons) >= self.virtualThreshold:
+                self.autovirtual=not self.virtualaction.isChecked()
+                self.virtualaction.setChecked(True)
+                self.viewer.scene.virtualize(ShapeStore(polygons, types, [labeldict[label] for label in self.labels]))
+                self.viewer.updateVirtual()
+                return
+
+            progress=None
+            if len(polygons) >= self.progressThreshold:
+                progress=QProgressDialog('Loading {} objects...'.format(len(polygons)), None, 0, len(polygons), self)
+                progress.setWindowTitle('Loading')
+                progress.setWindowModality(Qt.WindowModal)
+                progress.setMinimumDuration(500)
+
+            shapes=[]
             for ps in range(len(polygons)):
                 polygon=Shape()
-                polygon.points=[QPointF(p[0], p[1]) for p in polygons[ps]]
-                
-                objtype=types[ps]
-                if objtype=='Polygon':
-                    polygon.closed=True
-                polygon.objtype=objtype
-                
-                self.viewer.scene.polys.append(polygon)
-                self.viewer.scene.objtypes.append(objtype)
-                self.viewer.scene.addItem(polygon)
+                polygon.setPoints(polygons[ps])
+                polygon.objtype=types[ps]
+                polygon.closed=types[ps]=='Polygon'
                 labeldict[self.labels[ps]].assignObject(polygon)
+                shapes.append(polygon)
+
+            self.viewer.scene.addShapes(shapes, progress.setValue if progress else None)
+            if progress is not None:
+                progress.setValue(len(polygons))
+            self.viewer.scene.shapesChanged.emit()
 
 
     def saveFile(self, filename, polygons, object_types, labels, colors):
@@ -1393,20 +2960,54 @@ class MainWindow(QMainWindow):
         self.annotationscene.object_types=object_types
         self.annotationscene.labels=labels
         self.annotationscene.savebytes=self.savebytes
+        if self.savebytes and self.imageData is None:
+            #released after decoding, see releaseImageData
+            self.imageData=process(self.imagePath, None)
+            self.annotationscene.imageData=self.imageData
+        self.annotationscene.simplifyTolerance=self.simplifyTolerance if self.simplifyonsave else None
         self.annotationscene.save()
         self.populateImageList()
         self.updateStatusBar(saving=True)
 
+
+#Handlers timed when instrumentation is on (PYIMANNOTATE_PROFILE=trace.json or --profile)
+INSTRUMENTED = [(SubQGraphicsScene, 'mousePressEvent', 'press'),
+                (SubQGraphicsScene, 'mouseMoveEvent', 'move'),
+                (Shape, 'paint', 'paint'),
+                (QViewer, 'wheelEvent', 'wheel'),
+                (MainWindow, 'handleOpen', 'open'),
+                (MainWindow, 'saveFile', 'save')]
+
 if __name__ == '__main__':
 
+    tracefile = os.environ.get('PYIMANNOTATE_PROFILE')
+    if '--profile' in sys.argv:
+        sys.argv.remove('--profile')
+        tracefile = tracefile or 'pyimannotate_trace.json'
+    if tracefile:
+        profiler.enable(INSTRUMENTED, tracefile)
+
+    stallfile = os.environ.get('PYIMANNOTATE_WATCHDOG')
+    stallms = None
+    for arg in [arg for arg in sys.argv if arg.split('=')[0] == '--watchdog']:
+        sys.argv.remove(arg)
+        stallfile = stallfile or 'pyimannotate_stalls.log'
+        if '=' in arg:
+            stallms = float(arg.split('=', 1)[1])
+    if stallfile:
+        watchdog.enable(stallfile, stallms/1000.0 if stallms else None)
+
     app = QApplication(sys.argv)
+    if profiler.enabled:
+        app.aboutToQuit.connect(profiler.dump)
+    if watchdog.enabled:
+        app.aboutToQuit.connect(watchdog.stop)
     
     
     app.setStyleSheet("QToolButton { background-color: gray; }\n"
               "QToolButton:pressed { background-color: green; }\n"
               "QToolButton:hover { color: white }\n")
-    app.setWindowIcon(QIcon(QPixmap.fromImage(QImage.fromData(iconbytes))))
-    #app.setWindowIcon(QIcon('icon.PNG'))
+    app.setWindowIcon(QIcon(ICONPATH))
     window = MainWindow()
     window.setWindowTitle('pyimannotate')
     #window.setWindowState(Qt.WindowFullScreen)
@@ -1421,4 +3022,5 @@ if __name__ == '__main__':
         ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID(myappid)
         
     window.show()
+    QTimer.singleShot(0, window.reportStartup)
     sys.exit(app.exec_())
@@ -0,0 +1,267 @@
+'''
+Display pipeline for high-bit-depth and multi-band imagery (16-bit GeoTIFFs,
+4+ band satellite scenes), which QImage cannot show usefully.
+
+read_raster decodes such images into an (H, W, C) array and keeps the raw
+values. A Contrast maps up to three of its bands to red, green and blue
+through a window per band (window/level, or a percentile stretch read off
+histograms of a pixel sample). For 8 and 16-bit data the window becomes a
+lookup table, so stretching a tile is one np.take per band. A RasterItem
+draws the result tile by tile: only tiles in the exposed area are rendered
+(subsampled when zoomed out) and rendered tiles are cached until the window
+changes, so dragging a contrast slider never touches off-screen pixels.
+
+tifffile and Pillow are optional. Without them TIFFs are decoded by Qt's
+image plugins, which cover 16-bit gray and RGBA images.
+'''
+
+from collections import OrderedDict
+from io import BytesIO
+import math
+
+import numpy as np
+from PyQt5.QtCore import QBuffer, QByteArray, QRectF
+from PyQt5.QtGui import QImage, QImageReader
+from PyQt5.QtWidgets import QGraphicsItem
+
+from imagebridge import array_image, image_array
+
+try:
+    import tifffile
+except ImportError:
+    tifffile = None
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+TIFF_MAGIC = (b'II*\x00', b'MM\x00*', b'II+\x00', b'MM\x00+')
+#Pillow modes and Qt formats of images QImage displays as they are
+PLAIN_MODES = ('1', 'L', 'P', 'RGB', 'RGBA', 'CMYK', 'YCbCr', 'LA', 'PA', 'RGBX')
+WIDE_FORMATS = tuple(getattr(QImage, name) for name in ('Format_Grayscale16', 'Format_RGBA64')
+                     if hasattr(QImage, name))
+
+
+def _bands_last(array):
+    '''(H, W, C) view of a decoded array: gray images get one band, planar
+    (C, H, W) stacks are transposed and extra pages dropped'''
+    while array.ndim > 3:
+        array = array[0]
+    if array.ndim == 2:
+        return array[:, :, np.newaxis]
+    if array.shape[0] < min(array.shape[1:]) and array.shape[0] <= 16 and array.shape[2] > 16:
+        return np.moveaxis(array, 0, -1)
+    return array
+
+
+def read_raster(data):
+    '''(H, W, C) array of the raw values of an image (file bytes) that needs
+    the display pipeline: more than 8 bits per sample, or bands other than
+    gray, RGB and RGBA. None for the images QImage shows directly and for
+    undecodable data. Plain images are recognized from their headers
+    without decoding the pixels
+    '''
+    if not data:
+        return None
+    array = None
+    if data[:4] in TIFF_MAGIC and tifffile is not None:
+        try:
+            with tifffile.TiffFile(BytesIO(data)) as tif:
+                page = tif.pages[0]
+                if page.dtype == np.uint8 and page.samplesperpixel in (1, 3, 4):
+                    return None
+                array = tif.asarray()
+        except Exception:
+            array = None
+    if array is None and Image is not None:
+        try:
+            with Image.open(BytesIO(data)) as image:
+                if image.mode in PLAIN_MODES:
+                    return None
+                array = np.asarray(image)
+        except Exception:
+            array = None
+    if array is None:
+        buffer = QBuffer()
+        buffer.setData(QByteArray(data))
+        reader = QImageReader(buffer)
+        if reader.imageFormat() not in WIDE_FORMATS:
+            return None
+        image = reader.read()
+        if image.isNull():
+            return None
+        array = image_array(image)
+    array = _bands_last(array)
+    if array.dtype == np.uint8 and array.shape[2] in (1, 3, 4):
+        return None
+    return array
+
+
+class Contrast(object):
+    '''Maps the bands (at most three: gray or red, green, blue) of an
+    (H, W, C) array to 8-bit display values through a window (low, high)
+    per band. Windows come from setWindow or from stretch, which reads
+    percentiles off cumulative histograms of a sample of about samples
+    pixels, so a stretch costs the same on any image size. version changes
+    with every new mapping
+    '''
+    bins = 4096 #histogram bins of non-integer and wide-integer data
+
+    def __init__(self, data, bands=None, samples=2**18):
+        self.data = data if data.ndim == 3 else data[:, :, np.newaxis]
+        self.height, self.width, self.nbands = self.data.shape
+        step = max(1, int(math.ceil(math.sqrt(self.height*self.width/float(samples)))))
+        self.sample = self.data[::step, ::step]
+        self.histograms = {}
+        self.version = 0
+        self.luts = {}
+        self.lower, self.upper = 2.0, 98.0
+        self.setBands(bands)
+
+    def setBands(self, bands=None):
+        '''Bands shown as gray (one) or red, green, blue (three)'''
+        if bands is None:
+            bands = [0, 1, 2] if self.nbands >= 3 else [0]
+        self.bands = list(bands)
+        self.stretch(self.lower, self.upper)
+
+    def histogram(self, band):
+        '''Edges and cumulative counts of the sampled values of band'''
+        if band not in self.histograms:
+            values = self.sample[:, :, band].ravel()
+            if values.dtype.kind == 'f':
+                values = values[np.isfinite(values)]
+            if not len(values):
+                values = np.zeros(1)
+            low, high = float(values.min()), float(values.max())
+            if values.dtype.kind in 'iub' and high - low < self.bins:
+                #one bin per integer value
+                counts = np.bincount((values.astype(np.int64) - int(low)))
+                edges = np.arange(int(low), int(low) + len(counts) + 1, dtype=np.float64)
+            else:
+                counts, edges = np.histogram(values, bins=self.bins, range=(low, max(high, low+1)))
+            self.histograms[band] = (edges, np.cumsum(counts))
+        return self.histograms[band]
+
+    def percentile(self, band, percent):
+        edges, cumulative = self.histogram(band)
+        i = int(np.searchsorted(cumulative, cumulative[-1]*percent/100.0))
+        return float(edges[min(i, len(edges)-1)] if percent < 100 else edges[-1])
+
+    def stretch(self, lower=2.0, upper=98.0):
+        '''Window every shown band between its lower and upper percentiles'''
+        self.lower, self.upper = lower, upper
+        windows = []
+        for band in self.bands:
+            low, high = self.percentile(band, lower), self.percentile(band, upper)
+            windows.append((low, max(high, low + 1e-9)))
+        self.setWindow(windows)
+
+    def setWindow(self, windows):
+        '''(low, high) per shown band: low and below become 0, high and above 255'''
+        self.windows = [(float(low), float(high)) for low, high in windows]
+        self.luts = {}
+        self.version += 1
+
+    def lut(self, i):
+        '''Lookup table of shown band i, indexed by the raw values (reinterpreted
+        as unsigned), for 8 and 16-bit integer data; None for other types'''
+        dtype = self.data.dtype
+        if dtype.kind not in 'iu' or dtype.itemsize > 2:
+            return None
+        if i not in self.luts:
+            unsigned = np.dtype('u{}'.format(dtype.itemsize))
+            values = np.arange(2**(8*dtype.itemsize), dtype=unsigned).view(dtype)
+            self.luts[i] = self.scale(i, values)
+        return self.luts[i]
+
+    def scale(self, i, values):
+        low, high = self.windows[i]
+        scaled = (values.astype(np.float32) - low)*(255.0/(high - low))
+        return np.nan_to_num(np.clip(scaled, 0, 255)).astype(np.uint8)
+
+    def render(self, x0, y0, x1, y1, step=1):
+        '''Blue, green, red, alpha array of the pixels [y0:y1:step, x0:x1:step]'''
+        block = self.data[y0:y1:step, x0:x1:step]
+        out = np.empty(block.shape[:2] + (4,), dtype=np.uint8)
+        out[:, :, 3] = 255
+        for i, band in enumerate(self.bands):
+            values = block[:, :, band]
+            lut = self.lut(i)
+            if lut is not None:
+                shown = np.take(lut, values.view('u{}'.format(values.itemsize)))
+            else:
+                shown = self.scale(i, values)
+            if len(self.bands) == 1:
+                out[:, :, 0] = out[:, :, 1] = out[:, :, 2] = shown
+            else:
+                out[:, :, 2-i] = shown
+        return out
+
+
+class RasterItem(QGraphicsItem):
+    '''Scene item drawing a Contrast mapping of an image in tiles of tile x
+    tile screen pixels. Tiles are rendered only when exposed, from every
+    2**level-th pixel when zoomed out, and the last cacheTiles rendered tiles
+    are kept until the mapping changes
+    '''
+    tile = 256
+    cacheTiles = 256
+
+    def __init__(self, contrast, parent=None):
+        super(RasterItem, self).__init__(parent)
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption, True)
+        self.contrast = contrast
+        self.cache = OrderedDict()
+
+    def boundingRect(self):
+        return QRectF(0, 0, self.contrast.width, self.contrast.height)
+
+    def refresh(self):
+        '''Drop the rendered tiles and repaint the visible ones'''
+        self.cache.clear()
+        self.update()
+
+    def tileImage(self, tx, ty, level):
+        key = (tx, ty, level, self.contrast.version)
+        image = self.cache.get(key)
+        if image is None:
+            step = 2**level
+            span = self.tile*step
+            x0, y0 = tx*span, ty*span
+            x1, y1 = min(x0+span, self.contrast.width), min(y0+span, self.contrast.height)
+            image = array_image(self.contrast.render(x0, y0, x1, y1, step), QImage.Format_RGB32)
+            self.cache[key] = image
+            while len(self.cache) > self.cacheTiles:
+                self.cache.popitem(last=False)
+        else:
+            self.cache.move_to_end(key)
+        return image
+
+    def paint(self, painter, option, widget):
+        lod = option.levelOfDetailFromTransform(painter.worldTransform())
+        level = max(0, int(math.floor(math.log2(1.0/lod)))) if lod > 0 else 0
+        span = self.tile*2**level
+        exposed = option.exposedRect.intersected(self.boundingRect())
+        if exposed.isEmpty():
+            return
+        width, height = self.contrast.width, self.contrast.height
+        for ty in range(int(exposed.top())//span, int(math.ceil(exposed.bottom()))//span + 1):
+            for tx in range(int(exposed.left())//span, int(math.ceil(exposed.right()))//span + 1):
+                x0, y0 = tx*span, ty*span
+                if x0 >= width or y0 >= height:
+                    continue
+                target = QRectF(x0, y0, min(span, width-x0), min(span, height-y0))
+                painter.drawImage(target, self.tileImage(tx, ty, level))
+
+    def nbytes(self):
+        return sum(image.byteCount() for image in self.cache.values())
+
+    def evict(self, nbytes):
+        '''Drop the least recently drawn tiles until nbytes are freed.
+        Returns the bytes freed'''
+        freed = 0
+        while self.cache and freed < nbytes:
+            freed += self.cache.popitem(last=False)[1].byteCount()
+        return freed
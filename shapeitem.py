@@ -0,0 +1,311 @@
+'''
+Shape, the graphics item of one annotated object, shared by pyimannotate and
+pyimannotate2, with the ShapeStyle it paints with.
+
+Vertices live in an (N, 2) NumPy array; the QPolygonF and painter paths are
+built from it only after the geometry changes. This module needs PyQt5 and
+annotationcore only, so the first application can use Shape without loading
+the rest of pyimannotate2.
+'''
+
+import math
+
+import numpy as np
+from PyQt5.QtCore import QPointF, Qt
+from PyQt5.QtGui import QBrush, QColor, QPainterPath, QPen, QPolygonF
+from PyQt5.QtWidgets import QGraphicsItem
+
+from annotationcore import as_points, simplify
+
+
+def toPolygonF(coords):
+    '''QPolygonF filled straight from an (N, 2) float64 array, without creating
+    a QPointF per vertex (QPointF is two qreals, i.e. doubles on desktop platforms)
+    '''
+    n = len(coords)
+    polygon = QPolygonF(n)
+    if n:
+        ptr = polygon.data()
+        ptr.setsize(16*n)
+        np.frombuffer(ptr, np.float64).reshape(n, 2)[:] = coords
+    return polygon
+
+
+class ShapeStyle(object):
+    '''Pens and brushes of a group of shapes (a label class). Shapes refer to a
+    style instead of holding their own, so a color or width change is one update
+    for the whole class and painting does not allocate. Shared styles are
+    copied (see Shape.ownStyle) before a per-shape change
+    '''
+    select_color = QColor(255, 255, 255)
+    vertex_color = QColor(0, 255, 0, 255)
+    hvertex_color = QColor(255, 0, 0)
+
+    def __init__(self, color=None, width=1.5, shared=True):
+        self.shared=shared
+        self.color=None
+        self.width=None
+        self.vertex_brush=QBrush(self.vertex_color)
+        self.hvertex_brush=QBrush(self.hvertex_color)
+        self.setStyle(QColor(0, 6, 255) if color is None else color, width)
+
+    def setStyle(self, color=None, width=None):
+        '''Update color and/or width, rebuilding the pens only on a change'''
+        color = self.color if color is None else QColor(color)
+        width = self.width if width is None else width
+        if color == self.color and width == self.width:
+            return
+        self.color, self.width = color, width
+        self.pen=QPen(color)
+        self.pen.setWidthF(width/2)
+        self.select_pen=QPen(self.select_color)
+        self.select_pen.setWidthF(width/2)
+        self.mark_pen=QPen(self.select_color)
+        self.mark_pen.setWidthF(width)
+        self.mark_pen.setStyle(Qt.DashLine)
+
+    def copy(self):
+        return ShapeStyle(self.color, self.width, shared=False)
+
+
+def detailTolerance(lod, pixels):
+    '''Simplification tolerance (scene units) for drawing within pixels screen
+    pixels at level of detail lod, rounded down to a power of two so that
+    simplified outlines are reused while zooming'''
+    return 2.0**math.floor(math.log2(pixels/lod))
+
+
+class Shape(QGraphicsItem):
+    '''The main class controlling shape's points, its color, highlight behavior.
+    Vertices live in a contiguous (N, 2) NumPy array in scene coordinates; the
+    QPolygonF and painter paths are rebuilt only after the geometry changes.
+    Color and line width come from a ShapeStyle, usually the label class one.
+    Shapes with many vertices are drawn simplified to renderTolerance screen
+    pixels (Douglas-Peucker) unless a vertex is highlighted
+    '''
+    style = ShapeStyle()
+    hsize = 3.0
+    renderTolerance = 0.5 #screen pixels, None draws every vertex
+    lodMinVertices = 32 #shapes with fewer vertices are always drawn in full
+
+    def __init__(self, line_color=None, point_size=None, parent=None):
+        super(Shape, self).__init__(parent)
+        self._buf = np.zeros((8, 2))
+        self._n = 0
+        self._polygon = None
+        self._paths = None
+        self._lod = None
+        self.selected = False
+        self.marked = False #part of the scene's multi-selection
+        self.hIndex = None
+        self.setFlag(QGraphicsItem.ItemIsSelectable, True)
+        self.setFlag(QGraphicsItem.ItemIsMovable, True)
+        self.closed = False
+        self.points_adjusted=None
+        self.objtype=None
+        self.label=None
+        self.labelclass=None
+        self.storeIndex=None #position in the ShapeStore of a virtualized scene
+        self.editable=False
+        
+        if line_color is not None or point_size is not None:
+            self.style=ShapeStyle(line_color, point_size or self.style.width, shared=False)
+
+    def ownStyle(self):
+        '''The shape's own style, detached from a shared one if needed'''
+        if self.style.shared:
+            self.style=self.style.copy()
+        return self.style
+
+    @property
+    def line_color(self):
+        return self.style.color
+
+    @line_color.setter
+    def line_color(self, color):
+        if color != self.style.color:
+            self.ownStyle().setStyle(color=color)
+
+    @property
+    def point_size(self):
+        return self.style.width
+
+    @point_size.setter
+    def point_size(self, width):
+        if width != self.style.width:
+            self.ownStyle().setStyle(width=width)
+
+    @property
+    def coords(self):
+        '''(N, 2) view of the vertices, scene coordinates'''
+        return self._buf[:self._n]
+
+    def setPoints(self, points):
+        '''Replace all vertices. Arrays are taken over without copying'''
+        self.prepareGeometryChange()
+        self._buf = as_points(points)
+        self._n = len(self._buf)
+        self.geometryChanged()
+
+    def geometryChanged(self):
+        self._polygon = None
+        self._paths = None
+        self._lod = None
+        #the snapping index of pyimannotate2's scene; pyimannotate's scene has none
+        snapChanged = getattr(self.scene(), 'snapChanged', None)
+        if snapChanged is not None:
+            snapChanged(self)
+
+    def addPoint(self, point):
+        self.setSelected(True)
+        if self._n and point == self[0]:
+            self.closed = True
+        else:
+            self.prepareGeometryChange()
+            if self._n == len(self._buf):
+                self._buf = np.concatenate((self._buf, np.zeros((max(8, self._n), 2))))
+            self._buf[self._n] = (point.x(), point.y())
+            self._n += 1
+            self.geometryChanged()
+
+    def popPoint(self):
+        if self._n:
+            self.prepareGeometryChange()
+            self._n -= 1
+            self.geometryChanged()
+            return QPointF(*self._buf[self._n])
+        return None
+
+    def polygon(self):
+        '''Vertices as a QPolygonF in item coordinates (cached)'''
+        offset = self.pos()
+        if self._polygon is None or self._polygon[0] != offset:
+            self._polygon = (offset, toPolygonF(self.coords - (offset.x(), offset.y())))
+            self._paths = None
+        return self._polygon[1]
+
+    def paths(self):
+        '''Outline and vertex marker paths, rebuilt only when the geometry,
+        closure, highlighted vertex or point size changed'''
+        polygon = self.polygon()
+        key = (self.closed, self.hIndex, self.point_size)
+        if self._paths is None or self._paths[0] != key:
+            path = QPainterPath()
+            path.addPolygon(polygon)
+            if self.closed == True:
+                path.closeSubpath()
+            vertex_path=QPainterPath()
+            self.drawVertex(vertex_path, 0)
+            [self.drawVertex(vertex_path, i) for i in range(self._n)]
+            self._paths = (key, path, vertex_path)
+        return self._paths[1:]
+
+    def lodPaths(self, tolerance):
+        '''Outline and vertex marker paths of the shape simplified to tolerance
+        (scene units), cached until the geometry or the tolerance changes'''
+        offset = self.pos()
+        key = (tolerance, self.closed, self.point_size, offset.x(), offset.y())
+        if self._lod is None or self._lod[0] != key:
+            coords = simplify([self.coords], tolerance, self.closed)[0]
+            polygon = toPolygonF(coords - (offset.x(), offset.y()))
+            path = QPainterPath()
+            path.addPolygon(polygon)
+            if self.closed == True:
+                path.closeSubpath()
+            vertex_path = QPainterPath()
+            psize = self.point_size
+            vertex_path.addEllipse(polygon[0], psize, psize)
+            [vertex_path.addEllipse(polygon[i], psize, psize) for i in range(len(polygon))]
+            self._lod = (key, path, vertex_path)
+        return self._lod[1:]
+
+    def paint(self, painter, option, widget):
+
+        if self._n:
+            style = self.style
+            painter.setPen(style.select_pen if self.selected else style.mark_pen if self.marked else style.pen)
+            if self.renderTolerance and self._n >= self.lodMinVertices and self.hIndex is None:
+                lod = option.levelOfDetailFromTransform(painter.worldTransform())
+                path, vertex_path = self.lodPaths(detailTolerance(lod, self.renderTolerance))
+            else:
+                path, vertex_path = self.paths()
+            painter.drawPath(path)
+            painter.drawPath(vertex_path)
+            painter.fillPath(vertex_path, style.vertex_brush if self.hIndex is None else style.hvertex_brush)
+
+
+    def drawVertex(self, path, index):
+        psize = self.point_size
+        if index == self.hIndex:
+            psize = self.hsize
+        path.addEllipse(self._polygon[1][index], psize, psize)
+ 
+
+    def shape(self):
+        path = QPainterPath()
+        path.addPolygon(self.polygon())
+        return path
+
+    def boundingRect(self):
+        #vertex markers and half the pen reach beyond the polygon itself
+        margin = max(self.hsize, self.point_size) + self.point_size/2 + 1
+        return self.polygon().boundingRect().adjusted(-margin, -margin, margin, margin)
+
+    def moveBy(self, tomove, delta):
+        if tomove=='all':
+            self.translateBy(delta.x(), delta.y())
+        else:
+            self.prepareGeometryChange()
+            self._buf[tomove] += (delta.x(), delta.y())
+            self.geometryChanged()
+
+    def translateBy(self, dx, dy):
+        self.prepareGeometryChange()
+        self.coords[:] += (dx, dy)
+        self.geometryChanged()
+
+    def scaleBy(self, sx, sy=None, origin=None):
+        '''Scale about origin (default: the bounding box center)'''
+        if sy is None:
+            sy = sx
+        coords = self.coords
+        if origin is None:
+            origin = (coords.min(axis=0) + coords.max(axis=0))/2
+        self.prepareGeometryChange()
+        coords[:] = (coords - origin)*(sx, sy) + origin
+        self.geometryChanged()
+
+    def transformBy(self, matrix):
+        '''Apply a 2x3 affine matrix [[a, b, tx], [c, d, ty]] to every vertex'''
+        matrix = np.asarray(matrix, dtype=np.float64)
+        self.prepareGeometryChange()
+        self.coords[:] = self.coords.dot(matrix[:, :2].T) + matrix[:, 2]
+        self.geometryChanged()
+
+    def state(self):
+        '''Copy of the vertices, type, closure and label class'''
+        return (self.coords.copy(), self.objtype, self.closed, self.labelclass)
+
+    def setState(self, state):
+        coords, self.objtype, self.closed, labelclass = state
+        self.setPoints(coords.copy())
+        if labelclass is not None:
+            labelclass.assignObject(self)
+
+    def highlightVertex(self, index):
+        self.hIndex = index
+
+    def highlightClear(self):
+        self.hIndex = None
+        self.selected = False
+
+    def __len__(self):
+        return self._n
+
+    def __getitem__(self, index):
+        return QPointF(*self.coords[index])
+
+    def __setitem__(self, index, value):
+        self.prepareGeometryChange()
+        self.coords[index] = (value.x(), value.y())
+        self.geometryChanged()
@@ -0,0 +1,121 @@
+'''
+Optional stall watchdog for pyimannotate2.
+
+The Qt event loop beats a heartbeat (a QTimer in MainWindow calling
+heartbeat) every interval seconds. A daemon thread checks the time since
+the last beat and, once it exceeds the threshold, captures the Python stack
+of the event loop thread with sys._current_frames(), so the log shows which
+handler (saveFile, handleOpen, a mouse event...) blocked the interface. The
+stack is sampled again every threshold while the stall lasts (logged only
+when it changed) and the total duration is logged when the loop beats again.
+Records go to a size-capped rotating log. Nothing runs unless enabled.
+'''
+
+import logging
+import logging.handlers
+import sys
+import threading
+import time
+import traceback
+
+
+class Watchdog(object):
+    '''Reports stalls longer than threshold seconds of the thread calling
+    heartbeat to a rotating log file
+    '''
+    def __init__(self, threshold=0.5, interval=0.1, maxBytes=2**20, backupCount=3):
+        self.enabled = False
+        self.threshold = threshold
+        self.interval = interval
+        self.maxBytes = maxBytes
+        self.backupCount = backupCount
+        self.logfile = None
+        self.logger = None
+        self.thread = None
+        self.stopped = threading.Event()
+        self.lock = threading.Lock() #guards lastBeat, stallStart and lastStack across the two threads
+        self.threadId = None
+        self.lastBeat = None
+        self.stallStart = None #time of the last beat before the stall being reported
+        self.lastStack = None
+        self.stalls = 0
+
+    def enable(self, logfile, threshold=None):
+        self.logfile = logfile
+        if threshold is not None:
+            self.threshold = threshold
+        self.logger = logging.getLogger('pyimannotate.watchdog')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        handler = logging.handlers.RotatingFileHandler(logfile, maxBytes=self.maxBytes,
+                                                       backupCount=self.backupCount)
+        handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+        self.logger.addHandler(handler)
+        self.enabled = True
+
+    def start(self):
+        '''Watch the calling thread (the one running the event loop), which
+        must call heartbeat every interval from now on'''
+        if not self.enabled or self.thread is not None:
+            return
+        self.threadId = threading.get_ident()
+        self.lastBeat = time.perf_counter()
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.watch, name='watchdog', daemon=True)
+        self.thread.start()
+        self.logger.info('Watching for stalls over {:.0f} ms'.format(1000*self.threshold))
+
+    def stop(self):
+        if self.thread is None:
+            return
+        self.stopped.set()
+        self.thread.join()
+        self.thread = None
+        self.heartbeat()
+        self.logger.info('Stopped, {} stalls'.format(self.stalls))
+
+    def heartbeat(self):
+        now = time.perf_counter()
+        with self.lock:
+            start = self.stallStart
+            self.stallStart = None
+            self.lastStack = None
+            self.lastBeat = now
+        if start is not None:
+            self.logger.warning('Stall ended after {:.0f} ms'.format(1000*(now - start)))
+
+    def watch(self):
+        sampled = None
+        while not self.stopped.wait(self.interval):
+            with self.lock:
+                last = self.lastBeat
+                new = self.stallStart != last
+            stalled = time.perf_counter() - last
+            if stalled < self.threshold or not (new or time.perf_counter() - sampled >= self.threshold):
+                continue
+            stack = self.stack()
+            sampled = time.perf_counter()
+            with self.lock:
+                if self.lastBeat != last:
+                    continue #the loop beat while the stack was taken: that stall is over
+                if new:
+                    self.stallStart = last
+                    self.stalls += 1
+                self.report(stalled, stack)
+
+    def stack(self):
+        '''Formatted stack of the watched thread, None if it has exited'''
+        frame = sys._current_frames().get(self.threadId)
+        if frame is None:
+            return None
+        return ''.join(traceback.format_stack(frame))
+
+    def report(self, stalled, stack):
+        '''Log the stack of a stall still going on (called with the lock held)'''
+        if stack is None or stack == self.lastStack:
+            return
+        self.lastStack = stack
+        self.logger.warning('Event loop stalled for {:.0f} ms in:\n{}'.format(1000*stalled, stack))
+
+
+watchdog = Watchdog()
@@ -0,0 +1,36 @@
+import os
+import sys
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from PyQt5.QtCore import QEvent, QPointF, Qt
+from PyQt5.QtWidgets import QApplication
+
+from benchmark import MouseEvent
+
+
+@pytest.fixture(scope='session')
+def qapp():
+    return QApplication.instance() or QApplication([])
+
+
+class Mouse(object):
+    '''Sends mouse events straight to a scene's handlers'''
+    def __init__(self, scene):
+        self.scene = scene
+
+    def press(self, x, y, buttons=Qt.LeftButton):
+        self.scene.mousePressEvent(MouseEvent(QEvent.GraphicsSceneMousePress, QPointF(x, y), buttons))
+
+    def move(self, x, y, buttons=Qt.NoButton):
+        self.scene.mouseMoveEvent(MouseEvent(QEvent.GraphicsSceneMouseMove, QPointF(x, y), buttons))
+
+    def release(self, x, y):
+        self.scene.mouseReleaseEvent(MouseEvent(QEvent.GraphicsSceneMouseRelease, QPointF(x, y)))
+
+    def click(self, x, y):
+        self.press(x, y)
+        self.move(x, y)
+        self.release(x, y)
@@ -0,0 +1,37 @@
+import json
+import os
+
+from annotation_index import query, update_index
+
+
+def writeLabelFile(path, label='building', offset=0):
+    with open(path, 'w') as f:
+        json.dump({'objects': [[[offset, 0], [offset+10, 0], [offset+10, 10]]], 'type': ['Polygon'],
+                   'label': [label], 'width/height': [100, 100], 'lineColor': ['#ff0000'],
+                   'imagePath': 'a.png'}, f)
+
+
+def test_reindexing_a_directory_keeps_its_siblings(tmp_path):
+    db = str(tmp_path/'labels.sqlite')
+    for name in ('a', 'ab'):
+        os.mkdir(str(tmp_path/name))
+        writeLabelFile(str(tmp_path/name/'x.json'), label=name)
+    assert update_index(db, str(tmp_path/'a')) == (1, 0)
+    assert update_index(db, str(tmp_path/'ab')) == (1, 0)
+    os.remove(str(tmp_path/'a'/'x.json'))
+    assert update_index(db, str(tmp_path/'a')) == (0, 1)
+    assert query(db, count=True) == 1
+    assert query(db, label='ab', count=True) == 1
+
+
+def test_unreadable_files_are_not_parsed_again(tmp_path):
+    db = str(tmp_path/'labels.sqlite')
+    writeLabelFile(str(tmp_path/'good.json'))
+    with open(str(tmp_path/'bad.json'), 'w') as f:
+        f.write('{not json')
+    assert update_index(db, str(tmp_path), workers=1) == (2, 0)
+    assert update_index(db, str(tmp_path), workers=1) == (0, 0)
+    writeLabelFile(str(tmp_path/'bad.json'), offset=50)
+    os.utime(str(tmp_path/'bad.json'), (1, 1))
+    assert update_index(db, str(tmp_path), workers=1) == (1, 0)
+    assert query(db, bbox=(40, 0, 100, 20), count=True) == 1
@@ -0,0 +1,54 @@
+import json
+from base64 import b64encode
+
+from annotationcore import read_json
+from dataset_exporter import export_coco, export_voc, ordered_map
+
+
+def writeLabelFile(path, imageData=None):
+    data = {'objects': [[[0, 0], [10, 0], [10, 10]], [[5, 5], [8, 9]]], 'type': ['Polygon', 'Line'],
+            'label': ['building', 'road'], 'width/height': [100, 50], 'lineColor': ['#ff0000', '#00ff00'],
+            'imagePath': 'images/a.png'}
+    if imageData is not None:
+        data['imageData'] = b64encode(imageData).decode('utf-8')
+    with open(path, 'w') as f:
+        json.dump(data, f)
+
+
+def test_read_json_skips_embedded_image_on_request(tmp_path):
+    writeLabelFile(str(tmp_path/'a.json'), b'\x89PNG' + b'\x00'*100)
+    assert read_json(str(tmp_path/'a.json')).imageData == b'\x89PNG' + b'\x00'*100
+    assert read_json(str(tmp_path/'a.json'), imageData=False).imageData is None
+
+
+def test_export_coco(tmp_path):
+    for name in ('a', 'b', 'c'):
+        writeLabelFile(str(tmp_path/(name + '.json')), b'\x00'*1000)
+    (tmp_path/'settings.json').write_text('{"theme": "dark"}')
+    out = str(tmp_path/'coco.json')
+    for run in range(2): #the second run finds the first export among the label files
+        nimages, nannotations, skipped = export_coco(str(tmp_path), out, workers=2)
+        assert (nimages, nannotations) == (3, 6)
+        assert skipped == [str(tmp_path/'settings.json')]
+    with open(out) as f:
+        coco = json.load(f)
+    assert [image['file_name'] for image in coco['images']] == ['a.png']*3
+    assert [c['name'] for c in coco['categories']] == ['building', 'road']
+    assert coco['annotations'][0]['bbox'] == [0, 0, 10, 10]
+
+
+def test_export_voc_mirrors_subdirectories(tmp_path):
+    labels, out = tmp_path/'labels', tmp_path/'voc'
+    for sub in ('a', 'b'):
+        (labels/sub).mkdir(parents=True)
+        writeLabelFile(str(labels/sub/'duke.json'))
+    (labels/'a'/'broken.json').write_text('{"objects": [')
+    nimages, nannotations, skipped = export_voc(str(labels), str(out), recursive=True, workers=1)
+    assert (nimages, nannotations) == (2, 4)
+    assert skipped == [str(labels/'a'/'broken.json')]
+    assert sorted(str(path.relative_to(out)) for path in out.rglob('*.xml')) == ['a/duke.xml', 'b/duke.xml']
+
+
+def test_ordered_map_keeps_order_with_a_small_window():
+    assert list(ordered_map(abs, range(-50, 0), 2, window=3)) == list(range(50, 0, -1))
+    assert list(ordered_map(abs, [-1, -2], 1)) == [1, 2]
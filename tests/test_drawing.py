@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from conftest import Mouse
+
+SQUARE = [(10, 10), (100, 10), (100, 100), (10, 100)]
+
+
+@pytest.mark.parametrize('module', ['pyimannotate', 'pyimannotate2'])
+def test_draw_polygon(qapp, module):
+    '''Both applications share Shape, so drawing must work with either scene'''
+    app = __import__(module)
+    scene = app.SubQGraphicsScene()
+    scene.mode = scene.DRAWING
+    mouse = Mouse(scene)
+    for x, y in SQUARE:
+        mouse.press(x, y)
+        mouse.move(x + 5, y + 5)
+    mouse.press(11, 11) #within epsilon of the first vertex: closes the polygon
+    assert len(scene.polys) == 1
+    shape = list(scene.polys)[0]
+    assert np.allclose(shape.coords[:4], SQUARE)
+
+
+def test_snapping_follows_reshaped_shapes(qapp):
+    import pyimannotate2
+    scene = pyimannotate2.SubQGraphicsScene()
+    scene.mode = scene.DRAWING
+    mouse = Mouse(scene)
+    for x, y in SQUARE:
+        mouse.press(x, y)
+    mouse.press(10, 10)
+    shape = list(scene.polys)[0]
+    scene.setSnapMode(scene.SNAP_VERTEX)
+    snapped = scene.snapTarget(pyimannotate2.QPointF(103, 98))
+    assert (snapped.x(), snapped.y()) == (100, 100)
+    shape.setPoints(shape.coords + 50) #moves the vertices away from the cursor
+    snapped = scene.snapTarget(pyimannotate2.QPointF(153, 148))
+    assert (snapped.x(), snapped.y()) == (150, 150)
@@ -0,0 +1,108 @@
+import math
+
+import numpy as np
+
+from annotationcore import (GridIndex, SegmentIndex, StrokeSimplifier, connected_component, flood_fill,
+                            points_in_polygon, trace_contours)
+
+
+def test_trace_contours_of_a_square():
+    mask = np.zeros((10, 12), dtype=bool)
+    mask[2:5, 3:7] = True #rows 2-4, columns 3-6
+    contour, = trace_contours(mask)
+    assert sorted(map(tuple, contour.tolist())) == [(3, 2), (3, 5), (7, 2), (7, 5)]
+    #clockwise on screen (y down) means a positive shoelace sum
+    x, y = contour[:, 0], contour[:, 1]
+    assert (x*np.roll(y, -1) - np.roll(x, -1)*y).sum() == 2*12
+
+
+def test_trace_contours_separates_regions_and_drops_holes_and_small_ones():
+    mask = np.zeros((20, 20), dtype=bool)
+    mask[1:9, 1:9] = True
+    mask[4:6, 4:6] = False #a hole
+    mask[12:18, 12:15] = True
+    mask[15, 2] = True #a single pixel
+    contours = trace_contours(mask, min_area=1)
+    assert len(contours) == 2
+    assert sorted(len(c) for c in contours) == [4, 4]
+
+
+def test_connected_component_is_four_connected():
+    mask = np.array([[1, 1, 0, 0],
+                     [0, 1, 0, 1],
+                     [1, 1, 0, 1],
+                     [0, 0, 1, 0]], dtype=bool)
+    region = connected_component(mask, (0, 0))
+    assert region.astype(int).tolist() == [[1, 1, 0, 0],
+                                           [0, 1, 0, 0],
+                                           [1, 1, 0, 0],
+                                           [0, 0, 0, 0]]
+    assert connected_component(mask, (3, 1)).sum() == 2
+
+
+def test_flood_fill_grows_its_window_to_the_whole_region():
+    image = np.zeros((600, 600, 3), dtype=np.uint8)
+    image[100:500, 50:550] = (200, 100, 50)
+    image[300, 300] = (210, 95, 50) #within tolerance
+    region, (x0, y0) = flood_fill(image, (300, 300), 16, window=64)
+    assert region.sum() == 400*500
+    ys, xs = np.nonzero(region)
+    assert (xs.min() + x0, ys.min() + y0, xs.max() + x0, ys.max() + y0) == (50, 100, 549, 499)
+
+
+def test_grid_index_candidates_contain_every_intersecting_box():
+    rng = np.random.default_rng(1)
+    xy = rng.random((500, 2))*1000
+    bbox = np.concatenate((xy, xy + rng.random((500, 2))*40), axis=1)
+    index = GridIndex(bbox)
+    rect = (200, 300, 420, 380)
+    hit = ((bbox[:, 0] <= rect[2]) & (bbox[:, 2] >= rect[0]) & (bbox[:, 1] <= rect[3]) & (bbox[:, 3] >= rect[1]))
+    assert set(np.nonzero(hit)[0]) <= set(index.query(rect).tolist())
+    assert len(index.query((5000, 5000, 6000, 6000))) == 0
+
+
+def test_segment_index_snaps_to_vertices_then_edges():
+    square = [[0, 0], [10, 0], [10, 10], [0, 10]]
+    line = [[20, 0], [30, 0]]
+    index = SegmentIndex([square, line], closed=[True, False])
+    kind, dist2, point, owner = index.nearest((9, 1), 2.0)
+    assert (kind, point, owner) == (0, (10.0, 0.0), 0)
+    kind, dist2, point, owner = index.nearest((5, 11), 2.0)
+    assert (kind, point, owner) == (1, (5.0, 10.0), 0)
+    assert index.nearest((5, 11), 2.0, edges=False) is None
+    kind, dist2, point, owner = index.nearest((-1, 5), 2.0) #the closing edge of the square
+    assert (kind, point) == (1, (0.0, 5.0))
+    assert index.nearest((25, 1), 2.0)[2:] == ((25.0, 0.0), 1)
+    assert index.nearest((35, 0), 2.0) is None #no edge past the end of the open line
+    assert index.nearest((9, 1), 2.0, skip=np.array([True, False])) is None
+
+
+def test_stroke_simplifier_stays_within_tolerance():
+    t = np.linspace(0, 2*math.pi, 2000)
+    stroke = np.stack((100 + 50*np.cos(t) + 3*np.sin(7*t), 100 + 40*np.sin(t)), axis=1)
+    simplifier = StrokeSimplifier(stroke[0, 0], stroke[0, 1], 1.0)
+    for x, y in stroke[1:]:
+        simplifier.push(x, y)
+    vertices = simplifier.finish()
+    assert 10 < len(vertices) < 200
+    #every input point lies within the tolerance of the simplified chain
+    a, b = vertices[:-1], vertices[1:]
+    ab = b - a
+    length2 = np.maximum((ab*ab).sum(axis=1), 1e-12)
+    p = stroke[:, None, :]
+    t = np.clip(((p - a)*ab).sum(axis=2)/length2, 0, 1)
+    distance = np.sqrt((((a + t[:, :, None]*ab) - p)**2).sum(axis=2)).min(axis=1)
+    assert distance.max() <= 1.0 + 1e-9
+
+
+def test_stroke_simplifier_straight_line_becomes_two_vertices():
+    simplifier = StrokeSimplifier(0, 0, 0.5, spacing=1.0)
+    for x in np.arange(0.3, 100, 0.3):
+        simplifier.push(x, 0.1*math.sin(x))
+    assert len(simplifier.finish()) == 2
+
+
+def test_points_in_polygon():
+    triangle = np.array([[0, 0], [10, 0], [0, 10]], dtype=float)
+    inside = points_in_polygon(np.array([[1, 1], [6, 6], [2, 7], [-1, 1]], dtype=float), triangle)
+    assert inside.tolist() == [True, False, True, False]
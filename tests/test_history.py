@@ -0,0 +1,89 @@
+from history import Command, History
+
+
+class Append(Command):
+    '''Appends value to a list; holds size bytes'''
+    def __init__(self, target, value, size=100, refs=()):
+        self.target, self.value, self.size, self._refs = target, value, size, refs
+
+    def undo(self):
+        self.target.remove(self.value)
+
+    def redo(self):
+        self.target.append(self.value)
+
+    def nbytes(self):
+        return self.size
+
+    def refs(self):
+        return self._refs
+
+    def rebind(self, mapping):
+        self._refs = tuple(mapping.get(obj, obj) for obj in self._refs)
+
+
+def record(history, target, value, **kwargs):
+    command = Append(target, value, **kwargs)
+    command.redo()
+    history.push(command)
+
+
+def test_undo_redo_order():
+    history, values = History(), []
+    for i in range(3):
+        record(history, values, i)
+    history.undo()
+    history.undo()
+    assert values == [0]
+    history.redo()
+    assert values == [0, 1]
+    record(history, values, 5) #a new edit drops the redo stack
+    assert not history.canRedo()
+    assert history.undo().value == 5
+
+
+def test_budget_evicts_the_oldest_commands():
+    history, values = History(limit=250), []
+    for i in range(5):
+        record(history, values, i)
+    assert len(history) == 2 and history.nbytes == 200
+    assert history.undo().value == 4
+    assert history.undo().value == 3
+    assert history.undo() is None #older steps were evicted
+    assert values == [0, 1, 2]
+    big = History(limit=10)
+    record(big, [], 'huge', size=1000) #the last command is always kept
+    assert len(big) == 1
+
+
+def test_trim_frees_bytes_but_keeps_the_last_command():
+    history, values = History(), []
+    for i in range(5):
+        record(history, values, i)
+    assert history.trim(150) == 200
+    assert len(history) == 3
+    assert history.trim(10**6) == 200
+    assert len(history) == 1 and history.nbytes == 100
+
+
+def test_forget_drops_commands_on_forgotten_objects_and_older_ones():
+    history, values = History(), []
+    record(history, values, 0)
+    record(history, values, 1, refs=('shape',))
+    record(history, values, 2)
+    history.forget(['shape'])
+    assert len(history) == 1 and history.nbytes == 100
+    assert history.undo().value == 2
+    assert history.undo() is None
+
+
+def test_rebind_reaches_undo_and_redo_commands():
+    history, values = History(), []
+    shape, other = object(), object()
+    record(history, values, 1, refs=(shape,))
+    record(history, values, 2, refs=(other,))
+    record(history, values, 3, refs=(shape, other))
+    history.undo()
+    history.rebind({shape: 7})
+    assert [command.refs() for command in history.undoStack] == [(7,), (other,)]
+    assert history.redoStack[0].refs() == (7, other)
@@ -0,0 +1,62 @@
+import heapq
+
+import numpy as np
+
+from livewire import NEIGHBORS, CostMap, LiveWire
+
+
+def test_costs_are_lowest_on_edges():
+    image = np.zeros((40, 600), dtype=np.uint8)
+    image[:, 300:] = 200
+    costs = CostMap(image)
+    window = costs.window(290, 10, 310, 20) #spans two tiles
+    assert window.shape == (10, 20)
+    assert window[:, 9:11].max() < 2
+    assert np.allclose(window[:, :8], 1 + costs.spread)
+
+
+def test_path_follows_an_edge():
+    rng = np.random.default_rng(3)
+    image = rng.integers(0, 20, (200, 200)).astype(np.uint8)
+    #a step edge between columns 99 and 100 that wanders right halfway down
+    image[:100, 100:] += 150
+    image[100:, 130:] += 150
+    wire = LiveWire(CostMap(image), (100, 40), radius=150)
+    while not wire.expand(budget=1.0):
+        pass
+    path = wire.path(130, 180)
+    assert tuple(path[0]) == (100.5, 40.5) and tuple(path[-1]) == (130.5, 180.5)
+    steps = np.abs(np.diff(path, axis=0))
+    assert steps.max() == 1 and steps.sum(axis=1).min() > 0
+    x, y = path[:, 0] - 0.5, path[:, 1] - 0.5
+    upper, lower = y < 95, y > 105
+    assert np.isin(x[upper], (99, 100)).all()
+    assert np.isin(x[lower], (129, 130)).all()
+
+
+def test_distances_match_dijkstra():
+    rng = np.random.default_rng(5)
+    image = rng.integers(0, 255, (30, 40)).astype(np.uint8)
+    costs = CostMap(image)
+    wire = LiveWire(costs, (12, 9), radius=100, delta=8.0)
+    while not wire.expand(budget=1.0):
+        pass
+    cost = costs.window(0, 0, 40, 30).astype(np.float64)
+    expected = np.full(cost.shape, np.inf)
+    expected[9, 12] = 0.0
+    heap = [(0.0, 12, 9)]
+    while heap:
+        d, x, y = heapq.heappop(heap)
+        if d > expected[y, x]:
+            continue
+        for dx, dy in NEIGHBORS:
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < 40 and 0 <= ny < 30:
+                nd = d + np.hypot(dx, dy)*cost[ny, nx]
+                if nd < expected[ny, nx]:
+                    expected[ny, nx] = nd
+                    heapq.heappush(heap, (nd, nx, ny))
+    dist = wire.dist.reshape(32, 42)[1:-1, 1:-1]
+    assert np.allclose(dist, expected, rtol=1e-5)
+    assert wire.settled(39, 29)
+    assert wire.path(45, 10) is None
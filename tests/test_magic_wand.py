@@ -0,0 +1,51 @@
+import numpy as np
+from PyQt5.QtCore import QPointF
+from PyQt5.QtGui import QColor, QImage, QPainter
+
+from annotationcore import flood_fill
+
+
+def two_squares():
+    '''Gray background with two blue squares, the left one speckled'''
+    image = np.full((120, 200, 3), 90, dtype=np.uint8)
+    image[20:60, 20:60] = (200, 60, 30)
+    image[20:60, 120:160] = (200, 60, 30)
+    image[30:50:4, 30:50:4] = (207, 52, 30) #25 specks
+    return image
+
+
+def test_flood_fill_keeps_to_the_seed_region():
+    region, (x0, y0) = flood_fill(two_squares(), (25, 25), 10)
+    assert (x0, y0) == (0, 0)
+    assert region.sum() == 40*40
+    assert region[20:60, 20:60].all()
+    assert not region[:, 100:].any()
+
+
+def test_flood_fill_tolerance_applies_to_every_channel():
+    image = two_squares()
+    assert flood_fill(image, (25, 25), 7)[0].sum() == 40*40 - 25
+    assert flood_fill(image, (25, 25), 8)[0].sum() == 40*40
+    gray = np.ascontiguousarray(image[:, :, 2]) #the specks only differ in the other channels
+    assert flood_fill(gray, (125, 25), 0)[0].sum() == 40*40
+
+
+def test_magic_wand_outlines_the_clicked_region(qapp):
+    import pyimannotate2
+    scene = pyimannotate2.SubQGraphicsScene()
+    image = QImage(200, 120, QImage.Format_RGB32)
+    image.fill(QColor(90, 90, 90))
+    painter = QPainter(image)
+    painter.fillRect(20, 20, 40, 40, QColor(30, 60, 200))
+    painter.fillRect(120, 20, 40, 40, QColor(30, 60, 200))
+    painter.end()
+    scene.setImage(image)
+    scene.magicWand(QPointF(140.5, 30.5))
+    assert len(scene.polys) == 1
+    shape, = scene.polys
+    assert sorted(map(tuple, shape.coords.tolist())) == [(120, 20), (120, 60), (160, 20), (160, 60)]
+    scene.magicWand(QPointF(5, 5)) #the background touches the image border on every side
+    assert len(scene.polys) == 2
+    scene.history.undo()
+    scene.history.undo()
+    assert len(scene.polys) == 0
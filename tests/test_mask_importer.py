@@ -0,0 +1,44 @@
+import json
+
+import numpy as np
+
+from annotationcore import DEFAULT_COLOR, DEFAULT_LABEL
+from mask_importer import PALETTE, import_masks, mask_to_annotation, parse_labels
+
+
+def test_binary_masks_get_the_default_label():
+    for value in (1, 255):
+        mask = np.zeros((20, 20), dtype=np.uint8)
+        mask[2:6, 2:6] = mask[10:15, 10:15] = value
+        annotation = mask_to_annotation(mask)
+        assert annotation.labels == [DEFAULT_LABEL]*2
+        assert annotation.colors == [DEFAULT_COLOR]*2
+        assert sorted(map(tuple, annotation.objects[0].tolist())) == [(2, 2), (2, 6), (6, 2), (6, 6)]
+
+
+def test_classes_keep_their_name_and_color_in_every_file():
+    one = np.zeros((20, 20), dtype=np.uint8)
+    one[2:6, 2:6] = 3
+    two = one.copy()
+    two[10:15, 10:15] = 5
+    for mask in (one, two):
+        annotation = mask_to_annotation(mask)
+        assert annotation.labels[0] == 'class3'
+        assert annotation.colors[0] == PALETTE[3]
+    assert mask_to_annotation(two).labels == ['class3', 'class5']
+    assert mask_to_annotation(one, parse_labels(['3=roofs'])).labels == ['roofs']
+    assert mask_to_annotation((one > 0).astype(np.uint8), parse_labels(['roofs'])).labels == ['roofs']
+
+
+def test_import_masks(tmp_path):
+    mask = np.zeros((30, 40), dtype=np.uint8)
+    mask[5:10, 5:20] = 2
+    mask[20:25, 30:35] = 1
+    mask[0, 39] = 1
+    np.save(str(tmp_path/'tile.npy'), mask)
+    out = str(tmp_path/'labels')
+    assert import_masks(str(tmp_path/'tile.npy'), out, min_area=1, workers=1) == (1, 2)
+    with open(str(tmp_path/'labels'/'tile.json')) as f:
+        data = json.load(f)
+    assert data['label'] == ['class1', 'class2']
+    assert data['width/height'] == [40, 30]
@@ -0,0 +1,75 @@
+from history import Command, History
+from memory import MemoryAccountant, formatBytes
+
+
+class Buffer(object):
+    '''A releasable buffer of nbytes, recording the releases asked of it'''
+    def __init__(self, nbytes, log, name):
+        self.nbytes = nbytes
+        self.log = log
+        self.name = name
+
+    def size(self):
+        return self.nbytes
+
+    def release(self, excess):
+        freed, self.nbytes = self.nbytes, 0
+        self.log.append(self.name)
+        return freed
+
+
+def test_over_budget_releases_in_registration_order():
+    log = []
+    accountant = MemoryAccountant(limit=1000)
+    tiles, image, pinned = Buffer(300, log, 'tiles'), Buffer(600, log, 'image'), Buffer(500, log, 'pinned')
+    accountant.track('tiles', tiles.size, tiles.release)
+    accountant.track('pinned', pinned.size)
+    accountant.track('image', image.size, image.release)
+    assert accountant.enforce() == 900
+    assert log == ['tiles', 'image']
+    assert accountant.total() == 500
+    assert accountant.released == 900
+    #under the limit nothing more is released
+    tiles.nbytes = 200
+    assert accountant.enforce() == 0 and log == ['tiles', 'image']
+
+
+def test_redundant_buffers_are_always_released():
+    log = []
+    accountant = MemoryAccountant()
+    filebytes, image = Buffer(100, log, 'file'), Buffer(10**9, log, 'image')
+    accountant.track('file', filebytes.size, filebytes.release, redundant=True)
+    accountant.track('image', image.size, image.release)
+    assert accountant.enforce() == 100
+    assert log == ['file']
+    assert accountant.usage() == [('file', 0), ('image', 10**9)]
+    assert accountant.statusText() == 'Memory: 953.7 MB'
+
+
+def test_format_bytes():
+    assert [formatBytes(n) for n in (512, 1536, 5*2**20, 3*2**40)] == ['512 B', '1.5 KB', '5.0 MB', '3072.0 GB']
+
+
+class Step(Command):
+    def __init__(self, size):
+        self.size = size
+
+    def undo(self):
+        pass
+
+    def redo(self):
+        pass
+
+    def nbytes(self):
+        return self.size
+
+
+def test_history_trim_drops_the_oldest_steps_and_keeps_the_last():
+    history = History()
+    steps = [Step(100) for i in range(5)]
+    for step in steps:
+        history.push(step)
+    assert history.trim(150) == 200
+    assert list(history.undoStack) == steps[2:]
+    assert history.trim(10**6) == 200
+    assert list(history.undoStack) == steps[4:]
@@ -0,0 +1,43 @@
+import json
+import os
+import subprocess
+import sys
+
+from conftest import Mouse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_does_not_load_the_second_version():
+    code = ('import sys, pyimannotate; '
+            'print([m for m in ("pyimannotate2", "livewire", "raster", "memory", "stallwatch") if m in sys.modules])')
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen')
+    output = subprocess.check_output([sys.executable, '-c', code], cwd=ROOT, env=env)
+    assert output.decode().strip() == '[]'
+
+
+def test_save_and_reload(qapp, tmp_path):
+    import pyimannotate
+    window = pyimannotate.MainWindow()
+    scene = window.viewer.scene
+    scene.mode = scene.DRAWING
+    mouse = Mouse(scene)
+    for x, y in [(10, 10), (100, 10), (100, 100)]:
+        mouse.press(x, y)
+        mouse.move(x + 5, y + 5)
+    mouse.press(11, 11)
+    window.imsizes = (200, 150)
+    window.annotationscene.imsizes = window.imsizes
+    window.annotationscene.imageData = b'\x89PNG'
+    window.currentPath = str(tmp_path)
+    filename = str(tmp_path/'a.json')
+    window.saveFile(filename, scene.polys, scene.objtypes)
+    with open(filename) as f:
+        data = json.load(f)
+    assert data['objects'] == [[[10, 10], [100, 10], [100, 100]]]
+    assert data['fillColor'] is None and data['width/height'] == [200, 150]
+    assert os.path.exists(str(tmp_path/'a.csv'))
+    reloaded = pyimannotate.MainWindow()
+    reloaded.loadjson(filename)
+    assert reloaded.imageData == b'\x89PNG'
+    assert [obj.tolist() for obj in reloaded.shapestoload] == data['objects']
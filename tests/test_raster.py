@@ -0,0 +1,53 @@
+import numpy as np
+
+from raster import Contrast, _bands_last
+
+
+def test_window_maps_16_bit_endpoints_through_the_lut():
+    data = np.array([[0, 1000, 3000, 5000, 65535]], dtype=np.uint16)
+    contrast = Contrast(data)
+    contrast.setWindow([(1000, 5000)])
+    lut = contrast.lut(0)
+    assert lut.shape == (65536,) and lut.dtype == np.uint8
+    assert lut[[0, 999, 1000, 5000, 5001, 65535]].tolist() == [0, 0, 0, 255, 255, 255]
+    assert lut[3000] == 127
+    shown = contrast.render(0, 0, 5, 1)
+    assert shown[0, :, 0].tolist() == [0, 0, 127, 255, 255]
+    assert (shown[:, :, 0] == shown[:, :, 2]).all() and (shown[:, :, 3] == 255).all()
+
+
+def test_signed_and_float_data():
+    signed = Contrast(np.array([[-500, 0, 500]], dtype=np.int16))
+    signed.setWindow([(-500, 500)])
+    assert signed.render(0, 0, 3, 1)[0, :, 0].tolist() == [0, 127, 255]
+    floats = Contrast(np.array([[0.0, 0.25, np.nan, 2.0]], dtype=np.float32))
+    assert floats.lut(0) is None
+    floats.setWindow([(0.0, 1.0)])
+    assert floats.render(0, 0, 4, 1)[0, :, 0].tolist() == [0, 63, 0, 255]
+
+
+def test_percentile_stretch_of_a_ramp():
+    data = np.arange(10000, dtype=np.uint16).reshape(100, 100)*4
+    contrast = Contrast(data)
+    (low, high), = contrast.windows
+    width = 39996/4096.0 #one histogram bin
+    assert abs(low - 800) <= width and abs(high - 39200) <= width
+    contrast.stretch(0, 100)
+    assert contrast.windows == [(0.0, 39996.0)]
+
+
+def test_bands_map_to_red_green_blue():
+    data = np.zeros((2, 2, 5), dtype=np.uint16)
+    data[:, :, 1], data[:, :, 3], data[:, :, 4] = 100, 200, 300
+    contrast = Contrast(data, bands=[4, 3, 1])
+    version = contrast.version
+    contrast.setWindow([(0, 300), (0, 300), (0, 300)])
+    assert contrast.version == version + 1
+    blue, green, red, alpha = contrast.render(0, 0, 2, 2)[0, 0]
+    assert (red, green, blue) == (255, 170, 85)
+
+
+def test_bands_last():
+    assert _bands_last(np.zeros((4, 5))).shape == (4, 5, 1)
+    assert _bands_last(np.zeros((6, 40, 50))).shape == (40, 50, 6)
+    assert _bands_last(np.zeros((2, 40, 50, 3))).shape == (40, 50, 3)
@@ -0,0 +1,23 @@
+from conftest import Mouse
+
+
+def test_refresh_without_shapes_repaints_cleared_highlights(qapp):
+    import pyimannotate2
+    scene = pyimannotate2.SubQGraphicsScene()
+    assert scene.preciseUpdates
+    scene.mode = scene.DRAWING
+    mouse = Mouse(scene)
+    for x, y in [(10, 10), (100, 10), (100, 100), (10, 10)]:
+        mouse.press(x, y)
+    shape, = scene.polys
+    scene.mode = scene.MOVING
+    scene.hoverAt(pyimannotate2.QPointF(100, 11))
+    assert shape.hIndex == 1 and shape in scene.highlighted
+    updates = []
+    shape.update = lambda *args: updates.append(args)
+    scene.hoverAt(pyimannotate2.QPointF(500, 500)) #nothing there: clears the highlight
+    assert shape.hIndex is None and not scene.highlighted
+    assert updates and not scene.unhighlighted
+    del updates[:]
+    scene.refresh()
+    assert not updates #nothing changed since
@@ -0,0 +1,43 @@
+from conftest import Mouse
+
+
+def drawSquares(scene, count):
+    scene.mode = scene.DRAWING
+    mouse = Mouse(scene)
+    for i in range(count):
+        x = 200*i
+        for dx, dy in [(10, 10), (100, 10), (100, 100)]:
+            mouse.press(x + dx, dy)
+        mouse.press(x + 10, 10)
+
+
+def test_selection_edits_report_to_the_status_bar(qapp, capsys):
+    import pyimannotate2
+    scene = pyimannotate2.SubQGraphicsScene()
+    messages = []
+    scene.message.connect(messages.append)
+    drawSquares(scene, 3)
+    scene.selectAll()
+    scene.copyMarked()
+    assert len(scene.polys) == 6
+    scene.deleteMarked()
+    assert len(scene.polys) == 3
+    assert messages == ['3 shapes selected', '3 shapes copied', '3 shapes selected', '3 shapes deleted']
+    assert capsys.readouterr().out == ''
+    scene.undo()
+    assert len(scene.polys) == 6
+
+
+def test_single_shape_edits_report_to_the_status_bar(qapp, capsys):
+    import pyimannotate2
+    scene = pyimannotate2.SubQGraphicsScene()
+    messages = []
+    scene.message.connect(messages.append)
+    drawSquares(scene, 1)
+    scene.selectShape(list(scene.polys)[0])
+    scene.copySelected()
+    assert len(scene.polys) == 2
+    scene.deleteSelected()
+    assert len(scene.polys) == 1
+    assert messages == ['Shape copied', 'Shape deleted']
+    assert capsys.readouterr().out == ''
@@ -0,0 +1,45 @@
+import numpy as np
+
+from annotationcore import ShapeStore, simplify
+
+
+def densePolygons(count, perEdge=16):
+    '''Squares with perEdge collinear vertices on every edge'''
+    t = np.linspace(0, 1, perEdge, endpoint=False)
+    edge = [np.stack((t, np.zeros_like(t)), 1), np.stack((np.ones_like(t), t), 1),
+            np.stack((1-t, np.ones_like(t)), 1), np.stack((np.zeros_like(t), 1-t), 1)]
+    square = 10*np.concatenate(edge)
+    return [square + (20*i, 0) for i in range(count)]
+
+
+def test_simplify_keeps_the_corners_of_a_polyline():
+    line = np.array([[0, 0], [1, 0.1], [2, -0.1], [3, 0], [3, 5], [3.2, 10]], dtype=float)
+    result, = simplify([line], 0.5, closed=False)
+    assert result.tolist() == [[0, 0], [3, 0], [3.2, 10]]
+    result, = simplify([line], 0.05, closed=False)
+    assert len(result) == 6
+
+
+def test_simplify_closed_outline():
+    square, = densePolygons(1)
+    result, = simplify([square], 0.01)
+    assert sorted(map(tuple, result.tolist())) == [(0, 0), (0, 10), (10, 0), (10, 10)]
+
+
+def test_virtualized_simplify_can_be_undone(qapp):
+    import pyimannotate2
+    scene = pyimannotate2.SubQGraphicsScene()
+    objects = densePolygons(50)
+    scene.virtualize(ShapeStore(objects, ['Polygon']*len(objects)))
+    scene.virtual.update(pyimannotate2.QRectF(0, 0, 100, 20)) #materializes a few of them
+    assert scene.virtual.shapes
+    before, after = scene.simplifyShapes(0.01)
+    assert (before, after) == (50*64, 50*4)
+    store = scene.virtual.store
+    assert all(len(store.objects[i]) == 4 for i in store.live())
+    assert all(len(shape) == 4 for shape in scene.virtual.shapes.values())
+    scene.undo()
+    assert all(np.array_equal(store.objects[i], objects[i]) for i in store.live())
+    assert all(len(shape) == 64 for shape in scene.virtual.shapes.values())
+    scene.redo()
+    assert all(len(store.objects[i]) == 4 for i in store.live())
@@ -0,0 +1,45 @@
+import time
+
+from stallwatch import Watchdog
+
+
+def blockingHandler(seconds):
+    time.sleep(seconds)
+
+
+def makeWatchdog(tmp_path):
+    watchdog = Watchdog(threshold=0.1, interval=0.02)
+    watchdog.enable(str(tmp_path/'stalls.log'))
+    return watchdog
+
+
+def readLog(tmp_path):
+    with open(str(tmp_path/'stalls.log')) as f:
+        return f.read()
+
+
+def test_stall_is_logged_with_the_blocking_stack(tmp_path):
+    watchdog = makeWatchdog(tmp_path)
+    watchdog.start()
+    blockingHandler(0.4)
+    watchdog.heartbeat()
+    watchdog.stop()
+    log = readLog(tmp_path)
+    assert watchdog.stalls == 1
+    assert 'in blockingHandler' in log
+    assert log.count('Event loop stalled') == 1 #resampled, but the stack did not change
+    assert 'Stall ended after' in log
+
+
+def test_beat_while_sampling_is_not_reported(tmp_path):
+    watchdog = makeWatchdog(tmp_path)
+    stack = watchdog.stack
+    def beatingStack():
+        watchdog.heartbeat() #the loop recovers while the stack is being taken
+        return stack()
+    watchdog.stack = beatingStack
+    watchdog.start()
+    blockingHandler(0.3)
+    watchdog.stop()
+    assert watchdog.stalls == 0
+    assert 'Event loop stalled' not in readLog(tmp_path)
@@ -0,0 +1,133 @@
+import numpy as np
+from PyQt5.QtCore import QRectF, Qt
+
+from annotationcore import ShapeStore
+from conftest import Mouse
+
+HOME = QRectF(0, 0, 200, 100) #with the margin, objects 0 to 3 are materialized
+AWAY = QRectF(3000, 0, 200, 100)
+
+
+def virtualScene(count=50):
+    '''Scene virtualizing count 40 x 40 squares, 100 apart'''
+    import pyimannotate2
+    scene = pyimannotate2.SubQGraphicsScene()
+    scene.coalesceHover = False
+    objects = [np.array([[0, 0], [40, 0], [40, 40], [0, 40]], dtype=float) + (100*i, 0) for i in range(count)]
+    scene.virtualize(ShapeStore(objects, ['Polygon']*count))
+    scene.virtual.update(HOME)
+    return scene
+
+
+def drag(scene, start, end):
+    '''Drag with the left button in the moving mode, a vertex or a whole shape'''
+    scene.mode = scene.MOVING
+    mouse = Mouse(scene)
+    mouse.move(*start)
+    mouse.press(*start)
+    mouse.move(end[0], end[1], Qt.LeftButton)
+    mouse.release(*end)
+    scene.clearShapeSelections()
+
+
+def test_edits_survive_recycling(qapp):
+    scene = virtualScene()
+    layer, store = scene.virtual, scene.virtual.store
+    drag(scene, (140, 40), (150, 60))
+    assert store.objects[1].tolist()[2] == [150, 60]
+    layer.update(AWAY)
+    assert 1 not in layer.shapes and len(scene.history) == 1
+    layer.update(HOME)
+    scene.undo()
+    assert store.objects[1].tolist()[2] == [140, 40]
+    assert layer.shapes[1].coords.tolist()[2] == [140, 40]
+    scene.redo()
+    assert layer.shapes[1].coords.tolist()[2] == [150, 60]
+
+
+def test_undo_of_an_object_out_of_view(qapp):
+    scene = virtualScene()
+    layer, store = scene.virtual, scene.virtual.store
+    drag(scene, (40, 0), (60, -20))
+    layer.update(AWAY)
+    scene.undo() #materializes the object to undo the edit on it
+    assert store.objects[0].tolist()[1] == [40, 0]
+    assert store.bbox[0].tolist() == [0, 0, 40, 40]
+    layer.update(AWAY)
+    assert 0 not in layer.shapes
+    scene.redo()
+    assert store.bbox[0].tolist() == [0, -20, 60, 40]
+
+
+def test_virtualizing_keeps_the_history(qapp):
+    import pyimannotate2
+    scene = pyimannotate2.SubQGraphicsScene()
+    scene.mode = scene.DRAWING
+    mouse = Mouse(scene)
+    for x, y in [(10, 10), (100, 10), (100, 100)]:
+        mouse.press(x, y)
+    mouse.press(11, 11)
+    scene.virtualize(ShapeStore())
+    assert len(scene.virtual.store) == 1 and len(scene.history) == 1
+    scene.undo()
+    assert len(scene.virtual.store) == 0
+    scene.redo()
+    scene.devirtualize()
+    assert len(scene.polys) == 1
+    scene.undo()
+    assert len(scene.polys) == 0
+
+
+def test_release_and_materialize_round_trip(qapp):
+    import pyimannotate2
+    roofs, roads = pyimannotate2.LabelClass(), pyimannotate2.LabelClass()
+    roofs.name, roads.name = 'roofs', 'roads'
+    scene = pyimannotate2.SubQGraphicsScene()
+    objects = [np.array([[0, 0], [40, 0], [40, 40]], dtype=float) + (100*i, 0) for i in range(10)]
+    store = ShapeStore(objects, ['Polygon', 'Line']*5, [roofs, roads]*5)
+    scene.virtualize(store)
+    layer = scene.virtual
+    layer.update(HOME)
+    assert sorted(layer.shapes) == [0, 1, 2, 3]
+    assert set(scene.polys) == set(layer.shapes.values())
+    shape = layer.shapes[1]
+    assert (shape.objtype, shape.closed, shape.label, shape.storeIndex) == ('Line', False, 'roads', 1)
+    assert shape in roads.polygons
+    shape.setPoints(shape.coords + (0, 5)) #an edit made outside the history
+    layer.update(QRectF(600, 0, 200, 100))
+    assert sorted(layer.shapes) == [5, 6, 7, 8, 9]
+    assert shape.storeIndex != 1 #released, then recycled for another object
+    assert sorted(s.storeIndex for s in roads.polygons) == [5, 7, 9]
+    assert store.objects[1].tolist() == [[100, 5], [140, 5], [140, 45]]
+    recycled = set(layer.shapes.values())
+    layer.update(HOME)
+    assert set(layer.shapes.values()) <= recycled
+    assert layer.shapes[1].coords.tolist() == [[100, 5], [140, 5], [140, 45]]
+    assert layer.shapes[1].label == 'roads' and not layer.shapes[1].closed
+    assert len(scene.items()) == 4 + 1 #the shapes and the overview
+
+
+def test_counts_include_unmaterialized_objects(qapp):
+    import pyimannotate2
+    roofs, roads = pyimannotate2.LabelClass(), pyimannotate2.LabelClass()
+    scene = pyimannotate2.SubQGraphicsScene()
+    objects = [np.array([[0, 0], [40, 0], [40, 40]], dtype=float) + (100*i, 0) for i in range(10)]
+    scene.virtualize(ShapeStore(objects, ['Polygon']*10, [roofs]*6 + [roads]*4))
+    scene.virtual.update(HOME)
+    assert scene.labelCounts() == {roofs: 6, roads: 4}
+    scene.relabelShapes([scene.virtual.shapes[0], scene.virtual.shapes[1]], roads)
+    assert scene.labelCounts() == {roofs: 4, roads: 6}
+    scene.virtual.update(AWAY)
+    assert scene.labelCounts() == {roofs: 4, roads: 6}
+    scene.undo()
+    assert scene.labelCounts() == {roofs: 6, roads: 4}
+
+
+def test_dragged_shape_stays_materialized_where_it_went(qapp):
+    scene = virtualScene()
+    layer, store = scene.virtual, scene.virtual.store
+    drag(scene, (120, 20), (420, 20))
+    assert store.bbox[1].tolist() == [400, 0, 440, 40]
+    layer.update(QRectF(300, 0, 200, 100)) #the old place is out of reach, the new one in view
+    assert 1 in layer.shapes
+    assert layer.shapes[1].coords.min(axis=0).tolist() == [400, 0]